@@ -5,6 +5,9 @@ export interface ParsedResponse {
   codeTitle?: string;
   postCodeContent?: string;
   probableQuestionType?: string;
+  // Every code block and code title, when read from the stored parse
+  codeBlocks?: string[];
+  codeTitles?: string[];
 }
 
 export function parseResponse(response: string): ParsedResponse {
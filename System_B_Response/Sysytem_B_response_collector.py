@@ -1,17 +1,18 @@
 import pandas as pd
 import asyncio
 import os
+import sys
 from typing import List, Literal
-from openai import AsyncOpenAI
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Run as a script from any directory: make the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-SEPARATOR = "---SEPARATOR-@@@---"
+from System_B_Response.clients import get_openai_client
+from System_B_Response.excel_cache import read_excel
+from System_B_Response.profiling import PROFILER, stage
+from System_B_Response.settings import REPO_ROOT, data_path
 
-# Initialize OpenAI client with API key from environment variable
-client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+SEPARATOR = "---SEPARATOR-@@@---"
 
 
 def get_cot_prompt(question_type: str) -> str:
@@ -144,23 +145,25 @@ async def get_response(user_input: str, question_type: str) -> str:
     if not isinstance(user_input, str) or user_input.strip() == "":
         return "INVALID INPUT: No user input provided."
     
-    # Get the appropriate COT prompt for this question type
-    cot_prompt = get_cot_prompt(question_type)
-    
-    # Add "Let's think step by step" instruction to the user message
-    user_message_with_cot = f"{user_input}\n\nLet's think step by step."
+    with stage("build_prompt"):
+        # Get the appropriate COT prompt for this question type
+        cot_prompt = get_cot_prompt(question_type)
+        
+        # Add "Let's think step by step" instruction to the user message
+        user_message_with_cot = f"{user_input}\n\nLet's think step by step."
     
     try:
         # Make actual OpenAI API call
-        response = await client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": cot_prompt},
-                {"role": "user", "content": user_message_with_cot}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
+        with stage("openai_call"):
+            response = await get_openai_client().chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": cot_prompt},
+                    {"role": "user", "content": user_message_with_cot}
+                ],
+                temperature=0.7,
+                max_tokens=2000
+            )
         return response.choices[0].message.content
     except Exception as e:
         return f"ERROR: {type(e).__name__} - {str(e)}"
@@ -169,8 +172,8 @@ async def get_response(user_input: str, question_type: str) -> str:
 # ==============================
 # ⚙️ Configuration
 # ==============================
-INPUT_FILE = r"d:\Data fetching scrypt\data(5).xlsx"
-OUTPUT_FILE = r"d:\Data fetching scrypt\data\system_B_response.xlsx"
+INPUT_FILE = os.path.join(REPO_ROOT, "data(5).xlsx")
+OUTPUT_FILE = data_path("system_B_response.xlsx")
 
 # Model to use for all requests
 MODEL = "gpt-4o"
@@ -182,7 +185,8 @@ MODEL = "gpt-4o"
 async def main():
     # STEP 1: Load data
     print(f"Loading data from {INPUT_FILE} ...")
-    df = pd.read_excel(INPUT_FILE)
+    with stage("read_excel"):
+        df = read_excel(INPUT_FILE)
     print(f"Loaded {len(df)} rows.")
 
     # STEP 2: Prepare data
@@ -213,8 +217,12 @@ async def main():
 
     # STEP 4: Save results
     df_output = pd.DataFrame(rows)
-    df_output.to_excel(OUTPUT_FILE, index=False)
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    with stage("excel_export"):
+        df_output.to_excel(OUTPUT_FILE, index=False)
     print(f"\n🎉 All responses saved to {OUTPUT_FILE}")
+    json_path, prom_path = PROFILER.write_reports(os.path.splitext(OUTPUT_FILE)[0])
+    print(f"⏱ Stage timings: {json_path} | {prom_path}")
 
 
 # ==============================
@@ -1,23 +1,20 @@
 import pandas as pd
+import argparse
 import asyncio
 import os
+import sys
 from typing import List, Literal
-from openai import AsyncOpenAI
-from dotenv import load_dotenv
-from pymongo import MongoClient
 from datetime import datetime
 
-# Load environment variables from .env file
-load_dotenv()
+# Run as a script from any directory: make the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-SEPARATOR = "---SEPARATOR-@@@---"
-
-# Initialize OpenAI client with API key from environment variable
-client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+from System_B_Response.clients import close_clients, get_db, get_openai_client
+from System_B_Response.memprofile import MEMORY, MemoryBudgetExceeded, memory_stage
+from System_B_Response.profiling import PROFILER, stage
+from System_B_Response.settings import DB_NAME, data_path
 
-# Initialize MongoDB client
-MONGODB_URI = os.environ.get("MONGODB_URI")
-mongo_client = MongoClient(MONGODB_URI)
+SEPARATOR = "---SEPARATOR-@@@---"
 
 
 def get_cot_prompt(question_type: str) -> str:
@@ -150,23 +147,25 @@ async def get_response(user_input: str, question_type: str) -> str:
     if not isinstance(user_input, str) or user_input.strip() == "":
         return "INVALID INPUT: No user input provided."
     
-    # Get the appropriate COT prompt for this question type
-    cot_prompt = get_cot_prompt(question_type)
-    
-    # Add "Let's think step by step" instruction to the user message
-    user_message_with_cot = f"{user_input}\n\nLet's think step by step."
+    with stage("build_prompt"):
+        # Get the appropriate COT prompt for this question type
+        cot_prompt = get_cot_prompt(question_type)
+        
+        # Add "Let's think step by step" instruction to the user message
+        user_message_with_cot = f"{user_input}\n\nLet's think step by step."
     
     try:
         # Make actual OpenAI API call
-        response = await client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": cot_prompt},
-                {"role": "user", "content": user_message_with_cot}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
+        with stage("openai_call"):
+            response = await get_openai_client().chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": cot_prompt},
+                    {"role": "user", "content": user_message_with_cot}
+                ],
+                temperature=0.7,
+                max_tokens=2000
+            )
         return response.choices[0].message.content
     except Exception as e:
         return f"ERROR: {type(e).__name__} - {str(e)}"
@@ -176,11 +175,10 @@ async def get_response(user_input: str, question_type: str) -> str:
 # ⚙️ Configuration
 # ==============================
 # MongoDB Configuration
-DB_NAME = "Eeffective_Learning_db"
 COLLECTION_NAME = "sessions"
 
 # Output file
-OUTPUT_FILE = r"d:\Data fetching scrypt\data\system_B_response_from_db.xlsx"
+OUTPUT_FILE = data_path("system_B_response_from_db.xlsx")
 
 # Model to use for all requests
 MODEL = "gpt-4o"
@@ -197,13 +195,31 @@ def fetch_sessions_from_mongodb():
         List of dictionaries with session_id, question_type, user_messages, assistant_messages
     """
     print(f"Connecting to MongoDB database: {DB_NAME}")
-    db = mongo_client[DB_NAME]
+    db = get_db()
     collection = db[COLLECTION_NAME]
     
     # Fetch all sessions
-    sessions = list(collection.find({}))
+    with stage("fetch_sessions"), memory_stage("fetch"):
+        sessions = list(collection.find({}))
     print(f"Found {len(sessions)} sessions in database")
     
+    with memory_stage("shape"):
+        processed_data, skipped_count = extract_sessions(sessions)
+    
+    print(f"✓ Processed {len(processed_data)} valid sessions")
+    if skipped_count > 0:
+        print(f"⚠ Skipped {skipped_count} sessions (incomplete data)")
+    
+    return processed_data
+
+
+def extract_sessions(sessions):
+    """
+    Extract the first user and assistant messages of each session document.
+    
+    Returns:
+        Tuple: (processed_data, skipped_count)
+    """
     processed_data = []
     skipped_count = 0
     
@@ -254,17 +270,31 @@ def fetch_sessions_from_mongodb():
             skipped_count += 1
             continue
     
-    print(f"✓ Processed {len(processed_data)} valid sessions")
-    if skipped_count > 0:
-        print(f"⚠ Skipped {skipped_count} sessions (incomplete data)")
-    
-    return processed_data
+    return processed_data, skipped_count
 
 
 # ==============================
 # 🚀 Main processing function
 # ==============================
-async def main():
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate System B responses for the sessions in MongoDB")
+    parser.add_argument(
+        "--memprofile",
+        action="store_true",
+        help="Report peak RSS and top tracemalloc allocators per pipeline stage (slower)"
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        metavar="MB",
+        help="Fail the run when a pipeline stage pushes peak memory above MB"
+    )
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    MEMORY.configure(enabled=args.memprofile, budget_mb=args.memory_budget)
+    
     # STEP 1: Fetch data from MongoDB
     print("=" * 60)
     print("STEP 1: Fetching data from MongoDB")
@@ -278,7 +308,8 @@ async def main():
             return
         
         # Convert to DataFrame
-        df = pd.DataFrame(sessions_data)
+        with memory_stage("dataframe"):
+            df = pd.DataFrame(sessions_data)
         print(f"\n📊 Loaded {len(df)} sessions from database")
         
         # Show question type distribution
@@ -325,8 +356,11 @@ async def main():
 
     # STEP 4: Save results
     print(f"\nSTEP 3: Saving results to Excel")
-    df_output = pd.DataFrame(rows)
-    df_output.to_excel(OUTPUT_FILE, index=False)
+    with memory_stage("dataframe_output"):
+        df_output = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    with stage("excel_export"), memory_stage("write"):
+        df_output.to_excel(OUTPUT_FILE, index=False)
     print(f"🎉 All responses saved to: {OUTPUT_FILE}")
     
     # Show summary
@@ -335,8 +369,15 @@ async def main():
     print(f"   - Columns: {', '.join(df_output.columns.tolist())}")
     print(f"   - File size: {os.path.getsize(OUTPUT_FILE):,} bytes")
     
+    json_path, prom_path = PROFILER.write_reports(os.path.splitext(OUTPUT_FILE)[0])
+    print(f"   - Stage timings: {json_path} | {prom_path}")
+    if MEMORY.stages:
+        for line in MEMORY.lines():
+            print(f"     {line}")
+        print(f"   - Memory by stage: {MEMORY.write_report(os.path.splitext(OUTPUT_FILE)[0])}")
+    
     # Close MongoDB connection
-    mongo_client.close()
+    close_clients()
     print(f"\n✓ MongoDB connection closed")
 
 
@@ -344,4 +385,9 @@ async def main():
 # 🏁 Entry point
 # ==============================
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    try:
+        asyncio.run(main(args))
+    except MemoryBudgetExceeded as e:
+        print(f"\n❌ {e}")
+        sys.exit(3)
@@ -1,7 +1,18 @@
 import pandas as pd
 import asyncio
+import os
+import sys
+import time
+from datetime import datetime
 from typing import List, Literal
 
+# Run as a script from any directory: make the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from System_B_Response.call_trace import close_tracer, open_tracer, trace_call
+from System_B_Response.excel_cache import read_excel
+from System_B_Response.run_state import compute_prompt_hash
+
 SEPARATOR = "---SEPARATOR-@@@---"
 
 
@@ -41,18 +52,25 @@ def get_prompt(prompt_set_name: str, question_type: str) -> str:
 # ==============================
 # 🧠 Dummy async function
 # ==============================
-async def get_single_response(model: str, prompt_set_name: str, user_input: str, question_type: str) -> str:
+async def get_single_response(model: str, prompt_set_name: str, user_input: str, question_type: str,
+                              session_key: str = None) -> str:
     """
     Dummy async function that simulates generating a response from an LLM.
     Replace this with your actual async LLM API call (e.g., OpenAI, Gemini).
+    Every call is traced to the call-trace store (see call_trace.py).
     """
     prompt = get_prompt(prompt_set_name, question_type)
+    started_at = datetime.utcnow().isoformat()
+    call_started = time.perf_counter()
     # Simulate an async LLM call with a delay
     await asyncio.sleep(0.1)
+    trace_call(sessionKey=session_key, model=model, promptHash=compute_prompt_hash([prompt]), attempt=1,
+               startedAt=started_at, latency=time.perf_counter() - call_started)
     return f"Response to: {user_input[:50]} using prompt: {prompt} and model: {model}..."
 
 
-async def get_assistant_responses(model: str, prompt_set_name: str, user_input_raw: str, question_type: str) -> str:
+async def get_assistant_responses(model: str, prompt_set_name: str, user_input_raw: str, question_type: str,
+                                  session_id: str = None) -> str:
     """
     Dummy async function that simulates generating a response from an LLM.
     Replace this with your actual async LLM API call (e.g., OpenAI, Gemini).
@@ -62,8 +80,9 @@ async def get_assistant_responses(model: str, prompt_set_name: str, user_input_r
         return "INVALID CONFIGURATION: No user input provided."
     user_inputs = user_input_raw.split(SEPARATOR)
     assistant_responses = []
-    for user_input in user_inputs:
-        assistant_response = await get_single_response(model, prompt_set_name, user_input, question_type)
+    for turn, user_input in enumerate(user_inputs):
+        assistant_response = await get_single_response(model, prompt_set_name, user_input, question_type,
+                                                       session_key=f"{session_id}:{turn}")
         assistant_responses.append(assistant_response)
     final_response = SEPARATOR.join(assistant_responses)
     return final_response
@@ -92,7 +111,7 @@ eval_sets = [
 async def main():
     # STEP 1: Load data
     print(f"Loading data from {INPUT_FILE} ...")
-    df = pd.read_excel(INPUT_FILE)
+    df = read_excel(INPUT_FILE)
     print(f"Loaded {len(df)} rows.")
 
     # STEP 2: Prepare message lists
@@ -107,7 +126,8 @@ async def main():
         for row in rows:
             user_input = row["user_messages"]
             question_type = row["question_type"]
-            tasks.append(get_assistant_responses(model, prompt_name, user_input, question_type))
+            tasks.append(get_assistant_responses(model, prompt_name, user_input, question_type,
+                                                 row.get("session_id")))
 
         # Run all async LLM calls concurrently for efficiency
         results: List[str] = await asyncio.gather(*tasks)
@@ -128,4 +148,8 @@ async def main():
 # 🏁 Entry point
 # ==============================
 if __name__ == "__main__":
-    asyncio.run(main())
+    open_tracer(source="meheraj")
+    try:
+        asyncio.run(main())
+    finally:
+        close_tracer()
@@ -0,0 +1,9 @@
+"""
+System B response generation: Chain-of-Thought responses for recorded
+sessions, stored in MongoDB for the System A / System B evaluation.
+
+Importing the package (or any module in it) does no network or filesystem
+work; clients are created on first use by clients.py. Run the collector with
+
+    python -m System_B_Response --help
+"""
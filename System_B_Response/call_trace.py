@@ -0,0 +1,341 @@
+"""
+Per-request tracing of LLM calls into a local SQLite database.
+
+Every call attempt made by the collector's generate_response (and the
+meheraj collector's get_single_response) is recorded as one row of the
+llm_calls table:
+
+    runId, source, sessionKey, model, promptHash, attempt,
+    queueWait   seconds the attempt waited before being sent (work-queue wait
+                for the first attempt, retry backoff for later ones)
+    startedAt, latency, ttft (time to first streamed token),
+    promptTokens, completionTokens, cachedTokens, finishReason,
+    httpStatus, errorClass (NULL for successful calls)
+
+Rows are buffered and written in batches of FLUSH_EVERY, so tracing costs a
+list append per call. SQLite runs in WAL mode with a busy timeout, so several
+worker processes on one machine can share the file.
+
+Query the store (from the repository root):
+
+    python -m System_B_Response.call_trace --slowest 20
+    python -m System_B_Response.call_trace --by-prompt
+    python -m System_B_Response.call_trace --retries
+    python -m System_B_Response.call_trace --rate
+"""
+import os
+import sqlite3
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .settings import data_path
+
+
+TRACE_FILE = data_path("llm_traces.sqlite")
+
+# Buffered rows written per transaction
+FLUSH_EVERY = 50
+
+COLUMNS = [
+    ('runId', 'TEXT'),
+    ('source', 'TEXT'),
+    ('sessionKey', 'TEXT'),
+    ('model', 'TEXT'),
+    ('promptHash', 'TEXT'),
+    ('attempt', 'INTEGER'),
+    ('queueWait', 'REAL'),
+    ('startedAt', 'TEXT'),
+    ('latency', 'REAL'),
+    ('ttft', 'REAL'),
+    ('promptTokens', 'INTEGER'),
+    ('completionTokens', 'INTEGER'),
+    ('cachedTokens', 'INTEGER'),
+    ('finishReason', 'TEXT'),
+    ('httpStatus', 'INTEGER'),
+    ('errorClass', 'TEXT'),
+]
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS llm_calls (id INTEGER PRIMARY KEY, "
+    + ", ".join(f"{name} {sql_type}" for name, sql_type in COLUMNS) + ")",
+    "CREATE INDEX IF NOT EXISTS llm_calls_session ON llm_calls (sessionKey)",
+    "CREATE INDEX IF NOT EXISTS llm_calls_prompt ON llm_calls (model, promptHash)",
+    "CREATE INDEX IF NOT EXISTS llm_calls_run ON llm_calls (runId, startedAt)",
+]
+
+# Seconds the current task's session waited in its work queue; set by the
+# code that hands sessions to workers and read by the first call attempt
+QUEUE_WAIT: ContextVar[Optional[float]] = ContextVar('QUEUE_WAIT', default=None)
+
+
+def connect(path: str = TRACE_FILE) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.commit()
+    return connection
+
+
+class CallTracer:
+    """Buffers call traces and writes them to the llm_calls table in batches."""
+
+    def __init__(self, path: str = TRACE_FILE, source: str = "collector", run_id: Optional[str] = None,
+                 flush_every: int = FLUSH_EVERY):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.source = source
+        self.run_id = run_id
+        self.flush_every = flush_every
+        self.rows_written = 0
+        self._connection = connect(path)
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+        self._insert = (f"INSERT INTO llm_calls ({', '.join(name for name, _ in COLUMNS)}) "
+                        f"VALUES ({', '.join('?' for _ in COLUMNS)})")
+
+    def record(self, **fields: Any) -> None:
+        fields.setdefault('runId', self.run_id)
+        fields.setdefault('source', self.source)
+        fields.setdefault('startedAt', datetime.utcnow().isoformat())
+        row = tuple(fields.get(name) for name, _ in COLUMNS)
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) < self.flush_every:
+                return
+            rows, self._buffer = self._buffer, []
+        self._write(rows)
+
+    def _write(self, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        with self._connection:
+            self._connection.executemany(self._insert, rows)
+        self.rows_written += len(rows)
+
+    def flush(self) -> None:
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        self._write(rows)
+
+    def close(self) -> None:
+        self.flush()
+        self._connection.close()
+
+
+# Process-wide tracer; trace_call() is a no-op until open_tracer() is called
+_tracer: Optional[CallTracer] = None
+
+
+def open_tracer(path: str = TRACE_FILE, source: str = "collector", run_id: Optional[str] = None) -> CallTracer:
+    global _tracer
+    close_tracer()
+    _tracer = CallTracer(path, source=source, run_id=run_id)
+    return _tracer
+
+
+def bind_run(run_id: str) -> None:
+    """Attach the run id of the current collector run to subsequent traces."""
+    if _tracer is not None:
+        _tracer.flush()
+        _tracer.run_id = run_id
+
+
+def trace_call(**fields: Any) -> None:
+    if _tracer is not None:
+        _tracer.record(**fields)
+
+
+def close_tracer() -> None:
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+
+def usage_fields(usage) -> Dict[str, Optional[int]]:
+    """Token counts of an OpenAI usage object (cached prompt tokens when reported)."""
+    if usage is None:
+        return {'promptTokens': None, 'completionTokens': None, 'cachedTokens': None}
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return {
+        'promptTokens': usage.prompt_tokens,
+        'completionTokens': usage.completion_tokens,
+        'cachedTokens': getattr(details, 'cached_tokens', None),
+    }
+
+
+# ==============================
+# 🔎 Queries
+# ==============================
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def slowest_calls(connection: sqlite3.Connection, limit: int = 20, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    query = ("SELECT sessionKey, model, promptHash, attempt, latency, ttft, promptTokens, completionTokens, "
+             "cachedTokens, finishReason, errorClass FROM llm_calls WHERE latency IS NOT NULL")
+    params: list = []
+    if run_id:
+        query += " AND runId = ?"
+        params.append(run_id)
+    query += " ORDER BY latency DESC LIMIT ?"
+    params.append(limit)
+    cursor = connection.cursor()
+    cursor.row_factory = sqlite3.Row
+    return [dict(row) for row in cursor.execute(query, params)]
+
+
+def prompt_profile(connection: sqlite3.Connection, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Latency, TTFT, output speed and cache hit rate per (model, promptHash), slowest first."""
+    query = ("SELECT model, promptHash, latency, ttft, promptTokens, completionTokens, cachedTokens "
+             "FROM llm_calls WHERE errorClass IS NULL")
+    params = []
+    if run_id:
+        query += " AND runId = ?"
+        params.append(run_id)
+    groups: Dict[tuple, Dict[str, list]] = {}
+    for model, prompt_hash, latency, ttft, prompt_tokens, completion_tokens, cached in connection.execute(query, params):
+        group = groups.setdefault((model, prompt_hash), {'latency': [], 'ttft': [], 'prompt': 0,
+                                                          'completion': 0, 'cached': 0})
+        group['latency'].append(latency or 0.0)
+        if ttft is not None:
+            group['ttft'].append(ttft)
+        group['prompt'] += prompt_tokens or 0
+        group['completion'] += completion_tokens or 0
+        group['cached'] += cached or 0
+    profile = []
+    for (model, prompt_hash), group in groups.items():
+        generation_time = sum(group['latency']) - sum(group['ttft'])
+        profile.append({
+            'model': model,
+            'promptHash': prompt_hash,
+            'calls': len(group['latency']),
+            'latencyP50': _percentile(group['latency'], 0.5),
+            'latencyP95': _percentile(group['latency'], 0.95),
+            'ttftP50': _percentile(group['ttft'], 0.5),
+            'ttftP95': _percentile(group['ttft'], 0.95),
+            'outputTokensPerSec': group['completion'] / generation_time if generation_time > 0 else None,
+            'cacheHitRate': group['cached'] / group['prompt'] if group['prompt'] else None,
+        })
+    return sorted(profile, key=lambda row: row['latencyP95'] or 0, reverse=True)
+
+
+def retry_overhead(connection: sqlite3.Connection, run_id: Optional[str] = None) -> Dict[str, Any]:
+    """Extra calls, time and tokens spent on attempts that did not produce the response."""
+    where = "WHERE runId = ?" if run_id else ""
+    params = [run_id] if run_id else []
+    calls, failed, retries, failed_latency, backoff, sessions, retried_sessions = connection.execute(
+        f"SELECT COUNT(*), SUM(errorClass IS NOT NULL), SUM(attempt > 1), "
+        f"SUM(CASE WHEN errorClass IS NOT NULL THEN latency ELSE 0 END), "
+        f"SUM(CASE WHEN attempt > 1 THEN queueWait ELSE 0 END), "
+        f"COUNT(DISTINCT sessionKey), COUNT(DISTINCT CASE WHEN attempt > 1 THEN sessionKey END) "
+        f"FROM llm_calls {where}", params
+    ).fetchone()
+    errors = dict(connection.execute(
+        f"SELECT errorClass || COALESCE(' (HTTP ' || httpStatus || ')', ''), COUNT(*) FROM llm_calls "
+        f"{where + ' AND' if where else 'WHERE'} errorClass IS NOT NULL GROUP BY 1 ORDER BY 2 DESC", params
+    ).fetchall())
+    total_latency = connection.execute(f"SELECT SUM(latency) FROM llm_calls {where}", params).fetchone()[0]
+    return {
+        'calls': calls or 0,
+        'failedCalls': failed or 0,
+        'retries': retries or 0,
+        'sessions': sessions or 0,
+        'retriedSessions': retried_sessions or 0,
+        'failedCallSeconds': round(failed_latency or 0.0, 3),
+        'backoffSeconds': round(backoff or 0.0, 3),
+        'overheadShare': (((failed_latency or 0.0) + (backoff or 0.0)) / ((total_latency or 0.0) + (backoff or 0.0))
+                          if total_latency or backoff else None),
+        'errors': errors,
+    }
+
+
+def rate_profile(connection: sqlite3.Connection, run_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Requests and tokens per minute observed in the store, for sizing
+    rate limits: percentiles over one-minute windows plus the number of
+    rate-limited (HTTP 429) calls.
+    """
+    where = "WHERE runId = ?" if run_id else ""
+    params = [run_id] if run_id else []
+    windows = connection.execute(
+        f"SELECT substr(startedAt, 1, 16) AS minute, COUNT(*), "
+        f"SUM(COALESCE(promptTokens, 0) + COALESCE(completionTokens, 0)), SUM(httpStatus = 429) "
+        f"FROM llm_calls {where} GROUP BY minute", params
+    ).fetchall()
+    requests = [row[1] for row in windows]
+    tokens = [row[2] or 0 for row in windows]
+    return {
+        'minutes': len(windows),
+        'requestsPerMinP50': _percentile(requests, 0.5),
+        'requestsPerMinP95': _percentile(requests, 0.95),
+        'requestsPerMinMax': max(requests, default=None),
+        'tokensPerMinP50': _percentile(tokens, 0.5),
+        'tokensPerMinP95': _percentile(tokens, 0.95),
+        'tokensPerMinMax': max(tokens, default=None),
+        'rateLimited': sum(row[3] or 0 for row in windows),
+        'rateLimitedMinutes': sum(1 for row in windows if row[3]),
+    }
+
+
+def _fmt(value, spec: str = ".2f") -> str:
+    return "--" if value is None else format(value, spec)
+
+
+# ==============================
+# 🏁 Entry point
+# ==============================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the LLM call trace store")
+    parser.add_argument("--db", default=TRACE_FILE, help=f"Trace database (default: {TRACE_FILE})")
+    parser.add_argument("--run-id", help="Only calls of this collector run")
+    parser.add_argument("--slowest", type=int, nargs="?", const=20, metavar="N", help="N slowest calls")
+    parser.add_argument("--by-prompt", action="store_true", help="Latency, TTFT and cache hits per model/prompt")
+    parser.add_argument("--retries", action="store_true", help="Retry overhead and error classes")
+    parser.add_argument("--rate", action="store_true", help="Requests and tokens per minute (rate-limit sizing)")
+    args = parser.parse_args()
+
+    connection = connect(args.db)
+    show_all = not (args.slowest or args.by_prompt or args.retries or args.rate)
+    if args.slowest or show_all:
+        print("Slowest calls:")
+        for row in slowest_calls(connection, args.slowest or 10, args.run_id):
+            print(f"  {_fmt(row['latency'], '7.2f')}s ttft {_fmt(row['ttft'], '5.2f')}s  {row['model']:<12} "
+                  f"{row['promptHash'] or '-':<16} attempt {row['attempt']}  "
+                  f"tokens {row['promptTokens'] or 0}/{row['completionTokens'] or 0} "
+                  f"(cached {row['cachedTokens'] or 0})  {row['errorClass'] or row['finishReason'] or ''}  "
+                  f"{row['sessionKey']}")
+    if args.by_prompt or show_all:
+        print("Per model / prompt:")
+        for row in prompt_profile(connection, args.run_id):
+            print(f"  {row['model']:<12} {row['promptHash'] or '-':<16} n={row['calls']:<6} "
+                  f"latency p50 {_fmt(row['latencyP50'])}s p95 {_fmt(row['latencyP95'])}s | "
+                  f"ttft p50 {_fmt(row['ttftP50'])}s p95 {_fmt(row['ttftP95'])}s | "
+                  f"{_fmt(row['outputTokensPerSec'], '.1f')} out tok/s | cache hit {_fmt(row['cacheHitRate'], '.0%')}")
+    if args.retries or show_all:
+        overhead = retry_overhead(connection, args.run_id)
+        print(f"Retries: {overhead['retries']} of {overhead['calls']} calls | "
+              f"{overhead['retriedSessions']} of {overhead['sessions']} sessions retried | "
+              f"failed calls {overhead['failedCallSeconds']}s + backoff {overhead['backoffSeconds']}s "
+              f"({_fmt(overhead['overheadShare'], '.1%')} of call + backoff time)")
+        for error, calls in overhead['errors'].items():
+            print(f"  {calls:>6}  {error}")
+    if args.rate or show_all:
+        rate = rate_profile(connection, args.run_id)
+        print(f"Rate over {rate['minutes']} active minutes: "
+              f"requests/min p50 {_fmt(rate['requestsPerMinP50'], 'g')} p95 {_fmt(rate['requestsPerMinP95'], 'g')} "
+              f"max {_fmt(rate['requestsPerMinMax'], 'g')} | tokens/min p50 {_fmt(rate['tokensPerMinP50'], ',')} "
+              f"p95 {_fmt(rate['tokensPerMinP95'], ',')} max {_fmt(rate['tokensPerMinMax'], ',')} | "
+              f"429s: {rate['rateLimited']} in {rate['rateLimitedMinutes']} minutes")
+    connection.close()
@@ -0,0 +1,229 @@
+"""
+Command-line entry point for the System B collector.
+
+    python -m System_B_Response [options]
+    python -m System_B_Response --watch
+    python -m System_B_Response --enqueue | --worker --api-key-index N
+
+Parsing arguments, the live metrics endpoint (see live_metrics.py), closing
+the shared clients and writing the stage-timing reports (see profiling.py)
+live here so that collector.py stays importable without side effects.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from typing import List, Optional
+
+from . import collector
+from .call_trace import TRACE_FILE, close_tracer, open_tracer
+from .clients import close_clients
+from .dedup import DEDUP_THRESHOLD
+from .live_metrics import LIVE, SUMMARY_INTERVAL
+from .memprofile import MEMORY, MemoryBudgetExceeded
+from .profiling import CAPTURE_MODES, PROFILER, capture
+from .routing import ROUTING_POLICIES
+from .scheduler import SCHEDULE_MODES
+from .collector import (
+    CONCURRENCY,
+    FAILURES_COLLECTION,
+    OUTPUT_FILE,
+    ROUTING_POLICY,
+    SCHEDULE_MODE,
+    WORK_COLLECTION,
+    default_worker_id,
+)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate System B Chain-of-Thought responses")
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help=f"Only reprocess sessions recorded in the '{FAILURES_COLLECTION}' dead-letter collection"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=CONCURRENCY,
+        help=f"Number of sessions generated concurrently (default: {CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=SCHEDULE_MODES,
+        default=SCHEDULE_MODE,
+        help=f"Work queue order (default: {SCHEDULE_MODE})"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Run as a service: watch sessions via a change stream and generate for new first turns"
+    )
+    parser.add_argument(
+        "--routing",
+        choices=ROUTING_POLICIES,
+        default=ROUTING_POLICY,
+        help=f"Model/token-budget routing policy (default: {ROUTING_POLICY}, see routing.py)"
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Only regenerate sessions that are new or whose input fingerprint changed"
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Generate exact/near-duplicate user messages once and reuse the response"
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEDUP_THRESHOLD,
+        help=f"Minimum estimated Jaccard similarity for near-duplicates (default: {DEDUP_THRESHOLD})"
+    )
+    parser.add_argument(
+        "--all-turns",
+        action="store_true",
+        help="Generate every user turn, each conditioned on the System B conversation so far; "
+             "turns of a session run in order, sessions in parallel (see conversation.py)"
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        metavar="N",
+        help="Smoke run: only fetch a sample of N sessions stratified by question type and code "
+             "output preference (see sampling.py)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed for --sample; the same seed draws the same sessions (default: random, printed)"
+    )
+    parser.add_argument(
+        "--output",
+        help=f"Excel output path; the results journal is written next to it (default: {OUTPUT_FILE})"
+    )
+    parser.add_argument(
+        "--trace-db",
+        default=TRACE_FILE,
+        help=f"SQLite file every LLM call is traced to (default: {TRACE_FILE})"
+    )
+    parser.add_argument(
+        "--no-trace",
+        action="store_true",
+        help="Do not record LLM call traces"
+    )
+    parser.add_argument(
+        "--memprofile",
+        action="store_true",
+        help="Report peak RSS and top tracemalloc allocators per pipeline stage (slower)"
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        metavar="MB",
+        help="Fail the run when a pipeline stage pushes peak memory above MB"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="Serve live metrics on http://127.0.0.1:PORT/metrics (Prometheus) and /status (JSON)"
+    )
+    parser.add_argument(
+        "--summary-interval",
+        type=float,
+        default=SUMMARY_INTERVAL,
+        metavar="SECONDS",
+        help=f"Print one progress summary line every SECONDS instead of a line per session "
+             f"(default: {SUMMARY_INTERVAL:g}; 0: line per session)"
+    )
+    parser.add_argument(
+        "--profile",
+        choices=CAPTURE_MODES,
+        help="Also capture a cProfile/pyinstrument profile of the run next to the output"
+    )
+    
+    distributed = parser.add_argument_group("distributed mode")
+    mode = distributed.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--enqueue",
+        action="store_true",
+        help=f"Publish sessions to the shared '{WORK_COLLECTION}' collection and exit"
+    )
+    mode.add_argument(
+        "--worker",
+        action="store_true",
+        help=f"Claim and process sessions from '{WORK_COLLECTION}' using leases"
+    )
+    distributed.add_argument(
+        "--worker-id",
+        help="Lease owner name (default: <hostname>-<pid>)"
+    )
+    distributed.add_argument(
+        "--api-key-index",
+        type=int,
+        default=0,
+        help="Which key of OPENAI_API_KEYS this worker uses (default: 0)"
+    )
+    args = parser.parse_args(argv)
+    if args.watch and (args.enqueue or args.worker or args.retry_failed):
+        parser.error("--watch cannot be combined with --enqueue, --worker or --retry-failed")
+    if args.all_turns and (args.watch or args.enqueue or args.worker or args.dedup):
+        parser.error("--all-turns cannot be combined with --watch, --enqueue, --worker or --dedup")
+    if args.sample is not None and (args.watch or args.worker):
+        parser.error("--sample cannot be combined with --watch or --worker")
+    if args.sample is not None and args.sample < 1:
+        parser.error("--sample must be at least 1")
+    if args.seed is not None and args.sample is None:
+        parser.error("--seed requires --sample")
+    return args
+
+
+def report_base(args: argparse.Namespace) -> str:
+    """Path prefix for the stage-timing reports, next to the journal of this run."""
+    base = os.path.splitext(args.output or OUTPUT_FILE)[0]
+    if args.worker:
+        base = f"{base}.{args.worker_id or default_worker_id()}"
+    return base
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    base = report_base(args)
+    if not args.no_trace:
+        open_tracer(args.trace_db)
+    MEMORY.configure(enabled=args.memprofile, budget_mb=args.memory_budget)
+    LIVE.configure(summary_interval=args.summary_interval)
+    if args.metrics_port is not None:
+        try:
+            url = LIVE.serve(args.metrics_port)
+        except OSError as e:
+            print(f"❌ Could not serve metrics on port {args.metrics_port}: {e}")
+            sys.exit(2)
+        print(f"  📡 Live metrics: {url}/metrics | {url}/status")
+    try:
+        with capture(args.profile, base):
+            asyncio.run(collector.main(args))
+    except MemoryBudgetExceeded as e:
+        print(f"\n❌ {e}")
+        sys.exit(3)
+    finally:
+        LIVE.stop()
+        close_clients()
+        close_tracer()
+        if PROFILER.histograms:
+            json_path, prom_path = PROFILER.write_reports(base)
+            print("\n  ⏱ Stage timings (by total time):")
+            for line in PROFILER.lines():
+                print(f"     {line}")
+            print(f"  Reports: {json_path} | {prom_path}")
+        if MEMORY.stages:
+            print("\n  🧠 Memory by stage:")
+            for line in MEMORY.lines():
+                print(f"     {line}")
+            print(f"  Report: {MEMORY.write_report(base)}")
+
+
+if __name__ == "__main__":
+    main()
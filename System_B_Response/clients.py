@@ -0,0 +1,100 @@
+"""
+Lazily created, shared OpenAI and MongoDB clients.
+
+Importing this module (or any collector) does no I/O: .env is read and the
+clients are constructed on first use, then reused for the life of the
+process. MongoClient keeps its own connection pool, so every caller - the
+collector's worker threads, the watcher, analytics jobs - shares one pool
+instead of opening connections per call. AsyncOpenAI clients are cached per
+API key, which lets distributed workers pick a key from OPENAI_API_KEYS.
+
+Usage:
+    from System_B_Response.clients import get_db, get_openai_client
+
+    db = get_db()
+    client = get_openai_client()
+"""
+import os
+import threading
+from typing import Dict, List, Optional
+
+
+_lock = threading.Lock()
+_env_loaded = False
+_mongo_client = None
+_openai_clients: Dict[str, object] = {}
+
+
+def load_env() -> None:
+    """Load .env once (later calls are no-ops)."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    _env_loaded = True
+
+
+def require_env(name: str) -> str:
+    load_env()
+    value = os.environ.get(name)
+    if not value:
+        raise ValueError(f"{name} not found in environment variables. Check your .env file")
+    return value
+
+
+def openai_api_keys() -> List[str]:
+    """Keys from OPENAI_API_KEYS (comma-separated), falling back to OPENAI_API_KEY."""
+    load_env()
+    keys = [key.strip() for key in os.environ.get("OPENAI_API_KEYS", "").split(",") if key.strip()]
+    return keys or [require_env("OPENAI_API_KEY")]
+
+
+def get_openai_client(api_key: Optional[str] = None):
+    """Shared AsyncOpenAI client for api_key (default: OPENAI_API_KEY)."""
+    api_key = api_key or require_env("OPENAI_API_KEY")
+    client = _openai_clients.get(api_key)
+    if client is None:
+        with _lock:
+            client = _openai_clients.get(api_key)
+            if client is None:
+                from openai import AsyncOpenAI
+
+                client = _openai_clients[api_key] = AsyncOpenAI(api_key=api_key)
+    return client
+
+
+def get_mongo_client():
+    """Shared MongoClient for MONGODB_URI. Connecting happens on the first operation."""
+    global _mongo_client
+    if _mongo_client is None:
+        with _lock:
+            if _mongo_client is None:
+                from pymongo import MongoClient
+
+                _mongo_client = MongoClient(require_env("MONGODB_URI"))
+    return _mongo_client
+
+
+def get_db(name: Optional[str] = None):
+    from .settings import DB_NAME
+
+    return get_mongo_client()[name or DB_NAME]
+
+
+def ping_mongo() -> None:
+    """Fail fast with a clear error if MongoDB is unreachable."""
+    try:
+        get_mongo_client().admin.command('ping')
+    except Exception as e:
+        raise ConnectionError(f"MongoDB connection failed: {e}")
+
+
+def close_clients() -> None:
+    """Close the shared MongoDB client; the next get_mongo_client() creates a new one."""
+    global _mongo_client
+    with _lock:
+        if _mongo_client is not None:
+            _mongo_client.close()
+            _mongo_client = None
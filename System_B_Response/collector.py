@@ -0,0 +1,1563 @@
+"""
+System B response collector: generates Chain-of-Thought responses for the
+first turn of every session (every turn with --all-turns, see
+conversation.py) and stores them in the systembresponses collection (plus a
+results journal and an Excel export).
+
+This module is importable without side effects: the OpenAI and MongoDB
+clients are created lazily on first use (see clients.py) and paths default
+to the repository's data/ directory. The command line lives in cli.py:
+
+    python -m System_B_Response --help
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import time
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
+
+from .call_trace import QUEUE_WAIT, bind_run, trace_call, usage_fields
+from .clients import get_db, get_openai_client, openai_api_keys, ping_mongo
+from .settings import data_path
+from .dedup import deduplicate
+from .dead_letter import (
+    INVALID_RESPONSE,
+    GenerationFailure,
+    clear_failure,
+    ensure_failure_indexes,
+    fetch_failed_turns,
+    fetch_invalid_fingerprints,
+    record_failure,
+)
+from .conversation import (
+    add_turn,
+    chain_fingerprint,
+    fetch_stored_turns,
+    pending_turns,
+    select_retry_turns,
+    select_stale_turns,
+    start_conversation,
+)
+from .fingerprint import fetch_fingerprints, input_fingerprint, select_changed
+from .live_metrics import LIVE
+from .memprofile import memory_stage
+from .profiling import PROFILER, count, stage
+from .response_parser import parsed_document_fields
+from .results_journal import ResultsJournal, export_journal_to_excel
+from .sampling import sample_session_ids
+from .run_state import RUNS_COLLECTION, RunTracker, compute_prompt_hash, ensure_run_indexes
+from .routing import DEFAULT_ROUTE, ROUTES, RouteStats, choose_route, load_route_history
+from .scheduler import MAX_OUTPUT_TOKENS, estimate_cost, load_cost_model, schedule
+from .session_watcher import (
+    SAVE_INTERVAL,
+    WATCH_COLLECTION,
+    ResumeWatermark,
+    load_resume_token,
+    open_session_stream,
+    save_resume_token,
+)
+from .work_queue import (
+    HEARTBEAT_SECONDS,
+    claim_next,
+    complete_item,
+    enqueue_sessions,
+    ensure_work_indexes,
+    has_open_work,
+    pending_count,
+    queue_stats,
+    renew_leases,
+)
+
+SEPARATOR = "---SEPARATOR-@@@---"
+
+# MongoDB Database and Collections
+SESSIONS_COLLECTION = "sessions"
+SYSTEM_B_COLLECTION = "systembresponses"
+FAILURES_COLLECTION = "systembfailures"  # Dead-letter collection for failed generations
+WORK_COLLECTION = "systembworkqueue"  # Shared work queue for --enqueue / --worker mode
+WATCH_NAME = "sessions"  # Resume-token document in WATCH_COLLECTION for --watch mode
+
+# Question types and code output preferences the COT prompt supports
+QUESTION_TYPES = ["GeneralQuestion", "HelpWriteCode", "HelpFixCode", "CodeExplanation", "QuestionFromCode"]
+CODE_OUTPUT_PREFERENCES = ["NoCode", "PseudoCode", "WithCode"]
+
+
+def get_cot_prompt(question_type: str, code_output_preference: str = "WithCode") -> str:
+    """
+    Returns the Chain-of-Thought (COT) system prompt for the given question type.
+    Uses the same structure as the existing system but removes few-shot examples
+    and adds Chain-of-Thought reasoning instruction.
+    
+    Args:
+        question_type: Type of question (GeneralQuestion, HelpWriteCode, etc.)
+        code_output_preference: User's preference - "NoCode", "PseudoCode", or "WithCode"
+    """
+    return "".join(get_cot_prompt_parts(question_type, code_output_preference))
+
+
+def get_turn_instructions(question_type: str, code_output_preference: str = "WithCode") -> str:
+    """The question type and code output preference sections of the COT prompt."""
+    _, question_instruction, code_preference, _ = get_cot_prompt_parts(question_type, code_output_preference)
+    return question_instruction + code_preference
+
+
+def get_cot_prompt_parts(question_type: str, code_output_preference: str = "WithCode") -> Tuple[str, str, str, str]:
+    """
+    The COT system prompt as (base prompt, question type instructions,
+    code output preference instructions, closing format).
+    """
+    
+    # Base system prompt (same as in llm.ts)
+    base_prompt = """You are a helpful AI assistant for programming education specializing in C and C++ programming languages. Provide clear, comprehensive explanations with practical examples.
+
+CORE REQUIREMENTS:
+1. Language Restriction: Only provide code examples in C or C++ programming languages
+2. Relevance Check: Only answer programming-related questions
+3. Educational Focus: Help students understand underlying concepts, not just provide solutions
+
+MANDATORY RESPONSE STRUCTURE:
+Every response MUST start with:
+[answer]: Your detailed explanation here...
+
+This [answer] tag is REQUIRED for UI parsing. Never skip it.
+
+CODE FORMATTING (when code is needed):
+- Use this EXACT format for all code examples:
+  [code]: [code-title]: Descriptive Title
+  // Your complete working code here with comments
+  [end-code]
+- The [code-title] tag is REQUIRED for UI parsing
+- Provide complete, compilable C or C++ code
+- Include detailed comments explaining each section
+- Follow best practices and good programming standards"""
+
+    # Question type specific instructions
+    question_type_instructions = {
+        "GeneralQuestion": """
+
+QUESTION TYPE HANDLING:
+- Type: General Programming Concepts
+- Focus: Provide comprehensive theoretical explanations
+- Include: Definitions, concepts, best practices, and examples
+- Explain: Why concepts are important and when to use them
+- ALWAYS start response with [answer]: tag""",
+
+        "HelpWriteCode": """
+
+QUESTION TYPE HANDLING:
+- Type: Code Writing from Scratch
+- Focus: Provide complete, well-structured solutions
+- Include: Step-by-step approach to solving the problem
+- Explain: Design decisions, algorithm choices, and implementation details
+- Follow: Best practices and coding standards
+- ALWAYS start response with [answer]: tag
+- Use [code]: [code-title]: format for all code blocks""",
+
+        "HelpFixCode": """
+
+QUESTION TYPE HANDLING:
+- Type: Code Debugging and Fixing
+- Focus: Identify issues and provide corrections
+- Include: Clear explanation of what's wrong and why
+- Format corrected code as: [code]: [code-title]: Fixed Code\n// Your corrected code here\n[end-code]
+- Explain: The debugging process and how to avoid similar issues
+- ALWAYS start response with [answer]: tag
+- Use [code]: [code-title]: format for all code blocks""",
+
+        "CodeExplanation": """
+
+QUESTION TYPE HANDLING:
+- Type: Code Explanation Request
+- Focus: Break down code step-by-step
+- Include: Line-by-line or section-by-section analysis
+- Explain: Execution flow, purpose of each part, and programming concepts used
+- Help students build a mental model of code execution
+- ALWAYS start response with [answer]: tag""",
+
+        "QuestionFromCode": """
+
+QUESTION TYPE HANDLING:
+- Type: Questions About Existing Code
+- Focus: Analyze and explain the provided code
+- Include: Direct references to specific code parts
+- Explain: How the code works and why it's written that way
+- ALWAYS start response with [answer]: tag"""
+    }
+
+    # Code output preference handling
+    code_preference_instructions = {
+        "NoCode": """
+
+CODE OUTPUT PREFERENCE: NO CODE
+- The user prefers explanations WITHOUT code examples
+- Focus on conceptual explanations, theory, and descriptions
+- Do NOT provide any code examples
+- Explain concepts using natural language and analogies
+- If asked to write/fix code, explain the approach conceptually instead""",
+        
+        "PseudoCode": """
+
+CODE OUTPUT PREFERENCE: PSEUDO CODE
+- The user prefers PSEUDO CODE instead of actual C/C++ syntax
+- Provide algorithm logic in simplified, language-agnostic pseudo code
+- Use clear, readable pseudo code format
+- Format as: [code]: [code-title]: Algorithm Name\nYour pseudo code here\n[end-code]
+- Explain the logic without strict C/C++ syntax""",
+        
+        "WithCode": """
+
+CODE OUTPUT PREFERENCE: COMPLETE CODE EXAMPLES
+- The user wants COMPLETE working code examples in C or C++
+- Provide full, compilable code with detailed comments
+- Format as: [code]: [code-title]: Descriptive Title\n// Complete code here\n[end-code]
+- Include all necessary headers, functions, and implementation
+- Follow best practices and coding standards"""
+    }
+    
+    code_preference = code_preference_instructions.get(code_output_preference, code_preference_instructions["WithCode"])
+
+    # Closing format
+    closing_format = """
+
+MANDATORY CLOSING FORMAT:
+Every response MUST end with these two lines:
+Topics covered: concept1, concept2, concept3, concept4, concept5, concept6;
+Probable Question Type: [DeterminedQuestionType]
+
+QUESTION TYPE CLASSIFICATION:
+Based on your response content, classify it as one of these types:
+- GeneralQuestion: If you explained theoretical programming concepts, definitions, or general knowledge
+- QuestionFromCode: If you analyzed or answered questions about specific existing code
+- CodeExplanation: If you provided step-by-step breakdown of how code works
+- HelpFixCode: If you identified and corrected code issues or bugs
+- HelpWriteCode: If you created new code from scratch to solve a problem
+
+Choose the type that best matches what you actually provided in your response, not what was initially requested.
+
+ERROR RESPONSES:
+- For non-programming questions: "Sorry, this is an irrelevant question. Please ask questions related to programming."
+- For non-C/C++ code requests: "Sorry, I can only provide code examples in C or C++ programming languages."
+
+QUALITY STANDARDS:
+- Be thorough but concise
+- Use clear, educational language appropriate for students
+- Provide practical insights that help with learning
+- Ensure accuracy in all technical details
+- Make explanations progressive (simple to complex when needed)
+
+CHAIN-OF-THOUGHT REASONING:
+When answering, think step by step. Break down your reasoning process clearly before providing the final answer."""
+
+    # Combine to create the full prompt
+    question_instruction = question_type_instructions.get(
+        question_type, 
+        question_type_instructions["GeneralQuestion"]
+    )
+    
+    return base_prompt, question_instruction, code_preference, closing_format
+
+
+# ==============================
+# 🧠 Async LLM call function
+# ==============================
+def get_prompt_hash() -> str:
+    """Hash of every COT system prompt variant, recorded with each run."""
+    return compute_prompt_hash(
+        get_cot_prompt(question_type, preference)
+        for question_type in QUESTION_TYPES
+        for preference in CODE_OUTPUT_PREFERENCES
+    )
+
+
+@lru_cache(maxsize=None)
+def get_variant_prompt_hash(question_type: str, code_output_preference: str) -> str:
+    """Hash of the one COT system prompt used for this question type and preference."""
+    return compute_prompt_hash([get_cot_prompt(question_type, code_output_preference)])
+
+
+def session_fingerprint(session_data: Dict[str, Any]) -> str:
+    """Fingerprint of everything that determines this session's System B response."""
+    question_type = session_data.get('questionType')
+    code_output_preference = session_data.get('codeOutputPreference', 'WithCode')
+    return input_fingerprint(
+        session_data.get('originalUserMessage', session_data.get('userMessage')),
+        session_data.get('codeContent'),
+        question_type,
+        code_output_preference,
+        get_variant_prompt_hash(question_type, code_output_preference)
+    )
+
+
+def apply_routes(sessions_data: List[Dict[str, Any]], history: Dict, policy: str) -> Dict[str, int]:
+    """
+    Attach the chosen route ('route', 'model', 'maxTokens') to each session.
+    The route is stored next to the input fingerprint, not in it.
+    
+    Returns:
+        Number of sessions per route
+    """
+    counts: Dict[str, int] = {}
+    for session_data in sessions_data:
+        session_data.update(choose_route(session_data, history, policy))
+        counts[session_data['route']] = counts.get(session_data['route'], 0) + 1
+    return counts
+
+
+def turn_user_content(user_input: str, question_type: str, code_output_preference: str = "WithCode",
+                      conversation: Dict[str, Any] = None) -> str:
+    """
+    The user message as sent, and as replayed in later turns of a conversation:
+    the input, this turn's instructions if the conversation's system prompt was
+    built for another question type or code preference, and the COT cue.
+    """
+    content = user_input
+    if conversation is not None and (question_type, code_output_preference) != conversation['variant']:
+        content += f"\n\n[Instructions for this message]:{get_turn_instructions(question_type, code_output_preference)}"
+    return f"{content}\n\nLet's think step by step."
+
+
+def count_routes(items: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Number of work items per route (an --all-turns session counts once, by its first turn)."""
+    counts: Dict[str, int] = {}
+    for item in items:
+        route = (item['turns'][0] if 'turns' in item else item).get('route', 'standard')
+        counts[route] = counts.get(route, 0) + 1
+    return counts
+
+
+def apply_conversation_routes(items: List[Dict[str, Any]], history: Dict, policy: str) -> Dict[str, int]:
+    """
+    Route each --all-turns session by its first turn and use that route for
+    every turn: a conversation stays on one model, whose prompt cache it
+    builds up.
+    
+    Returns:
+        Number of sessions per route
+    """
+    counts = apply_routes([item['turns'][0] for item in items], history, policy)
+    for item in items:
+        route = {key: item['turns'][0][key] for key in ('route', 'model', 'maxTokens')}
+        for turn in item['turns']:
+            turn.update(route)
+    return counts
+
+
+async def get_response(user_input: str, question_type: str, code_output_preference: str = "WithCode") -> str:
+    """
+    Generates a response from GPT-4o using the appropriate COT prompt.
+    
+    Returns:
+        The assistant's response string
+    
+    Raises:
+        GenerationFailure: If no response could be generated
+    """
+    result = await generate_response(user_input, question_type, code_output_preference)
+    return result['content']
+
+
+async def generate_response(user_input: str, question_type: str,
+                            code_output_preference: str = "WithCode",
+                            model: str = None, max_tokens: int = None,
+                            session_key: str = None, conversation: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Generates a response using the appropriate COT prompt and reports token
+    usage and latency alongside the content.
+    Transient API errors (rate limits, timeouts, 5xx) are retried with
+    exponential backoff up to MAX_ATTEMPTS times.
+    The response is streamed so the time to first token can be measured;
+    every attempt is traced to the call-trace store (see call_trace.py).
+    
+    Args:
+        user_input: The first user message from the session
+        question_type: The question type (e.g., "GeneralQuestion", "HelpWriteCode")
+        code_output_preference: User's code preference ("NoCode", "PseudoCode", "WithCode")
+        model: Model to call (default: MODEL)
+        max_tokens: Output token budget (default: MAX_OUTPUT_TOKENS)
+        session_key: "<sessionId>:<messageIndex>" recorded with the call traces
+        conversation: Earlier turns of the session (see conversation.py); its system
+                      prompt and messages are sent unchanged before this message
+    
+    Returns:
+        Dict with content, prompt_tokens, completion_tokens, cached_tokens,
+        latency and ttft (seconds of the successful call), finish_reason, attempts
+        and user_content (the user message as sent)
+    
+    Raises:
+        GenerationFailure: If no response could be generated
+    """
+    if not isinstance(user_input, str) or user_input.strip() == "":
+        raise GenerationFailure("InvalidInput", "No user input provided.", attempts=0)
+    
+    with stage("build_prompt"):
+        if conversation is None:
+            # Get the appropriate COT prompt for this question type and code preference
+            cot_prompt = get_cot_prompt(question_type, code_output_preference)
+            history = []
+        else:
+            # Same system prompt and earlier turns as the previous request: a cacheable prefix
+            cot_prompt = conversation['system']
+            history = conversation['messages']
+        
+        # Add "Let's think step by step" instruction to the user message
+        user_message_with_cot = turn_user_content(user_input, question_type, code_output_preference, conversation)
+        messages = [{"role": "system", "content": cot_prompt}, *history,
+                    {"role": "user", "content": user_message_with_cot}]
+    
+    model = model or MODEL
+    prompt_variant = conversation['variant'] if conversation is not None else (question_type, code_output_preference)
+    trace = {'sessionKey': session_key, 'model': model, 'promptHash': get_variant_prompt_hash(*prompt_variant)}
+    queue_wait = QUEUE_WAIT.get()
+    
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        call_started = time.perf_counter()
+        started_at = datetime.utcnow().isoformat()
+        ttft = None
+        try:
+            # Make actual OpenAI API call, streamed to measure the time to first token
+            count("openai_requests")
+            with stage("openai_call"), LIVE.request():
+                stream = await get_openai_client(_api_key).chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=max_tokens or MAX_OUTPUT_TOKENS,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                parts = []
+                finish_reason = None
+                usage = None
+                async for chunk in stream:
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    if choice.delta.content:
+                        if ttft is None:
+                            ttft = time.perf_counter() - call_started
+                        parts.append(choice.delta.content)
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+            latency = time.perf_counter() - call_started
+            tokens = usage_fields(usage)
+            trace_call(**trace, **tokens, attempt=attempt, queueWait=queue_wait, startedAt=started_at,
+                       latency=latency, ttft=ttft, finishReason=finish_reason, httpStatus=200,
+                       errorClass=None if parts else "EmptyResponse")
+            content = "".join(parts)
+            if not content:
+                raise GenerationFailure("EmptyResponse", "Model returned no content.", attempts=attempt)
+            if usage:
+                count("prompt_tokens", usage.prompt_tokens)
+                count("completion_tokens", usage.completion_tokens)
+                count("cached_prompt_tokens", tokens['cachedTokens'] or 0)
+            return {
+                'content': content,
+                'prompt_tokens': usage.prompt_tokens if usage else 0,
+                'completion_tokens': usage.completion_tokens if usage else 0,
+                'cached_tokens': tokens['cachedTokens'] or 0,
+                'latency': latency,
+                'ttft': ttft,
+                'finish_reason': finish_reason,
+                'attempts': attempt,
+                'user_content': user_message_with_cot,
+            }
+        except GenerationFailure:
+            raise
+        except Exception as e:
+            failure = GenerationFailure.from_exception(e, attempt)
+            count(f"openai_errors_{failure.error_type}")
+            trace_call(**trace, attempt=attempt, queueWait=queue_wait, startedAt=started_at,
+                       latency=time.perf_counter() - call_started, ttft=ttft,
+                       httpStatus=failure.http_status, errorClass=failure.error_type)
+            if not failure.retryable or attempt == MAX_ATTEMPTS:
+                raise failure from e
+            count("openai_retries")
+            queue_wait = RETRY_BASE_DELAY * (2 ** (attempt - 1))
+            with stage("retry_backoff"):
+                await asyncio.sleep(queue_wait)
+
+
+# ==============================
+# ⚙️ Configuration
+# ==============================
+# Output Excel file (override with --output)
+OUTPUT_FILE = data_path("system_B_responses_COT.xlsx")
+
+# Append-only results journal (JSON Lines), fsync'd every JOURNAL_FLUSH_EVERY rows.
+# Excel is built from this file, so a crash loses at most one flush interval.
+JOURNAL_FILE = os.path.splitext(OUTPUT_FILE)[0] + ".jsonl"
+JOURNAL_FLUSH_EVERY = 10
+
+# Model used for every request by the "fixed" routing policy
+MODEL = "gpt-4o"
+
+# API key used by this process (None: OPENAI_API_KEY); set per worker by --api-key-index
+_api_key: Optional[str] = None
+
+# Model routing: "fixed" (MODEL, max_tokens=2000 for everything) or "adaptive"
+# (model and token budget per question type from history, see routing.py)
+ROUTING_POLICY = "fixed"
+
+# Retry policy for transient API errors (rate limits, timeouts, 5xx)
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 2.0  # seconds, doubled on every retry
+
+# Number of sessions generated concurrently
+CONCURRENCY = 4
+
+# Work queue order: "longest-first" (minimize makespan), "fair-share"
+# (round-robin across question types) or "collection" (as stored)
+SCHEDULE_MODE = "longest-first"
+
+# Seconds an idle worker waits before polling the shared work queue again
+WORKER_POLL_SECONDS = 5
+
+
+# ==============================
+# 📊 MongoDB Data Fetching & Storage
+# ==============================
+def extract_session_data(session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Build the collector's session dict from a sessions document: the first
+    user message (with its code) and the first assistant message (System A).
+    
+    Returns:
+        The session dict, or None if the session has no complete first turn yet
+    """
+    session_id = session.get('sessionId', str(session.get('_id')))
+    messages = session.get('messages', [])
+    
+    # Skip if no messages
+    if not messages or len(messages) < 2:
+        return None
+    
+    # Find first user message and first assistant message (System A)
+    first_user = None
+    first_assistant = None
+    
+    for msg in messages:
+        role = msg.get('role')
+        
+        # Get first user message
+        if role == 'user' and first_user is None:
+            first_user = msg
+        
+        # Get first assistant message (System A response)
+        if role == 'assistant' and first_assistant is None:
+            first_assistant = msg
+        
+        # Stop if we have both
+        if first_user is not None and first_assistant is not None:
+            break
+    
+    # Only usable if we have both user and assistant messages
+    if first_user is None or first_assistant is None:
+        return None
+    return build_turn(session_id, first_user, first_assistant, 0)
+
+
+def build_turn(session_id: str, user_msg: Dict[str, Any], assistant_msg: Dict[str, Any],
+               message_index: int) -> Optional[Dict[str, Any]]:
+    """
+    The collector's session dict for one turn: a user message (with its code)
+    and the assistant message answering it (System A).
+    
+    Returns:
+        The session dict, or None if either message is empty
+    """
+    user_content = user_msg.get('content', '')
+    assistant_content = assistant_msg.get('content', '')
+    if not (user_content and assistant_content):
+        return None
+    
+    code_content = user_msg.get('codeContent')
+    
+    # Combine user message with code content if available
+    full_user_message = user_content
+    if code_content:
+        full_user_message = f"{user_content}\n\n[Code]:\n{code_content}"
+    
+    session_entry = {
+        'sessionId': session_id,
+        'questionType': user_msg.get('questionType', 'GeneralQuestion'),
+        'userMessage': full_user_message,  # Combined message + code
+        'originalUserMessage': user_content,  # Keep original for reference
+        'systemAResponse': assistant_content,
+        'codeContent': code_content,
+        'codeLanguage': user_msg.get('codeLanguage'),
+        'codeOutputPreference': user_msg.get('codeOutputPreference', 'WithCode'),
+        'messageIndex': message_index  # Which user turn (0 = first Q&A pair)
+    }
+    session_entry['inputFingerprint'] = session_fingerprint(session_entry)
+    return session_entry
+
+
+def extract_conversation(session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Build the work item for --all-turns from a sessions document: every turn
+    (the k-th user message with the k-th assistant message), up to the first
+    incomplete one. See conversation.py.
+    
+    Returns:
+        {'sessionId', 'questionType' (of the first turn), 'turns'}, or None
+        if the session has no complete first turn yet
+    """
+    session_id = session.get('sessionId', str(session.get('_id')))
+    messages = session.get('messages', [])
+    user_msgs = [msg for msg in messages if msg.get('role') == 'user']
+    assistant_msgs = [msg for msg in messages if msg.get('role') == 'assistant']
+    
+    turns = []
+    for message_index, (user_msg, assistant_msg) in enumerate(zip(user_msgs, assistant_msgs)):
+        turn = build_turn(session_id, user_msg, assistant_msg, message_index)
+        if turn is None:
+            break
+        turns.append(turn)
+    if not turns:
+        return None
+    chain_turn_fingerprints(turns)
+    return {'sessionId': session_id, 'questionType': turns[0]['questionType'], 'turns': turns}
+
+
+def chain_turn_fingerprints(turns: List[Dict[str, Any]]) -> None:
+    """Make each turn's fingerprint cover the turns before it (their System B responses are its context)."""
+    previous = None
+    for turn in turns:
+        turn['inputFingerprint'] = chain_fingerprint(previous, session_fingerprint(turn))
+        previous = turn['inputFingerprint']
+
+
+def fetch_sessions_from_mongodb(session_ids: List[str] = None, sample: int = None, seed: int = None,
+                                all_turns: bool = False):
+    """
+    Fetch all sessions from MongoDB and extract first user and assistant messages (System A).
+    
+    Args:
+        session_ids: Optional list of sessionIds to restrict the fetch to
+                     (used by --retry-failed)
+        sample: Only fetch a stratified sample of this many sessions (see sampling.py)
+        seed: Seed of the sample
+        all_turns: Extract every turn of each session instead (see extract_conversation)
+    
+    Returns:
+        Tuple: (processed_data, total_sessions, skipped_count, sample_report)
+        sample_report is None unless sample is set
+    """
+    db = get_db()
+    sessions_collection = db[SESSIONS_COLLECTION]
+    
+    # Fetch all sessions (or only the requested ones)
+    query = {} if session_ids is None else {'sessionId': {'$in': session_ids}}
+    sample_report = None
+    if sample is not None:
+        sampled_ids, sample_report = sample_session_ids(sessions_collection, sample, seed, query)
+        query = {'_id': {'$in': sampled_ids}}
+    with stage("fetch_sessions"), memory_stage("fetch"):
+        sessions = list(sessions_collection.find(query))
+    
+    processed_data = []
+    skipped_count = 0
+    
+    extract = extract_conversation if all_turns else extract_session_data
+    with stage("extract_sessions"), memory_stage("shape"):
+        for session in sessions:
+            try:
+                session_entry = extract(session)
+            except Exception:
+                session_entry = None
+            if session_entry is None:
+                skipped_count += 1
+            else:
+                processed_data.append(session_entry)
+    
+    return processed_data, len(sessions), skipped_count, sample_report
+
+
+def store_system_b_response_to_mongo(session_id: str, message_index: int, 
+                                     user_message: str, system_b_response: str,
+                                     question_type: str, code_content: str = None,
+                                     code_language: str = None, 
+                                     code_output_preference: str = None,
+                                     dedup_of: str = None,
+                                     input_fingerprint: str = None,
+                                     route_info: Dict[str, Any] = None) -> None:
+    """
+    Store System B response in MongoDB systembresponses collection.
+    Follows the schema from system-b-response-model.ts. The parsed answer,
+    code blocks, code titles, topics and probable question type are stored
+    alongside the raw response so readers never have to parse it again.
+    
+    Args:
+        dedup_of: sessionId of the representative whose response was reused,
+                  when this session was detected as a duplicate
+        input_fingerprint: Fingerprint of the inputs this response was generated
+                           from (see fingerprint.py), used by --delta
+        route_info: Route the response was generated with ('route', 'model',
+                    'maxTokens') and its 'usage' (None for reused responses)
+    
+    Raises:
+        GenerationFailure: if the write failed, classified from the driver's
+                           exception so it can be dead-lettered and retried
+    """
+    try:
+        db = get_db()
+        system_b_collection = db[SYSTEM_B_COLLECTION]
+        
+        with stage("parse_response"):
+            parsed_fields = parsed_document_fields(system_b_response)
+        
+        # Create document following the schema
+        document = {
+            'sessionId': session_id,
+            'messageIndex': message_index,
+            'userMessage': user_message,
+            'assistantResponse': system_b_response,
+            'questionType': question_type,
+            'codeContent': code_content,
+            'codeLanguage': code_language,
+            'codeOutputPreference': code_output_preference,
+            **parsed_fields,
+            'dedupOf': dedup_of,
+            'inputFingerprint': input_fingerprint,
+            'route': (route_info or {}).get('route'),
+            'model': (route_info or {}).get('model', MODEL),
+            'maxTokens': (route_info or {}).get('maxTokens'),
+            'usage': (route_info or {}).get('usage'),
+            'createdAt': datetime.utcnow(),
+            'updatedAt': datetime.utcnow()
+        }
+        
+        # Use update_one with upsert to avoid duplicates
+        # The compound index (sessionId, messageIndex) ensures uniqueness
+        with stage("store_response"):
+            system_b_collection.update_one(
+                {'sessionId': session_id, 'messageIndex': message_index},
+                {'$set': document},
+                upsert=True
+            )
+        
+    except Exception as e:
+        count("store_errors")
+        raise GenerationFailure.from_exception(e, attempts=1) from e
+
+
+# ==============================
+# 🎨 Console UI Helpers
+# ==============================
+def is_valid_response(response: str) -> bool:
+    """
+    Check if the response is valid and should be stored.
+    Returns False for irrelevant questions or error responses.
+    """
+    if not response or not isinstance(response, str):
+        return False
+    
+    # Never store error markers, regardless of their length
+    if response.startswith(("ERROR:", "INVALID INPUT:")):
+        return False
+    
+    # Check for irrelevant question response
+    irrelevant_markers = [
+        "Sorry, this is an irrelevant question",
+    ]
+    
+    response_lower = response.lower()
+    for marker in irrelevant_markers:
+        if marker.lower() in response_lower:
+            return False
+    
+    # Check if response is too short (likely an error)
+    if len(response.strip()) < 20:
+        return False
+    
+    return True
+
+
+def print_header(text: str):
+    """Print a styled header"""
+    print(f"\n{'=' * 80}")
+    print(f"  {text}")
+    print(f"{'=' * 80}")
+
+
+def print_subheader(text: str):
+    """Print a styled subheader"""
+    print(f"\n{text}")
+    print(f"{'-' * 80}")
+
+
+def print_progress(current: int, total: int, session_id: str, question_type: str):
+    """Print progress in a clean format"""
+    percentage = (current / total) * 100
+    print(f"[{current}/{total}] ({percentage:.1f}%) | {question_type:<20} | {session_id[:30]}...")
+
+
+# ==============================
+# 🔄 Concurrent work queue
+# ==============================
+async def store_and_journal(session_data: Dict[str, Any], system_b_response: str,
+                            journal: ResultsJournal, failures_collection, dedup_of: str = None,
+                            route_info: Dict[str, Any] = None) -> bool:
+    """
+    Store one session's System B response in MongoDB and append it to the
+    results journal. route_info describes the route and usage of the call that
+    produced the response (see store_system_b_response_to_mongo).
+    
+    A failed MongoDB write is recorded in the dead-letter collection (with the
+    exception type), so --retry-failed picks the session up again.
+    
+    Returns:
+        True if the MongoDB write succeeded
+    """
+    session_id = session_data['sessionId']
+    user_message = session_data['userMessage']
+    code_content = session_data.get('codeContent')
+    code_language = session_data.get('codeLanguage')
+    code_output_preference = session_data.get('codeOutputPreference', 'WithCode')
+    message_index = session_data['messageIndex']
+
+    # Store in MongoDB (blocking driver call runs off the event loop)
+    try:
+        await asyncio.to_thread(
+            store_system_b_response_to_mongo,
+            session_id=session_id,
+            message_index=message_index,
+            user_message=user_message,
+            system_b_response=system_b_response,
+            question_type=session_data['questionType'],
+            code_content=code_content,
+            code_language=code_language,
+            code_output_preference=code_output_preference,
+            dedup_of=dedup_of,
+            input_fingerprint=session_data.get('inputFingerprint'),
+            route_info=route_info
+        )
+        stored = True
+    except GenerationFailure as failure:
+        stored = False
+        await asyncio.to_thread(record_failure, failures_collection, session_data, failure)
+        if LIVE.per_session_output:
+            print(f"  ✗ {session_id[:30]}: MongoDB write failed: {failure.error_type} - {failure.message[:200]}")
+    if stored:
+        await asyncio.to_thread(clear_failure, failures_collection, session_id, message_index)
+
+    # Append to the results journal (Excel is built from it at the end)
+    with stage("journal_append"):
+        await journal.append_async({
+            'sessionId': session_id,
+            'questionType': session_data['questionType'],
+            'messageIndex': message_index,
+            'userMessage': session_data.get('originalUserMessage', user_message),
+            'userCodeContent': code_content,
+            'codeOutputPreference': code_output_preference,
+            'fullUserInput': user_message,
+            'codeLanguage': code_language,
+            'systemAResponse': session_data['systemAResponse'],
+            'systemBResponse_COT': system_b_response,
+            'inputFingerprint': session_data.get('inputFingerprint')
+        })
+    return stored
+
+
+async def process_session(session_data: Dict[str, Any], total: int, counters: Dict[str, int],
+                          journal: ResultsJournal, failures_collection, tracker: RunTracker,
+                          route_stats: RouteStats = None, conversation: Dict[str, Any] = None) -> str:
+    """
+    Generate, validate, store and journal the System B response for one session.
+    If the session represents a group of duplicates (see dedup.py), the same
+    response is stored for every member of the group.
+    The session's route (see apply_routes) picks the model and token budget.
+    Outcomes are tallied in the shared counters dict, the run tracker and
+    the per-route stats.
+    With a conversation (--all-turns), the session dict is one turn: it is
+    generated after the conversation's earlier turns, and a valid response
+    is appended to the conversation.
+    
+    Returns:
+        The outcome: "stored", "storage_failed", "invalid" or "failed"
+    """
+    session_id = session_data['sessionId']
+    question_type = session_data['questionType']
+    user_message = session_data['userMessage']
+    code_output_preference = session_data.get('codeOutputPreference', 'WithCode')
+    duplicates = session_data.get('duplicates', [])
+    route = session_data.get('route', 'standard')
+    model = session_data.get('model', MODEL)
+    max_tokens = session_data.get('maxTokens', MAX_OUTPUT_TOKENS)
+    
+    # Show progress (otherwise the periodic summary line covers it, see live_metrics.py)
+    counters['started'] += 1
+    if LIVE.per_session_output:
+        print_progress(counters['started'], total, session_id, question_type)
+    
+    # Generate System B response with user's code preference
+    truncated = None
+    try:
+        generation = await generate_response(user_message, question_type, code_output_preference,
+                                             model=model, max_tokens=max_tokens,
+                                             session_key=f"{session_id}:{session_data['messageIndex']}",
+                                             conversation=conversation)
+        if generation['finish_reason'] == "length" and (route != DEFAULT_ROUTE or max_tokens < MAX_OUTPUT_TOKENS):
+            # Cut off by the routed model or reduced budget: redo it on the standard route at the full budget
+            truncated = {'route': route, 'maxTokens': max_tokens, 'latency': round(generation['latency'], 3),
+                         'promptTokens': generation['prompt_tokens'],
+                         'completionTokens': generation['completion_tokens']}
+            if route_stats is not None:
+                route_stats.record(route, generation['prompt_tokens'], generation['completion_tokens'],
+                                   generation['latency'])
+            count("truncation_escalations")
+            route, model, max_tokens = DEFAULT_ROUTE, ROUTES[DEFAULT_ROUTE]['model'], MAX_OUTPUT_TOKENS
+            generation = await generate_response(user_message, question_type, code_output_preference,
+                                                 model=model, max_tokens=max_tokens,
+                                                 session_key=f"{session_id}:{session_data['messageIndex']}",
+                                                 conversation=conversation)
+        system_b_response = generation['content']
+    except GenerationFailure as failure:
+        counters['generation_failed'] += 1
+        tracker.record("failed")
+        for member in [session_data] + duplicates:
+            await asyncio.to_thread(record_failure, failures_collection, member, failure)
+        if LIVE.per_session_output:
+            status = f" (HTTP {failure.http_status})" if failure.http_status else ""
+            print(f"  ✗ {session_id[:30]}: failed after {failure.attempts} attempt(s): {failure.error_type}{status}")
+        return "failed"
+    
+    # Validate response before storing/exporting
+    usage = {
+        'latency': generation['latency'],
+        'prompt_tokens': generation['prompt_tokens'],
+        'completion_tokens': generation['completion_tokens'],
+    }
+    if truncated:
+        # The cut-off attempt was billed too
+        usage['latency'] += truncated['latency']
+        usage['prompt_tokens'] += truncated['promptTokens']
+        usage['completion_tokens'] += truncated['completionTokens']
+    if route_stats is not None:
+        route_stats.record(route, generation['prompt_tokens'], generation['completion_tokens'], generation['latency'])
+    route_info = {'route': route, 'model': model, 'maxTokens': max_tokens}
+    if not is_valid_response(system_b_response):
+        counters['skipped_invalid'] += 1
+        tracker.record("skipped", **usage)
+        # Recorded with its fingerprint, so --delta does not pay for the same inputs again
+        failure = GenerationFailure(INVALID_RESPONSE, "Response failed validation (is_valid_response)")
+        for member in [session_data] + duplicates:
+            await asyncio.to_thread(record_failure, failures_collection, member, failure)
+        if LIVE.per_session_output:
+            print(f"  ⚠ {session_id[:30]}: Skipped invalid/irrelevant response")
+        return "invalid"
+    if conversation is not None:
+        add_turn(conversation, generation['user_content'], system_b_response)
+
+    stored = await store_and_journal(
+        session_data, system_b_response, journal, failures_collection,
+        route_info={**route_info, 'usage': {
+            'promptTokens': generation['prompt_tokens'],
+            'completionTokens': generation['completion_tokens'],
+            'latency': round(generation['latency'], 3),
+            'finishReason': generation['finish_reason'],
+            # Routing history counts this as a truncation of the original route (see routing.py)
+            'escalatedFrom': truncated,
+        }}
+    )
+    if stored:
+        counters['mongo_success'] += 1
+        tracker.record("done", **usage)
+    else:
+        counters['mongo_failed'] += 1
+        tracker.record("failed", **usage)
+
+    # Fan the response out to duplicates of this session
+    for member in duplicates:
+        if await store_and_journal(member, system_b_response, journal, failures_collection,
+                                   dedup_of=session_id, route_info=route_info):
+            counters['fanned_out'] += 1
+        else:
+            counters['mongo_failed'] += 1
+    
+    return "stored" if stored else "storage_failed"
+
+
+async def process_conversation(item: Dict[str, Any], total: int, counters: Dict[str, int],
+                               journal: ResultsJournal, failures_collection, tracker: RunTracker,
+                               route_stats: RouteStats = None) -> str:
+    """
+    Generate the turns of one --all-turns session in order, each conditioned
+    on the System B conversation before it (see conversation.py). Turns
+    before 'startTurn' are replayed from 'history' rather than generated.
+    If a turn fails or is invalid, the remaining turns are skipped.
+    
+    Returns:
+        "stored" if every turn was stored, otherwise the outcome of the first turn that was not
+    """
+    turns = item['turns']
+    start = item.get('startTurn', 0)
+    first = turns[0]
+    conversation = start_conversation(
+        get_cot_prompt(first['questionType'], first.get('codeOutputPreference', 'WithCode')),
+        first['questionType'], first.get('codeOutputPreference', 'WithCode')
+    )
+    for turn, response in zip(turns[:start], item.get('history', [])):
+        add_turn(conversation, turn_user_content(turn['userMessage'], turn['questionType'],
+                                                 turn.get('codeOutputPreference', 'WithCode'), conversation),
+                 response)
+    
+    result = "stored"
+    for position in range(start, len(turns)):
+        outcome = await process_session(turns[position], total, counters, journal, failures_collection,
+                                        tracker, route_stats, conversation=conversation)
+        count(f"turns_{outcome}")
+        if outcome == "storage_failed" and result == "stored":
+            result = outcome
+        elif outcome in ("failed", "invalid"):
+            # Later turns would be answered in a conversation that does not exist
+            blocked = len(turns) - position - 1
+            for _ in range(blocked):
+                tracker.record("skipped")
+            counters['blocked_turns'] += blocked
+            if blocked and LIVE.per_session_output:
+                print(f"  ⚠ {item['sessionId'][:30]}: Skipped the {blocked} turn(s) after turn {position}")
+            return outcome
+    return result
+
+
+async def run_work_queue(items: List[Dict[str, Any]], handler, concurrency: int) -> None:
+    """
+    Run handler over items with a fixed pool of workers.
+
+    Workers take items strictly in list order, so the order produced by the
+    scheduler decides what starts first.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    enqueued = time.perf_counter()
+    LIVE.watch_queue(queue.qsize)
+
+    async def worker():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            QUEUE_WAIT.set(time.perf_counter() - enqueued)
+            try:
+                await handler(item)
+            except Exception as e:
+                print(f"  ✗ Unexpected error for {item.get('sessionId', '?')}: {type(e).__name__} - {e}")
+            finally:
+                queue.task_done()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+
+async def run_lease_worker(work_collection, worker_id: str, concurrency: int, handler) -> None:
+    """
+    Claim items from the shared work collection until no open work is left.
+
+    Each of the concurrency slots claims one item at a time via an atomic
+    lease; a background heartbeat renews the leases of in-flight items so
+    they are only reclaimed by other workers if this process dies. The
+    heartbeat also refreshes the shared queue's pending count for the live
+    metrics.
+    """
+    in_flight = set()
+    stop = asyncio.Event()
+    pending = {'count': await asyncio.to_thread(pending_count, work_collection)}
+    LIVE.watch_queue(lambda: pending['count'])
+
+    async def heartbeat():
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            if in_flight:
+                await asyncio.to_thread(renew_leases, work_collection, list(in_flight), worker_id)
+            pending['count'] = await asyncio.to_thread(pending_count, work_collection)
+
+    async def slot():
+        while True:
+            item = await asyncio.to_thread(claim_next, work_collection, worker_id)
+            if item is None:
+                # Other workers may still hold leases that could expire and be reclaimed
+                if not await asyncio.to_thread(has_open_work, work_collection):
+                    return
+                await asyncio.sleep(WORKER_POLL_SECONDS)
+                continue
+
+            in_flight.add(item['_id'])
+            QUEUE_WAIT.set((datetime.utcnow() - item['enqueuedAt']).total_seconds()
+                           if item.get('enqueuedAt') else None)
+            try:
+                outcome = await handler(item['payload'])
+            except Exception as e:
+                # Leave the lease to expire so the item is retried by some worker
+                print(f"  ✗ Unexpected error for {item['_id']}: {type(e).__name__} - {e}")
+                continue
+            finally:
+                in_flight.discard(item['_id'])
+            await asyncio.to_thread(complete_item, work_collection, item['_id'], worker_id, outcome)
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        await asyncio.gather(*(slot() for _ in range(max(1, concurrency))))
+    finally:
+        stop.set()
+        await heartbeat_task
+
+
+def session_from_change(system_b_collection, failures_collection, change: Dict[str, Any], pending: set,
+                        route_history: Dict, routing: str) -> Optional[Dict[str, Any]]:
+    """
+    The session dict to generate for one change event, or None if there is
+    nothing to do: the first turn is incomplete, the same inputs are already
+    queued, the stored System B response has the same input fingerprint
+    (later turns appended, or an event replayed after a restart), or the
+    last response for the same inputs was invalid.
+    """
+    session = change.get('fullDocument')
+    if not session:
+        return None
+    session_data = extract_session_data(session)
+    if session_data is None:
+        return None
+    apply_routes([session_data], route_history, routing)
+    if (session_data['sessionId'], session_data['inputFingerprint']) in pending:
+        return None
+    stored = fetch_fingerprints(system_b_collection, [session_data])
+    key = (session_data['sessionId'], session_data['messageIndex'])
+    if stored.get(key) == session_data['inputFingerprint']:
+        return None
+    if fetch_invalid_fingerprints(failures_collection, [session_data]).get(key) == session_data['inputFingerprint']:
+        return None
+    return session_data
+
+
+async def run_watch_service(db, concurrency: int, failures_collection, routing: str = ROUTING_POLICY,
+                            journal_file: str = JOURNAL_FILE) -> None:
+    """
+    Generate System B responses for sessions as they are recorded.
+    
+    A change stream on sessions feeds a bounded queue drained by concurrency
+    workers through process_session. The resume token is persisted every
+    SAVE_INTERVAL seconds, but only up to the last event whose processing (and
+    that of every earlier event) has finished, so a restart never skips work.
+    Runs until interrupted (Ctrl+C).
+    """
+    watch_collection = db[WATCH_COLLECTION]
+    resume_token = load_resume_token(watch_collection, WATCH_NAME)
+    if resume_token is None:
+        print("  ℹ No resume token yet: watching from now. Run once with --delta to cover earlier sessions.")
+    else:
+        print(f"  ↻ Resuming the change stream from the saved token in '{WATCH_COLLECTION}'")
+    
+    counters = {'started': 0, 'mongo_success': 0, 'mongo_failed': 0, 'skipped_invalid': 0,
+                'generation_failed': 0, 'fanned_out': 0}
+    runs_collection = db[RUNS_COLLECTION]
+    ensure_run_indexes(runs_collection)
+    tracker = RunTracker(
+        runs_collection,
+        model=MODEL,
+        prompt_hash=get_prompt_hash(),
+        config={'mode': 'watch', 'concurrency': concurrency, 'maxAttempts': MAX_ATTEMPTS, 'routing': routing},
+        total=0
+    )
+    tracker.start()
+    bind_run(tracker.run_id)
+    print(f"  Run ID: {tracker.run_id} (watch with: python -m System_B_Response.watch_run --run-id {tracker.run_id})")
+    # The journal file outlives runs: rows are stamped with this run's id
+    journal = ResultsJournal(journal_file, flush_every=JOURNAL_FLUSH_EVERY, run_id=tracker.run_id)
+    
+    route_history = load_route_history(db[SYSTEM_B_COLLECTION]) if routing != "fixed" else {}
+    route_stats = RouteStats()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency) * 4)
+    LIVE.attach(tracker)
+    LIVE.watch_queue(queue.qsize)
+    watermark = ResumeWatermark()
+    pending = set()
+    
+    async def worker():
+        while True:
+            seq, session_data, received = await queue.get()
+            QUEUE_WAIT.set(time.perf_counter() - received)
+            try:
+                with stage("session"):
+                    outcome = await process_session(session_data, tracker.total, counters, journal,
+                                                    failures_collection, tracker, route_stats)
+                count(f"sessions_{outcome}")
+            except Exception as e:
+                print(f"  ✗ Unexpected error for {session_data['sessionId']}: {type(e).__name__} - {e}")
+            finally:
+                pending.discard((session_data['sessionId'], session_data['inputFingerprint']))
+                watermark.finish(seq)
+                queue.task_done()
+    
+    async def save_token():
+        processed = watermark.take_advanced()
+        if processed and watermark.safe_token is not None:
+            await asyncio.to_thread(save_resume_token, watch_collection, WATCH_NAME,
+                                    watermark.safe_token, processed)
+    
+    stream = await asyncio.to_thread(open_session_stream, db[SESSIONS_COLLECTION], resume_token)
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    reporter = asyncio.create_task(LIVE.run_reporter())
+    flusher = asyncio.create_task(tracker.run_flusher())
+    print(f"  👀 Watching '{SESSIONS_COLLECTION}' for new first turns (Ctrl+C to stop)")
+    
+    run_status = "interrupted"
+    last_save = time.monotonic()
+    try:
+        while True:
+            change = await asyncio.to_thread(stream.try_next)
+            if change is not None:
+                seq = watermark.begin(change['_id'])
+                session_data = await asyncio.to_thread(
+                    session_from_change, db[SYSTEM_B_COLLECTION], failures_collection, change, pending, route_history, routing
+                )
+                if session_data is None:
+                    watermark.finish(seq)
+                else:
+                    pending.add((session_data['sessionId'], session_data['inputFingerprint']))
+                    tracker.add_total(1)
+                    await queue.put((seq, session_data, time.perf_counter()))
+            if time.monotonic() - last_save >= SAVE_INTERVAL:
+                await save_token()
+                last_save = time.monotonic()
+    except Exception as e:
+        run_status = "failed"
+        print(f"\n❌ Change stream error: {type(e).__name__} - {e}")
+    finally:
+        for task in workers + [reporter, flusher]:
+            task.cancel()
+        await asyncio.gather(*workers, reporter, flusher, return_exceptions=True)
+        # In-flight events are not covered by the saved token and are replayed on restart
+        await save_token()
+        await asyncio.to_thread(stream.close)
+        tracker.finish(run_status)
+        LIVE.finish(run_status)
+        journal.close()
+        print(f"\n✓ Watch stopped | Generated {counters['mongo_success']} | "
+              f"Generation Errors: {counters['generation_failed']} | "
+              f"Not yet processed: {watermark.in_flight} (resumed on restart)")
+        for line in route_stats.lines():
+            print(f"  🧭 {line}")
+
+
+def select_api_key(index: int) -> str:
+    """Pick a key from OPENAI_API_KEYS (falls back to OPENAI_API_KEY)."""
+    keys = openai_api_keys()
+    return keys[index % len(keys)]
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+# ==============================
+# 🚀 Main processing function
+# ==============================
+async def main(args: argparse.Namespace):
+    """
+    Run the collector for parsed command-line arguments (see cli.py).
+    The shared clients are left open; the caller closes them.
+    """
+    global _api_key
+    print_header("SYSTEM B RESPONSE GENERATOR - CHAIN-OF-THOUGHT")
+    
+    ping_mongo()
+    db = get_db()
+    output_file = args.output or OUTPUT_FILE
+    base_journal_file = os.path.splitext(output_file)[0] + ".jsonl"
+    failures_collection = db[FAILURES_COLLECTION]
+    work_collection = db[WORK_COLLECTION]
+    ensure_failure_indexes(failures_collection)
+    if args.enqueue or args.worker:
+        ensure_work_indexes(work_collection)
+    
+    if args.watch:
+        # Service mode: generate for new sessions as they arrive, until interrupted
+        print_subheader(f"Live Generation: Watching '{SESSIONS_COLLECTION}'")
+        await run_watch_service(db, args.concurrency, failures_collection, args.routing, base_journal_file)
+        return
+    
+    sample_seed = None
+    if args.worker:
+        # Worker mode: sessions come from the shared work queue, not from a local fetch
+        worker_id = args.worker_id or default_worker_id()
+        _api_key = select_api_key(args.api_key_index)
+        stats = queue_stats(work_collection)
+        total = stats.get('pending', 0) + stats.get('leased', 0)
+        journal_file = f"{os.path.splitext(base_journal_file)[0]}.{worker_id}.jsonl"
+        print_subheader(f"Worker {worker_id}: Claiming Sessions from '{WORK_COLLECTION}'")
+        print(f"  Open items: {total} | Concurrency: {args.concurrency} | API key #{args.api_key_index}")
+        sessions_data = None
+    else:
+        journal_file = base_journal_file
+        
+        # STEP 1: Fetch sessions from MongoDB
+        print_subheader("Step 1: Loading Sessions from MongoDB")
+        
+        try:
+            session_ids = None
+            failed_turns = None
+            if args.retry_failed:
+                failed_turns = fetch_failed_turns(failures_collection)
+                if not failed_turns:
+                    print(f"\n✓ No failed sessions in '{FAILURES_COLLECTION}'. Nothing to retry.")
+                    return
+                session_ids = sorted({session_id for session_id, _ in failed_turns})
+                print(f"  ↻ RETRY MODE: Reprocessing {len(failed_turns)} failed turns in {len(session_ids)} sessions")
+            
+            if args.sample is not None:
+                # Always seeded, so a smoke run can be repeated on the same sessions
+                sample_seed = args.seed if args.seed is not None else random.randrange(1_000_000)
+            # Failed turns can be later turns: extract every turn, then keep the failed ones
+            sessions_data, total_sessions, skipped, sample_report = fetch_sessions_from_mongodb(
+                session_ids, sample=args.sample, seed=sample_seed,
+                all_turns=args.all_turns or args.retry_failed)
+            
+            if failed_turns is not None:
+                with stage("retry_turns"):
+                    stored = fetch_stored_turns(db[SYSTEM_B_COLLECTION], sessions_data)
+                    sessions_data, retry_report = select_retry_turns(sessions_data, failed_turns, stored,
+                                                                     all_turns=args.all_turns)
+                if retry_report['missing']:
+                    print(f"  ⚠ {retry_report['missing']} failed turns no longer exist in "
+                          f"'{SESSIONS_COLLECTION}' (left in '{FAILURES_COLLECTION}')")
+            
+            if sample_report is not None:
+                print(f"  🎲 SAMPLE MODE: {sample_report['sampled']} of {sample_report['population']} usable sessions "
+                      f"(seed {sample_seed}; repeat with --sample {args.sample} --seed {sample_seed})")
+                print("     Strata: " + ", ".join(f"{name}({taken}/{size})"
+                                                  for name, (taken, size) in sample_report['strata'].items()))
+            
+            if not sessions_data:
+                print("\n❌ No valid sessions found. Exiting.")
+                return
+            
+            # Question type distribution
+            question_types = {}
+            for session in sessions_data:
+                qtype = session['questionType']
+                question_types[qtype] = question_types.get(qtype, 0) + 1
+            
+            print(f"\n✓ Loaded {len(sessions_data)} valid sessions (Total: {total_sessions}, Skipped: {skipped})")
+            print(f"  Question Types: {', '.join([f'{k}({v})' for k, v in question_types.items()])}")
+            if args.all_turns or args.retry_failed:
+                print(f"  💬 TURNS: {pending_turns(sessions_data)} turns in {len(sessions_data)} sessions")
+            
+        except Exception as e:
+            print(f"\n❌ MongoDB Error: {e}")
+            return
+        
+        try:
+            route_history = load_route_history(db[SYSTEM_B_COLLECTION]) if args.routing != "fixed" else {}
+        except Exception:
+            route_history = {}
+        # Multi-turn items (--all-turns, or failed later turns under --retry-failed) next to single turns
+        conversations = [item for item in sessions_data if 'turns' in item]
+        singles = [item for item in sessions_data if 'turns' not in item]
+        with stage("apply_routes"):
+            route_counts = apply_routes(singles, route_history, args.routing)
+            for route, sessions in apply_conversation_routes(conversations, route_history, args.routing).items():
+                route_counts[route] = route_counts.get(route, 0) + sessions
+        print(f"  🧭 Routing ({args.routing}): " + ", ".join(f"{route}({count})" for route, count in route_counts.items()))
+        
+        if args.delta and args.all_turns and not args.retry_failed:
+            with stage("delta"):
+                stored = fetch_stored_turns(db[SYSTEM_B_COLLECTION], sessions_data)
+                invalid = fetch_invalid_fingerprints(failures_collection, sessions_data)
+                sessions_data, delta_report = select_stale_turns(sessions_data, stored, invalid)
+            print(f"  Δ Delta: {delta_report['turns']} turns in {len(sessions_data)} sessions to regenerate | "
+                  f"replayed as context: {delta_report['reused']} | unchanged sessions: {delta_report['unchanged']} | "
+                  f"invalid last time: {delta_report['invalid']}")
+            if not sessions_data:
+                print(f"\n✓ '{SYSTEM_B_COLLECTION}' is up to date. Nothing to regenerate.")
+                return
+        elif args.delta:
+            # Failed later turns are always retried: they have no usable stored response
+            with stage("delta"):
+                stored = fetch_fingerprints(db[SYSTEM_B_COLLECTION], singles)
+                invalid = fetch_invalid_fingerprints(failures_collection, singles)
+                singles, delta_report = select_changed(singles, stored, invalid)
+                sessions_data = singles + conversations
+            print(f"  Δ Delta: {len(sessions_data)} to regenerate (new: {delta_report['new']}, "
+                  f"changed: {delta_report['changed']}, no fingerprint: {delta_report['unfingerprinted']}) | "
+                  f"unchanged: {delta_report['unchanged']} | invalid last time: {delta_report['invalid']}")
+            if not sessions_data:
+                print(f"\n✓ '{SYSTEM_B_COLLECTION}' is up to date. Nothing to regenerate.")
+                return
+        
+        if args.dedup:
+            with stage("dedup"), memory_stage("dedup"):
+                singles = [item for item in sessions_data if 'turns' not in item]
+                singles, dedup_report = deduplicate(singles, threshold=args.dedup_threshold)
+                sessions_data = singles + conversations
+            print(f"  🔁 Dedup: {dedup_report['sessions']} sessions → {dedup_report['representatives']} LLM calls "
+                  f"(exact: {dedup_report['exact_duplicates']}, near: {dedup_report['near_duplicates']}, "
+                  f"saved: {dedup_report['calls_saved']})")
+        
+        try:
+            cost_model = load_cost_model(db[SYSTEM_B_COLLECTION])
+        except Exception:
+            cost_model = {}
+        
+        if args.enqueue:
+            # Enqueue mode: publish the work for --worker processes and exit
+            print_subheader(f"Step 2: Enqueueing Sessions into '{WORK_COLLECTION}'")
+            if conversations:
+                # Workers answer single turns; a later turn needs the conversation before it
+                print(f"  ⚠ {pending_turns(conversations)} failed later turns are not enqueued "
+                      f"(retry them with --retry-failed without --enqueue)")
+                sessions_data = [item for item in sessions_data if 'turns' not in item]
+            priorities = [estimate_cost(session, cost_model) for session in sessions_data]
+            # Failed and changed sessions must be redone even if the queue already finished them
+            added = enqueue_sessions(work_collection, sessions_data, priorities,
+                                     requeue=args.retry_failed or args.delta)
+            print(f"✓ Enqueued {added} new items | Queue: {queue_stats(work_collection)}")
+            print("  Start workers with: --worker [--api-key-index N]")
+            return
+        
+        with stage("schedule"):
+            sessions_data = schedule(sessions_data, args.schedule, cost_model)
+        total = pending_turns(sessions_data)
+
+    # STEP 2: Generate System B Responses
+    print_subheader("Step 2: Generating Chain-of-Thought Responses")
+    if sessions_data is not None:
+        print(f"  Schedule: {args.schedule} | Concurrency: {args.concurrency} | Cost model: {len(cost_model)} question types")
+    
+    counters = {'started': 0, 'mongo_success': 0, 'mongo_failed': 0, 'skipped_invalid': 0,
+                'generation_failed': 0, 'fanned_out': 0, 'blocked_turns': 0}
+    
+    runs_collection = db[RUNS_COLLECTION]
+    ensure_run_indexes(runs_collection)
+    # Adaptive routing mixes models: record the models in use and the sessions per route
+    routes = count_routes(sessions_data) if sessions_data is not None else {}
+    run_model = MODEL
+    if args.routing != "fixed":
+        run_model = "+".join(sorted({ROUTES[route]['model'] for route in routes})) or args.routing
+    tracker = RunTracker(
+        runs_collection,
+        model=run_model,
+        prompt_hash=get_prompt_hash(),
+        config={
+            'mode': 'worker' if args.worker else ('retry-failed' if args.retry_failed else 'batch'),
+            'concurrency': args.concurrency,
+            'schedule': args.schedule,
+            'maxAttempts': MAX_ATTEMPTS,
+            'sample': args.sample,
+            'sampleSeed': sample_seed,
+            'dedup': args.dedup,
+            'delta': args.delta,
+            'routing': args.routing,
+            'routes': routes,
+            'allTurns': args.all_turns,
+        },
+        total=total
+    )
+    tracker.start()
+    bind_run(tracker.run_id)
+    print(f"  Run ID: {tracker.run_id} (watch with: python -m System_B_Response.watch_run --run-id {tracker.run_id})")
+    # The journal file outlives runs: rows are stamped with this run's id
+    journal = ResultsJournal(journal_file, flush_every=JOURNAL_FLUSH_EVERY, run_id=tracker.run_id)
+    
+    route_stats = RouteStats()
+    
+    async def handle(session_data):
+        # Multi-turn item: one work item per session, its turns in order (sessions still run concurrently)
+        process = process_conversation if 'turns' in session_data else process_session
+        with stage("session"):
+            outcome = await process(session_data, total, counters, journal, failures_collection,
+                                    tracker, route_stats)
+        count(f"sessions_{outcome}")
+        return outcome
+    
+    LIVE.attach(tracker)
+    reporter = asyncio.create_task(LIVE.run_reporter())
+    flusher = asyncio.create_task(tracker.run_flusher())
+    run_status = "interrupted"
+    try:
+        with memory_stage("generate"):
+            if args.worker:
+                await run_lease_worker(work_collection, worker_id, args.concurrency, handle)
+            else:
+                await run_work_queue(sessions_data, handle, args.concurrency)
+        run_status = "completed"
+    finally:
+        reporter.cancel()
+        flusher.cancel()
+        await asyncio.gather(reporter, flusher, return_exceptions=True)
+        tracker.finish(run_status)
+        LIVE.finish(run_status)
+        journal.close()
+    processed = counters['started']
+    mongo_success = counters['mongo_success']
+    mongo_failed = counters['mongo_failed']
+    skipped_invalid = counters['skipped_invalid']
+    generation_failed = counters['generation_failed']
+    fanned_out = counters['fanned_out']
+    print(f"\n✓ Generated {mongo_success} responses | Failed: {mongo_failed} | Skipped Invalid: {skipped_invalid} | Generation Errors: {generation_failed}")
+    if fanned_out:
+        print(f"  🔁 Reused for {fanned_out} duplicate sessions (no extra LLM calls)")
+    if counters['blocked_turns']:
+        print(f"  ⚠ Skipped {counters['blocked_turns']} later turns of sessions with a failed or invalid turn")
+    if args.all_turns:
+        tokens = PROFILER.report()['counters']
+        prompt_tokens = tokens.get('prompt_tokens', 0)
+        cached = tokens.get('cached_prompt_tokens', 0)
+        share = f" ({cached / prompt_tokens * 100:.1f}%)" if prompt_tokens else ""
+        print(f"  💬 Prefix cache: {cached:,} of {prompt_tokens:,} prompt tokens served from cache{share}")
+    for line in route_stats.lines():
+        print(f"  🧭 {line}")
+
+    # STEP 3: Save to Excel (streamed from the journal)
+    print_subheader("Step 3: Saving Results to Excel")
+    
+    print(f"✓ Journal: {journal_file} ({journal.rows_written} rows this run)")
+    if args.worker:
+        # Several workers share the results; build Excel once from Mongo or the merged journals
+        output_file = "(skipped in worker mode)"
+        print("  ℹ Worker mode: Excel export skipped (replay the journals with results_journal.py)")
+    else:
+        with stage("excel_export"), memory_stage("write"):
+            excel_rows = export_journal_to_excel(journal_file, output_file, run_id=tracker.run_id)
+        
+        file_size = os.path.getsize(output_file) / 1024  # KB
+        print(f"✓ Saved: {output_file}")
+        print(f"  Rows: {excel_rows} | Size: {file_size:.2f} KB")
+    
+    # STEP 4: Verify MongoDB Storage
+    print_subheader("Step 4: Verifying MongoDB Storage")
+    
+    system_b_collection = db[SYSTEM_B_COLLECTION]
+    total_in_db = system_b_collection.count_documents({})
+    
+    print(f"✓ Total documents in '{SYSTEM_B_COLLECTION}': {total_in_db}")
+    if args.worker:
+        print(f"✓ Work queue '{WORK_COLLECTION}': {queue_stats(work_collection)}")
+    
+    # Final Summary
+    print_header("✅ PROCESS COMPLETED SUCCESSFULLY")
+    print(f"""
+  📊 Summary:
+     • Sessions Processed: {processed}
+     • Valid Responses Generated: {mongo_success}
+     • Reused for Duplicates: {fanned_out}
+     • Invalid/Skipped: {skipped_invalid}
+     • Failed: {mongo_failed}
+     • Generation Errors: {generation_failed} (see '{FAILURES_COLLECTION}', rerun with --retry-failed)
+     • Stored in MongoDB: {SYSTEM_B_COLLECTION}
+     • Results Journal: {journal_file}
+     • Excel Output: {output_file}
+     
+  🎯 Next Step: Use evaluation API to compare System A vs System B
+     Endpoint: GET /api/evaluation
+    """)
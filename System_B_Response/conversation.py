@@ -0,0 +1,179 @@
+"""
+Multi-turn System B generation (--all-turns).
+
+By default the collector only answers the first user message of a session.
+With --all-turns every user turn gets a System B response, generated with
+the System B conversation so far as context (never System A's answers):
+
+    system     COT prompt of the session's first turn
+    user       turn 0 (as sent when turn 0 was generated)
+    assistant  System B response to turn 0
+    user       turn 1
+    ...
+    user       turn k
+
+Turn k is the k-th user message paired with the k-th assistant message
+(System A), and is stored with messageIndex k.
+
+Scheduling: a session is one work item whose turns run in order, while up
+to --concurrency sessions run in parallel. If a turn fails or its response
+is invalid, the remaining turns of that session are skipped, since they
+would be conditioned on a conversation that does not exist.
+
+Prefix caching: providers such as OpenAI cache the longest previously seen
+prompt prefix (from 1024 tokens, in 128-token steps) and bill cached input
+tokens at a discount. Every request of a session therefore starts with the
+same bytes: the system prompt never changes within a session, earlier turns
+are replayed exactly as they were sent, and turn-specific instructions (a
+later turn with another question type or code output preference) are
+appended to that turn's user message instead of changing the system prompt.
+The request for turn k+1 is the request for turn k plus two messages, so
+only those are new input. The cached share is reported as
+cached_prompt_tokens in the stage-timing report and per call in the call
+traces.
+
+With --delta a session restarts at its first turn that is new or whose
+input fingerprint changed, and every later turn is regenerated as well
+(its context changed); earlier turns are replayed from systembresponses.
+Turn fingerprints are chained, so turn k's covers the inputs of turns 0..k.
+A session whose restart turn last produced an invalid response for the same
+fingerprint is skipped.
+
+--retry-failed uses the same mechanism for failed later turns: a session
+restarts at its first failed turn, with the stored responses before it
+replayed as context (see select_retry_turns).
+"""
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Session lookups per $in query
+LOOKUP_BATCH = 1000
+
+
+def chain_fingerprint(previous: Optional[str], own: str) -> str:
+    """Fingerprint of a turn given the fingerprint of the turn before it."""
+    if previous is None:
+        return own
+    return hashlib.sha256(f"{previous}:{own}".encode('utf-8')).hexdigest()[:32]
+
+
+def start_conversation(system_prompt: str, question_type: str, code_output_preference: str) -> Dict[str, Any]:
+    """
+    Context of one session: the system prompt, the (questionType,
+    codeOutputPreference) variant it was built for, and the messages so far.
+    """
+    return {'system': system_prompt, 'variant': (question_type, code_output_preference), 'messages': []}
+
+
+def add_turn(conversation: Dict[str, Any], user_content: str, response: str) -> None:
+    """Append a finished turn, exactly as sent and answered."""
+    conversation['messages'].append({'role': 'user', 'content': user_content})
+    conversation['messages'].append({'role': 'assistant', 'content': response})
+
+
+def fetch_stored_turns(collection, items: List[Dict[str, Any]]) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    """Stored {inputFingerprint, assistantResponse} per (sessionId, messageIndex) for the given sessions."""
+    session_ids = sorted({item['sessionId'] for item in items})
+    stored = {}
+    for start in range(0, len(session_ids), LOOKUP_BATCH):
+        cursor = collection.find(
+            {'sessionId': {'$in': session_ids[start:start + LOOKUP_BATCH]}},
+            {'_id': 0, 'sessionId': 1, 'messageIndex': 1, 'inputFingerprint': 1, 'assistantResponse': 1}
+        )
+        for doc in cursor:
+            stored[(doc['sessionId'], doc.get('messageIndex', 0))] = doc
+    return stored
+
+
+def select_stale_turns(items: List[Dict[str, Any]], stored: Dict[Tuple[str, int], Dict[str, Any]],
+                       invalid: Dict[Tuple[str, int], Optional[str]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Set each session's 'startTurn' to its first new or changed turn and its
+    'history' to the stored responses before it; drop sessions that are up to
+    date, or whose first new or changed turn was invalid for the same
+    fingerprint last time (invalid, see dead_letter.fetch_invalid_fingerprints).
+
+    Returns:
+        (sessions to generate, report with turns to generate, reused turns,
+         sessions skipped as invalid and unchanged sessions)
+    """
+    stale = []
+    report = {'turns': 0, 'reused': 0, 'invalid': 0, 'unchanged': 0}
+    invalid = invalid or {}
+    for item in items:
+        history = []
+        for turn in item['turns']:
+            doc = stored.get((item['sessionId'], turn['messageIndex']))
+            if not doc or doc.get('inputFingerprint') != turn['inputFingerprint'] or not doc.get('assistantResponse'):
+                break
+            history.append(doc['assistantResponse'])
+        if len(history) == len(item['turns']):
+            report['unchanged'] += 1
+            continue
+        restart = item['turns'][len(history)]
+        if invalid.get((item['sessionId'], restart['messageIndex'])) == restart['inputFingerprint']:
+            report['invalid'] += 1
+            continue
+        item['startTurn'] = len(history)
+        item['history'] = history
+        report['turns'] += len(item['turns']) - len(history)
+        report['reused'] += len(history)
+        stale.append(item)
+    return stale, report
+
+
+def select_retry_turns(items: List[Dict[str, Any]], failed: List[Tuple[str, int]],
+                       stored: Dict[Tuple[str, int], Dict[str, Any]],
+                       all_turns: bool = False) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Restrict each session to its failed turns for --retry-failed.
+
+    A session restarts at its first failed turn (or earlier, at the first
+    turn before it without a stored response), with the stored responses
+    before it as 'history'. Turns after the last failed one are dropped
+    unless all_turns is set. A session whose only failed turn is turn 0 and
+    that keeps one turn is returned as that plain turn, so it takes the
+    single-turn path.
+
+    Returns:
+        (work items, report with failed turns found and failed turns whose
+         session or turn no longer exists)
+    """
+    by_session: Dict[str, List[int]] = {}
+    for session_id, message_index in failed:
+        by_session.setdefault(session_id, []).append(message_index)
+
+    selected = []
+    report = {'turns': 0, 'missing': 0}
+    seen = set()
+    for item in items:
+        seen.add(item['sessionId'])
+        indexes = by_session.get(item['sessionId'], [])
+        present = [index for index in indexes if index < len(item['turns'])]
+        report['missing'] += len(indexes) - len(present)
+        if not present:
+            continue
+        report['turns'] += len(present)
+        history = []
+        for turn in item['turns'][:min(present)]:
+            doc = stored.get((item['sessionId'], turn['messageIndex']))
+            if not doc or not doc.get('assistantResponse'):
+                break
+            history.append(doc['assistantResponse'])
+        if not all_turns:
+            item['turns'] = item['turns'][:max(present) + 1]
+        if not history and len(item['turns']) == 1:
+            selected.append(item['turns'][0])
+            continue
+        item['startTurn'] = len(history)
+        item['history'] = history
+        selected.append(item)
+    report['missing'] += sum(len(indexes) for session_id, indexes in by_session.items()
+                             if session_id not in seen)
+    return selected, report
+
+
+def pending_turns(items: List[Dict[str, Any]]) -> int:
+    """Number of turns the given work items will generate (a single turn counts as one)."""
+    return sum(len(item['turns']) - item.get('startTurn', 0) if 'turns' in item else 1 for item in items)
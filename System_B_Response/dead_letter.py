@@ -0,0 +1,146 @@
+"""
+Failure classification and dead-letter storage for System B generation.
+
+Instead of turning exceptions into "ERROR: ..." strings (which could slip past
+validation into systembresponses and the Excel output), failed generations are
+captured as structured records in a dead-letter collection. The collector can
+then reprocess exactly the failed turns with --retry-failed.
+
+Responses that fail validation are recorded too (errorType InvalidResponse,
+with the input fingerprint they were generated from), so --delta does not
+pay for them again on every run; --retry-failed still retries them.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Exception class names that indicate a transient problem worth retrying
+RETRYABLE_ERROR_TYPES = {
+    "RateLimitError",
+    "APITimeoutError",
+    "APIConnectionError",
+    "InternalServerError",
+    "TimeoutError",
+    "ConnectionError",
+}
+
+# HTTP status codes that indicate a transient problem worth retrying
+RETRYABLE_HTTP_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# errorType of a generated response that failed validation
+INVALID_RESPONSE = "InvalidResponse"
+
+# Session lookups per $in query
+LOOKUP_BATCH = 1000
+
+
+class GenerationFailure(Exception):
+    """
+    Raised when a System B response could not be generated.
+
+    Carries everything needed to write a dead-letter record: the exception
+    type, the HTTP status (if the error came from the API), the number of
+    attempts made and whether the error is considered transient.
+    """
+
+    def __init__(self, error_type: str, message: str, http_status: Optional[int] = None,
+                 attempts: int = 1, retryable: bool = False):
+        super().__init__(f"{error_type} - {message}")
+        self.error_type = error_type
+        self.message = message
+        self.http_status = http_status
+        self.attempts = attempts
+        self.retryable = retryable
+
+    @classmethod
+    def from_exception(cls, exc: Exception, attempts: int) -> "GenerationFailure":
+        """Classify an arbitrary exception raised during generation."""
+        error_type = type(exc).__name__
+        http_status = getattr(exc, "status_code", None)
+        retryable = (
+            error_type in RETRYABLE_ERROR_TYPES
+            or (http_status is not None and http_status in RETRYABLE_HTTP_STATUSES)
+        )
+        return cls(error_type, str(exc), http_status=http_status,
+                   attempts=attempts, retryable=retryable)
+
+
+# ==============================
+# 🗃️ Dead-letter collection helpers
+# ==============================
+def ensure_failure_indexes(collection) -> None:
+    """Create the (sessionId, messageIndex) unique index on the dead-letter collection."""
+    collection.create_index([('sessionId', 1), ('messageIndex', 1)], unique=True)
+
+
+def record_failure(collection, session_data: Dict[str, Any], failure: GenerationFailure) -> bool:
+    """
+    Upsert a failure record for a session into the dead-letter collection.
+
+    Repeated failures of the same session update the record in place and
+    increment its failureCount.
+
+    Returns:
+        True if successful, False otherwise
+    """
+    now = datetime.utcnow()
+    try:
+        collection.update_one(
+            {'sessionId': session_data['sessionId'], 'messageIndex': session_data['messageIndex']},
+            {
+                '$set': {
+                    'questionType': session_data.get('questionType'),
+                    'codeOutputPreference': session_data.get('codeOutputPreference'),
+                    'inputFingerprint': session_data.get('inputFingerprint'),
+                    'errorType': failure.error_type,
+                    'errorMessage': failure.message[:2000],
+                    'httpStatus': failure.http_status,
+                    'attempts': failure.attempts,
+                    'retryable': failure.retryable,
+                    'lastFailedAt': now,
+                },
+                '$setOnInsert': {'firstFailedAt': now},
+                '$inc': {'failureCount': 1},
+            },
+            upsert=True
+        )
+        return True
+    except Exception:
+        return False
+
+
+def clear_failure(collection, session_id: str, message_index: int) -> None:
+    """Remove a session from the dead-letter collection after a successful retry."""
+    try:
+        collection.delete_one({'sessionId': session_id, 'messageIndex': message_index})
+    except Exception:
+        pass
+
+
+def fetch_failed_turns(collection) -> List[Tuple[str, int]]:
+    """Return the (sessionId, messageIndex) pairs currently recorded in the dead-letter collection."""
+    cursor = collection.find({}, {'_id': 0, 'sessionId': 1, 'messageIndex': 1})
+    return sorted({(doc['sessionId'], doc.get('messageIndex', 0)) for doc in cursor})
+
+
+def fetch_invalid_fingerprints(collection, items: List[Dict[str, Any]]) -> Dict[Tuple[str, int], Optional[str]]:
+    """
+    Input fingerprints of the turns of the given sessions whose last response
+    was invalid, keyed by (sessionId, messageIndex).
+    """
+    session_ids = sorted({item['sessionId'] for item in items})
+    invalid = {}
+    for start in range(0, len(session_ids), LOOKUP_BATCH):
+        cursor = collection.find(
+            {'sessionId': {'$in': session_ids[start:start + LOOKUP_BATCH]}, 'errorType': INVALID_RESPONSE},
+            {'_id': 0, 'sessionId': 1, 'messageIndex': 1, 'inputFingerprint': 1}
+        )
+        for doc in cursor:
+            invalid[(doc['sessionId'], doc.get('messageIndex', 0))] = doc.get('inputFingerprint')
+    return invalid
+
+
+def summarize_failures(collection) -> Dict[str, int]:
+    """Count dead-letter records by error type."""
+    pipeline = [{'$group': {'_id': '$errorType', 'count': {'$sum': 1}}}]
+    return {doc['_id']: doc['count'] for doc in collection.aggregate(pipeline)}
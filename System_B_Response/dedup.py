@@ -0,0 +1,188 @@
+"""
+Exact and near-duplicate detection of user messages before generation.
+
+Students ask the same questions over and over. Before sending sessions to the
+LLM, duplicates are grouped so that one representative per group is generated
+and its response fans out to every member:
+
+- Exact duplicates: identical normalized message and identical code
+- Near duplicates:  identical code and a near-identical message: MinHash
+                    signatures over word 3-gram shingles of the message,
+                    bucketed with LSH banding and confirmed by estimated
+                    Jaccard similarity against the group's representative
+
+Only sessions with the same questionType, codeOutputPreference and code are
+ever grouped: the first two change the prompt, and code that differs by one
+bug needs its own answer (a near-identical program must not receive another
+student's fixed code). Every member is compared with its representative
+directly, so groups never grow by chaining similar-to-similar matches.
+Everything runs locally with NumPy; no embedding API is used.
+"""
+import hashlib
+import re
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np  # imported where used, keeping `import dedup` cheap
+
+
+# Estimated Jaccard similarity at or above which two messages are near-duplicates
+DEDUP_THRESHOLD = 0.8
+
+# MinHash signature length and LSH banding (NUM_PERM = BANDS * rows per band).
+# 16 bands x 8 rows puts the LSH candidate threshold at about (1/16)^(1/8) ≈ 0.71,
+# below DEDUP_THRESHOLD, so true near-duplicates are rarely missed.
+NUM_PERM = 128
+BANDS = 16
+
+SHINGLE_SIZE = 3
+
+_PRIME = 4294967311  # smallest prime above 2**32
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace."""
+    return _WHITESPACE.sub(" ", (text or "").lower()).strip()
+
+
+def dedup_text(session_data: Dict[str, Any]) -> str:
+    """The text compared for near-duplicates: the user's message (the code must match exactly)."""
+    return normalize_text(session_data.get('originalUserMessage') or session_data.get('userMessage') or '')
+
+
+def code_hash(session_data: Dict[str, Any]) -> str:
+    """Hash of the user's code with whitespace collapsed (case is significant in code)."""
+    code = _WHITESPACE.sub(" ", session_data.get('codeContent') or '').strip()
+    return hashlib.sha1(code.encode('utf-8')).hexdigest()
+
+
+def bucket_key(session_data: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Only sessions sharing this key can be duplicates of each other."""
+    return (session_data.get('questionType'), session_data.get('codeOutputPreference'), code_hash(session_data))
+
+
+def content_hash(session_data: Dict[str, Any]) -> str:
+    key = "\0".join(str(part) for part in bucket_key(session_data)) + "\0" + dedup_text(session_data)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> "np.ndarray":
+    """32-bit hashes of the word n-gram shingles of a normalized text."""
+    import numpy as np
+
+    tokens = _TOKEN_PATTERN.findall(text)
+    if len(tokens) < size:
+        grams = [" ".join(tokens)] if tokens else [""]
+    else:
+        grams = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64)
+
+
+class MinHasher:
+    """Vectorized MinHash with NUM_PERM universal hash functions (a*x + b) mod p."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        # a < 2**31 keeps a*x + b below 2**64 for 32-bit x, so uint64 math never overflows
+        self.a = rng.integers(1, 2 ** 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2 ** 31, size=num_perm, dtype=np.uint64)
+        self.prime = np.uint64(_PRIME)
+
+    def signature(self, shingle_hashes: "np.ndarray") -> "np.ndarray":
+        import numpy as np
+
+        values = (np.outer(shingle_hashes, self.a) + self.b) % self.prime
+        return values.min(axis=0)
+
+
+def estimated_jaccard(sig_a: "np.ndarray", sig_b: "np.ndarray") -> float:
+    return float((sig_a == sig_b).mean())
+
+
+def deduplicate(sessions_data: List[Dict[str, Any]], threshold: float = DEDUP_THRESHOLD,
+                near: bool = True) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Group duplicate sessions and return one representative per group.
+
+    Each representative gets a 'duplicates' list holding the other members of
+    its group; the collector generates the representative once and stores
+    the response for every member.
+
+    Args:
+        sessions_data: Session dicts from fetch_sessions_from_mongodb
+        threshold: Minimum estimated Jaccard similarity for near-duplicates
+        near: Also detect near-duplicates (exact duplicates are always merged)
+
+    Returns:
+        (representatives, report) where report has sessions, representatives,
+        exact_duplicates, near_duplicates and calls_saved
+    """
+    count = len(sessions_data)
+    # Index of each session's representative (the earliest session of its group)
+    group_of: Dict[int, int] = {}
+
+    # Exact duplicates by normalized content hash
+    first_by_hash: Dict[str, int] = {}
+    exact = 0
+    for index, session in enumerate(sessions_data):
+        digest = content_hash(session)
+        if digest in first_by_hash:
+            group_of[index] = first_by_hash[digest]
+            exact += 1
+        else:
+            first_by_hash[digest] = index
+    distinct = sorted(first_by_hash.values())
+
+    # Near duplicates among the remaining distinct messages (MinHash + LSH).
+    # In session order, each message joins the most similar earlier
+    # representative it shares an LSH band with, or becomes a representative.
+    if near:
+        hasher = MinHasher()
+        rows = NUM_PERM // BANDS
+        signatures = {index: hasher.signature(shingles(dedup_text(sessions_data[index]))) for index in distinct}
+
+        lsh_buckets: Dict[Tuple, List[int]] = {}
+        for index in distinct:
+            signature = signatures[index]
+            key = bucket_key(sessions_data[index])
+            band_keys = [(key, band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+            candidates = sorted({rep for band_key in band_keys for rep in lsh_buckets.get(band_key, [])})
+            scored = [(estimated_jaccard(signatures[rep], signature), rep) for rep in candidates]
+            best = max(scored, key=lambda pair: (pair[0], -pair[1]), default=None)
+            if best is not None and best[0] >= threshold:
+                group_of[index] = best[1]
+                continue
+            group_of[index] = index
+            for band_key in band_keys:
+                lsh_buckets.setdefault(band_key, []).append(index)
+    else:
+        for index in distinct:
+            group_of[index] = index
+
+    members: Dict[int, List[int]] = {}
+    for index in range(count):
+        # Exact duplicates point at their first occurrence, which may itself be a near duplicate
+        root = group_of[index]
+        members.setdefault(group_of[root], []).append(index)
+
+    representatives = []
+    for root in sorted(members):
+        representative = dict(sessions_data[root])
+        duplicates = [sessions_data[index] for index in members[root] if index != root]
+        if duplicates:
+            representative['duplicates'] = duplicates
+        representatives.append(representative)
+
+    report = {
+        'sessions': count,
+        'representatives': len(representatives),
+        'exact_duplicates': exact,
+        'near_duplicates': count - len(representatives) - exact,
+        'calls_saved': count - len(representatives),
+    }
+    return representatives, report
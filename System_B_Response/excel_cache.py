@@ -0,0 +1,251 @@
+"""
+Columnar sidecar cache for Excel inputs.
+
+Parsing a large .xlsx with pandas/openpyxl is slow; reading the same data
+from Parquet is one to two orders of magnitude faster and can skip unused
+columns entirely. read_excel() converts a workbook sheet to a Parquet
+sidecar next to it on first read (<file>.xlsx.parquet, or
+<file>.xlsx.<sheet>.parquet for other sheets) and reuses it while the source
+is unchanged:
+
+- same size and mtime: the sidecar is used as is,
+- size or mtime changed: the source's SHA-256 is compared with the one
+  stored in the sidecar's metadata, so a touched or copied file with the
+  same content is not converted again; the stored mtime is then updated,
+  so later reads are back to comparing size and mtime,
+- otherwise the sheet is parsed once more and the sidecar rewritten
+  (atomically, via a temporary file).
+
+Column names are stored as strings, and object columns mixing strings and
+other values are stored as strings, since Parquet needs one type per column.
+Without pyarrow (pip install pyarrow), or if the sidecar cannot be built
+(unwritable directory, data Arrow cannot convert), everything still works by
+falling back to pandas.read_excel, only without the cache.
+
+inspect_excel() answers check_data.py-style questions (columns, row count, a
+few sample rows) from the sidecar's footer if it is fresh, or by streaming
+just the first rows of the sheet with openpyxl in read-only mode; neither
+parses the whole workbook.
+
+Usage:
+    from .excel_cache import inspect_excel, iter_excel, read_excel
+
+    df = read_excel("data(5).xlsx", columns=["user_messages", "question_type"])
+    for chunk in iter_excel("data(5).xlsx", chunk_rows=5000):
+        ...
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from .profiling import count, stage
+
+
+# Bump when the sidecar layout changes so old sidecars are rebuilt
+CACHE_VERSION = 1
+
+# Parquet key-value metadata entry holding the source signature
+METADATA_KEY = b"system_b.excel_source"
+
+# Rows per chunk for iter_excel() and per Parquet row group
+CHUNK_ROWS = 10000
+
+HASH_BLOCK = 1024 * 1024
+
+Sheet = Union[int, str]
+
+
+def sidecar_path(path: str, sheet_name: Sheet = 0) -> str:
+    suffix = "" if sheet_name == 0 else f".{sheet_name}"
+    return f"{path}{suffix}.parquet"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _have_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _stored_signature(sidecar: str) -> Optional[Dict[str, Any]]:
+    import pyarrow.parquet as pq
+
+    try:
+        metadata = pq.read_schema(sidecar).metadata or {}
+        return json.loads(metadata[METADATA_KEY])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _write_sidecar(table, sidecar: str, signature: Dict[str, Any]) -> None:
+    """Write table with signature in its metadata, atomically via a temporary file."""
+    import pyarrow.parquet as pq
+
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           METADATA_KEY: json.dumps(signature).encode('utf-8')})
+    temporary = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        pq.write_table(table, temporary, row_group_size=CHUNK_ROWS)
+        os.replace(temporary, sidecar)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def _restamp(sidecar: str, signature: Dict[str, Any]) -> None:
+    """Store a new source signature in an existing sidecar (best effort: a copy of the Parquet data)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    try:
+        _write_sidecar(pq.read_table(sidecar), sidecar, signature)
+    except (OSError, pa.lib.ArrowException):
+        pass
+
+
+def _fresh(path: str, sidecar: str, sheet_name: Sheet) -> bool:
+    """True if sidecar was built from the current content of path."""
+    if not os.path.exists(sidecar):
+        return False
+    stored = _stored_signature(sidecar)
+    if not stored or stored.get('version') != CACHE_VERSION or stored.get('sheet') != sheet_name:
+        return False
+    stat = os.stat(path)
+    if stored.get('size') == stat.st_size and stored.get('mtimeNs') == stat.st_mtime_ns:
+        return True
+    # Touched, copied or restored: only the content matters
+    if stored.get('size') != stat.st_size or stored.get('sha256') != file_sha256(path):
+        return False
+    # Same content: remember the new mtime so the next read does not hash again
+    _restamp(sidecar, {**stored, 'mtimeNs': stat.st_mtime_ns})
+    count("excel_cache_restamps")
+    return True
+
+
+def _arrow_safe(df):
+    """String column names, and object columns with mixed value types as strings."""
+    df = df.rename(columns=str)
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == object:
+            types = {type(value) for value in values.dropna()}
+            if len(types) > 1:
+                df[column] = values.map(lambda value: value if value is None or value != value else str(value))
+    return df
+
+
+def build_sidecar(path: str, sheet_name: Sheet = 0) -> str:
+    """Parse the sheet once and write its Parquet sidecar; returns the sidecar path."""
+    import pandas as pd
+    import pyarrow as pa
+
+    sidecar = sidecar_path(path, sheet_name)
+    stat = os.stat(path)
+    with stage("excel_parse"):
+        df = _arrow_safe(pd.read_excel(path, sheet_name=sheet_name))
+    signature = {
+        'version': CACHE_VERSION,
+        'sheet': sheet_name,
+        'size': stat.st_size,
+        'mtimeNs': stat.st_mtime_ns,
+        'sha256': file_sha256(path),
+    }
+    with stage("excel_sidecar_write"):
+        _write_sidecar(pa.Table.from_pandas(df, preserve_index=False), sidecar, signature)
+    count("excel_cache_builds")
+    return sidecar
+
+
+def ensure_sidecar(path: str, sheet_name: Sheet = 0) -> Optional[str]:
+    """
+    Path of an up-to-date sidecar for the sheet, building it if needed.
+    None if pyarrow is missing, the sidecar cannot be written next to the
+    source, or Arrow cannot convert the sheet's data.
+    """
+    if not _have_pyarrow():
+        return None
+    import pyarrow as pa
+
+    sidecar = sidecar_path(path, sheet_name)
+    if _fresh(path, sidecar, sheet_name):
+        count("excel_cache_hits")
+        return sidecar
+    try:
+        return build_sidecar(path, sheet_name)
+    except (OSError, pa.lib.ArrowException):
+        return None
+
+
+def read_excel(path: str, columns: Optional[List[str]] = None, sheet_name: Sheet = 0):
+    """pandas.read_excel through the sidecar cache, reading only the given columns."""
+    import pandas as pd
+
+    sidecar = ensure_sidecar(path, sheet_name)
+    if sidecar is None:
+        return pd.read_excel(path, sheet_name=sheet_name, usecols=columns)
+    import pyarrow.parquet as pq
+
+    with stage("excel_cache_read"):
+        return pq.read_table(sidecar, columns=columns).to_pandas()
+
+
+def iter_excel(path: str, columns: Optional[List[str]] = None, chunk_rows: int = CHUNK_ROWS,
+               sheet_name: Sheet = 0) -> Iterator[Any]:
+    """DataFrames of at most chunk_rows rows; only one chunk is in memory at a time with the cache."""
+    sidecar = ensure_sidecar(path, sheet_name)
+    if sidecar is None:
+        df = read_excel(path, columns, sheet_name)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(sidecar).iter_batches(batch_size=chunk_rows, columns=columns):
+        yield batch.to_pandas()
+
+
+def inspect_excel(path: str, sample_rows: int = 5, sheet_name: Sheet = 0) -> Dict[str, Any]:
+    """
+    Columns, row count and the first sample_rows rows without parsing the workbook.
+
+    Returns:
+        {'columns', 'rows', 'sample' (DataFrame), 'source': 'sidecar' | 'sheet'}
+        rows comes from the sheet's dimension when no fresh sidecar exists
+        and may be None if the file does not record one.
+    """
+    import pandas as pd
+
+    sidecar = sidecar_path(path, sheet_name)
+    if _have_pyarrow() and _fresh(path, sidecar, sheet_name):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(sidecar)
+        first = next(parquet.iter_batches(batch_size=max(sample_rows, 1)), None)
+        sample = first.to_pandas().head(sample_rows) if first is not None else pd.DataFrame()
+        return {'columns': parquet.schema_arrow.names, 'rows': parquet.metadata.num_rows,
+                'sample': sample, 'source': 'sidecar'}
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        rows = sheet.iter_rows(max_row=sample_rows + 1, values_only=True)
+        header = [str(value) for value in next(rows, ())]
+        sample = pd.DataFrame([(list(row) + [None] * len(header))[:len(header)] for row in rows], columns=header)
+        total = sheet.max_row - 1 if sheet.max_row else None
+    finally:
+        workbook.close()
+    return {'columns': header, 'rows': total, 'sample': sample, 'source': 'sheet'}
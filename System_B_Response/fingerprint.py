@@ -0,0 +1,86 @@
+"""
+Input fingerprints for delta regeneration of System B responses.
+
+Every System B document stores an inputFingerprint: a hash of everything
+that determines the response (the user's first message, their code, the
+question type, the code output preference and the hash of the system prompt
+variant used). With --delta, the collector recomputes the fingerprint of each
+session and only regenerates sessions that are new or whose fingerprint
+differs from the stored one, so edits to sessions and prompt revisions only
+cost the rows they actually affect.
+
+The route (model and token budget) is not part of the fingerprint: it is
+stored next to it on the document, so a routing change alone regenerates
+nothing. Sessions whose last response was invalid are recorded in the
+dead-letter collection with their fingerprint and are skipped by --delta
+until their inputs change (see dead_letter.fetch_invalid_fingerprints).
+
+Documents written before fingerprints existed have none and are treated as
+changed the first time --delta runs.
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Session lookups per $in query
+LOOKUP_BATCH = 1000
+
+
+def input_fingerprint(user_message: Optional[str], code_content: Optional[str], question_type: Optional[str],
+                      code_output_preference: Optional[str], prompt_hash: str) -> str:
+    """Stable hash of the generation inputs (None and "" are treated alike)."""
+    parts = [user_message, code_content, question_type, code_output_preference, prompt_hash]
+    payload = json.dumps([part or "" for part in parts], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def fetch_fingerprints(collection, sessions_data: List[Dict[str, Any]]) -> Dict[Tuple[str, int], Optional[str]]:
+    """
+    Stored fingerprints for the given sessions, keyed by (sessionId, messageIndex).
+
+    Sessions without a System B document are absent from the result; documents
+    without a fingerprint map to None.
+    """
+    session_ids = sorted({session['sessionId'] for session in sessions_data})
+    stored = {}
+    for start in range(0, len(session_ids), LOOKUP_BATCH):
+        cursor = collection.find(
+            {'sessionId': {'$in': session_ids[start:start + LOOKUP_BATCH]}},
+            {'_id': 0, 'sessionId': 1, 'messageIndex': 1, 'inputFingerprint': 1}
+        )
+        for doc in cursor:
+            stored[(doc['sessionId'], doc.get('messageIndex', 0))] = doc.get('inputFingerprint')
+    return stored
+
+
+def select_changed(sessions_data: List[Dict[str, Any]], stored: Dict[Tuple[str, int], Optional[str]],
+                   invalid: Dict[Tuple[str, int], Optional[str]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Keep only sessions that are new or whose 'inputFingerprint' differs from
+    the stored one. Sessions whose last response was invalid for the same
+    fingerprint (invalid, see dead_letter.fetch_invalid_fingerprints) are skipped.
+
+    Returns:
+        (sessions to regenerate, report with new, changed, unfingerprinted,
+         invalid and unchanged counts)
+    """
+    changed = []
+    report = {'new': 0, 'changed': 0, 'unfingerprinted': 0, 'invalid': 0, 'unchanged': 0}
+    invalid = invalid or {}
+    for session in sessions_data:
+        key = (session['sessionId'], session['messageIndex'])
+        if invalid.get(key) == session['inputFingerprint']:
+            report['invalid'] += 1
+            continue
+        if key not in stored:
+            report['new'] += 1
+        elif stored[key] is None:
+            report['unfingerprinted'] += 1
+        elif stored[key] != session['inputFingerprint']:
+            report['changed'] += 1
+        else:
+            report['unchanged'] += 1
+            continue
+        changed.append(session)
+    return changed, report
@@ -0,0 +1,369 @@
+"""
+Required MongoDB indexes and query-plan checks for every collection the
+System B scripts read.
+
+REQUIRED_INDEXES declares, per collection, the indexes the collector, the
+analytics jobs and the exporters rely on, with the access pattern each one
+serves. ensure_indexes() compares them with index_information() by key
+pattern and builds only the missing ones (background=True; MongoDB 4.2+
+always builds without holding an exclusive lock for the whole build and ignores
+the flag).
+
+QUERY_PLANS holds one representative query per access pattern, shaped like
+the query the script actually sends. verify_query_plans() runs explain() on
+each and reports a regression when the winning plan
+
+- contains a COLLSCAN (the query reads the whole collection), or
+- sorts in memory (a blocking SORT stage) although the query has a sort
+  an index could provide.
+
+A plan that uses a different index than the declared one is only a warning:
+the planner may legitimately prefer a wider index.
+
+Whole-collection reads (the collector's batch fetch, the legacy exporters in
+Scrapper/) are meant to scan and are not listed.
+
+Usage (from the repository root):
+    python -m System_B_Response.indexes              # build missing indexes, then verify plans
+    python -m System_B_Response.indexes --check      # verify only (exit 1 on a regression)
+    python -m System_B_Response.indexes --list       # declared indexes and their status
+"""
+import argparse
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .clients import get_db
+from .collector import FAILURES_COLLECTION, SESSIONS_COLLECTION, SYSTEM_B_COLLECTION, WORK_COLLECTION
+from .run_state import RUNS_COLLECTION
+from .work_queue import MAX_CLAIMS
+
+
+# Collections owned by the analytics jobs (see analytics/)
+EVALUATIONS_COLLECTION = "evaluations"
+EVALUATION_QUEUE_COLLECTION = "evaluationqueue"
+TOPIC_INDEX_COLLECTION = "topicindex"
+
+# Placeholder values for explained queries (the plan does not depend on them)
+SAMPLE_SESSION_IDS = ["preflight-session-1", "preflight-session-2"]
+SAMPLE_SINCE = datetime(2024, 1, 1)
+
+Keys = List[Tuple[str, int]]
+
+
+class QueryPlanRegression(RuntimeError):
+    """Raised when a declared query no longer uses an index."""
+
+    def __init__(self, failures: List[Dict[str, Any]]):
+        names = ", ".join(f"{result['query']} ({result['problem']})" for result in failures)
+        super().__init__(f"Query plan regression: {names}")
+        self.failures = failures
+
+
+# {collection: [{'keys', 'unique'?, 'usedBy'}]}
+REQUIRED_INDEXES: Dict[str, List[Dict[str, Any]]] = {
+    SESSIONS_COLLECTION: [
+        {'keys': [('sessionId', 1)],
+         'usedBy': "collector --retry-failed fetch, System A $lookup (export_pairs, evaluation_queue)"},
+        {'keys': [('updatedAt', 1)],
+         'usedBy': "topic_index watermark"},
+        {'keys': [('messages.questionType', 1)],
+         'usedBy': "question-type filters and sampling"},
+    ],
+    SYSTEM_B_COLLECTION: [
+        {'keys': [('sessionId', 1), ('messageIndex', 1)], 'unique': True,
+         'usedBy': "collector upserts, --delta fingerprints, evaluation_stats metadata, export_pairs order"},
+        {'keys': [('updatedAt', 1)],
+         'usedBy': "topic_index watermark"},
+    ],
+    FAILURES_COLLECTION: [
+        {'keys': [('sessionId', 1), ('messageIndex', 1)], 'unique': True,
+         'usedBy': "dead-letter upserts and clears"},
+    ],
+    WORK_COLLECTION: [
+        {'keys': [('status', 1), ('priority', -1)],
+         'usedBy': "work queue claims and pending count"},
+        {'keys': [('status', 1), ('leaseExpiresAt', 1)],
+         'usedBy': "work queue reclaiming expired leases"},
+    ],
+    RUNS_COLLECTION: [
+        {'keys': [('startedAt', -1)],
+         'usedBy': "watch_run latest / recent runs"},
+    ],
+    EVALUATIONS_COLLECTION: [
+        {'keys': [('sessionId', 1), ('messageIndex', 1), ('evaluatorId', 1)], 'unique': True,
+         'usedBy': "one evaluation per evaluator and pair, export_pairs evaluation $lookup"},
+        {'keys': [('createdAt', 1), ('_id', 1)],
+         'usedBy': "evaluation_stats (createdAt, _id) watermark"},
+        {'keys': [('evaluatorId', 1)],
+         'usedBy': "evaluation_queue pairs already rated"},
+    ],
+    EVALUATION_QUEUE_COLLECTION: [
+        {'keys': [('evaluatorId', 1), ('rank', 1)],
+         'usedBy': "serving the next pair"},
+        {'keys': [('sessionId', 1), ('messageIndex', 1)],
+         'usedBy': "queue maintenance per pair"},
+    ],
+    TOPIC_INDEX_COLLECTION: [
+        {'keys': [('topic', 1), ('system', 1), ('declared', 1), ('agree', 1)],
+         'usedBy': "topic counts and filters"},
+    ],
+}
+
+# One representative query per access pattern:
+# {'name', 'collection', 'filter', 'sort'?, 'limit'?, 'expects' (index keys), 'blockingSortOk'?}
+QUERY_PLANS: List[Dict[str, Any]] = [
+    {'name': "collector: --retry-failed fetch", 'collection': SESSIONS_COLLECTION,
+     'filter': {'sessionId': {'$in': SAMPLE_SESSION_IDS}},
+     'expects': [('sessionId', 1)]},
+    {'name': "export_pairs: System A $lookup", 'collection': SESSIONS_COLLECTION,
+     'filter': {'sessionId': SAMPLE_SESSION_IDS[0]}, 'limit': 1,
+     'expects': [('sessionId', 1)]},
+    {'name': "topic_index: sessions since watermark", 'collection': SESSIONS_COLLECTION,
+     'filter': {'updatedAt': {'$gte': SAMPLE_SINCE}},
+     'expects': [('updatedAt', 1)]},
+    {'name': "sessions by question type", 'collection': SESSIONS_COLLECTION,
+     'filter': {'messages.questionType': "HelpFixCode"},
+     'expects': [('messages.questionType', 1)]},
+    {'name': "collector: upsert response", 'collection': SYSTEM_B_COLLECTION,
+     'filter': {'sessionId': SAMPLE_SESSION_IDS[0], 'messageIndex': 0},
+     'expects': [('sessionId', 1), ('messageIndex', 1)]},
+    {'name': "collector --delta / evaluation_stats: responses for sessions", 'collection': SYSTEM_B_COLLECTION,
+     'filter': {'sessionId': {'$in': SAMPLE_SESSION_IDS}},
+     'expects': [('sessionId', 1), ('messageIndex', 1)]},
+    {'name': "export_pairs: responses in pair order", 'collection': SYSTEM_B_COLLECTION,
+     'filter': {}, 'sort': [('sessionId', 1), ('messageIndex', 1)], 'limit': 1,
+     'expects': [('sessionId', 1), ('messageIndex', 1)]},
+    {'name': "topic_index: responses since watermark", 'collection': SYSTEM_B_COLLECTION,
+     'filter': {'updatedAt': {'$gte': SAMPLE_SINCE}},
+     'expects': [('updatedAt', 1)]},
+    {'name': "dead letter: upsert failure", 'collection': FAILURES_COLLECTION,
+     'filter': {'sessionId': SAMPLE_SESSION_IDS[0], 'messageIndex': 0},
+     'expects': [('sessionId', 1), ('messageIndex', 1)]},
+    # Both $or branches are indexed; the expired-lease branch is sorted in
+    # memory, which is fine for the handful of leased items
+    {'name': "work queue: claim next", 'collection': WORK_COLLECTION,
+     'filter': {'$or': [{'status': 'pending'}, {'status': 'leased', 'leaseExpiresAt': {'$lt': SAMPLE_SINCE}}],
+                'attempts': {'$lt': MAX_CLAIMS}},
+     'sort': [('priority', -1)], 'limit': 1, 'blockingSortOk': True,
+     'expects': [('status', 1), ('priority', -1)]},
+    {'name': "work queue: pending count", 'collection': WORK_COLLECTION,
+     'filter': {'status': 'pending', 'attempts': {'$lt': MAX_CLAIMS}},
+     'expects': [('status', 1), ('priority', -1)]},
+    {'name': "watch_run: latest run", 'collection': RUNS_COLLECTION,
+     'filter': {}, 'sort': [('startedAt', -1)], 'limit': 1,
+     'expects': [('startedAt', -1)]},
+    {'name': "evaluation_stats: evaluations since watermark", 'collection': EVALUATIONS_COLLECTION,
+     'filter': {'skipped': {'$ne': True}, '$or': [{'createdAt': {'$gt': SAMPLE_SINCE}},
+                                                   {'createdAt': SAMPLE_SINCE, '_id': {'$gt': ''}}]},
+     'sort': [('createdAt', 1), ('_id', 1)],
+     'expects': [('createdAt', 1), ('_id', 1)]},
+    {'name': "evaluation_queue: pairs already rated", 'collection': EVALUATIONS_COLLECTION,
+     'filter': {'evaluatorId': {'$in': ["preflight@example.com"]}},
+     'expects': [('evaluatorId', 1)]},
+    {'name': "export_pairs: evaluation $lookup", 'collection': EVALUATIONS_COLLECTION,
+     'filter': {'sessionId': SAMPLE_SESSION_IDS[0], 'messageIndex': 0, 'skipped': {'$ne': True}},
+     'expects': [('sessionId', 1), ('messageIndex', 1), ('evaluatorId', 1)]},
+    {'name': "evaluation page: next pair", 'collection': EVALUATION_QUEUE_COLLECTION,
+     'filter': {'evaluatorId': "preflight@example.com"}, 'sort': [('rank', 1)], 'limit': 1,
+     'expects': [('evaluatorId', 1), ('rank', 1)]},
+    {'name': "topic_index: count topic", 'collection': TOPIC_INDEX_COLLECTION,
+     'filter': {'topic': "pointers", 'system': 'B', 'agree': False},
+     'expects': [('topic', 1), ('system', 1), ('declared', 1), ('agree', 1)]},
+]
+
+
+def index_name(keys: Keys) -> str:
+    """MongoDB's default name for an index on keys."""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _key_pattern(info: Dict[str, Any]) -> Keys:
+    return [(field, int(direction)) for field, direction in info['key']]
+
+
+# ==============================
+# 🗂️ Building indexes
+# ==============================
+def index_status(db, collections: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Declared indexes with their state:
+    'present', 'missing', or 'conflict' (same keys, different uniqueness).
+    """
+    statuses = []
+    for collection_name, declared in REQUIRED_INDEXES.items():
+        if collections and collection_name not in collections:
+            continue
+        existing = {tuple(_key_pattern(info)): info for info in db[collection_name].index_information().values()}
+        for spec in declared:
+            info = existing.get(tuple(spec['keys']))
+            if info is None:
+                state = 'missing'
+            elif bool(info.get('unique')) != bool(spec.get('unique')):
+                state = 'conflict'
+            else:
+                state = 'present'
+            statuses.append({'collection': collection_name, 'name': index_name(spec['keys']),
+                             'keys': spec['keys'], 'unique': bool(spec.get('unique')),
+                             'usedBy': spec['usedBy'], 'state': state})
+    return statuses
+
+
+def ensure_indexes(db, collections: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Build every missing declared index. A build that fails (for example a
+    unique index over duplicate data) is reported, not raised, so the other
+    builds still happen.
+
+    Returns:
+        index_status() entries, with state 'built' or 'failed' (+ 'error') for
+        the indexes this call tried to build
+    """
+    from pymongo import IndexModel
+
+    statuses = index_status(db, collections)
+    for status in statuses:
+        if status['state'] != 'missing':
+            continue
+        model = IndexModel(status['keys'], name=status['name'], unique=status['unique'], background=True)
+        try:
+            db[status['collection']].create_indexes([model])
+            status['state'] = 'built'
+        except Exception as e:
+            status['state'] = 'failed'
+            status['error'] = f"{type(e).__name__}: {e}"
+    return statuses
+
+
+# ==============================
+# 🔎 Verifying query plans
+# ==============================
+def _plan_nodes(node: Any) -> Iterator[Dict[str, Any]]:
+    """Every stage node below the winning plan(s) of an explain() result."""
+    if isinstance(node, dict):
+        if 'stage' in node:
+            yield node
+        for key, value in node.items():
+            if key not in ('rejectedPlans', 'slotBasedPlan'):
+                yield from _plan_nodes(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _plan_nodes(item)
+
+
+def explain_query(db, query: Dict[str, Any]) -> Dict[str, Any]:
+    cursor = db[query['collection']].find(query['filter'])
+    if query.get('sort'):
+        cursor = cursor.sort(query['sort'])
+    if query.get('limit'):
+        cursor = cursor.limit(query['limit'])
+    return cursor.explain()
+
+
+def check_plan(query: Dict[str, Any], explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Classify one explain() result as 'ok', 'warning', 'regression' or 'skipped'."""
+    planner = explain.get('queryPlanner', explain)
+    nodes = list(_plan_nodes(planner.get('winningPlan', planner)))
+    stages = [node['stage'] for node in nodes]
+    indexes = sorted({node['indexName'] for node in nodes if node.get('indexName')})
+    result = {'query': query['name'], 'collection': query['collection'], 'stages': stages,
+              'indexes': indexes, 'status': 'ok', 'problem': None}
+
+    if stages == ['EOF']:
+        result['status'] = 'skipped'
+        result['problem'] = "collection does not exist"
+    elif 'COLLSCAN' in stages:
+        result['status'] = 'regression'
+        result['problem'] = "COLLSCAN"
+    elif query.get('sort') and 'SORT' in stages and not query.get('blockingSortOk'):
+        result['status'] = 'regression'
+        result['problem'] = "in-memory SORT"
+    elif index_name(query['expects']) not in indexes:
+        result['status'] = 'warning'
+        result['problem'] = f"uses {', '.join(indexes) or 'no index'} instead of {index_name(query['expects'])}"
+    return result
+
+
+def verify_query_plans(db, queries: List[Dict[str, Any]] = None, strict: bool = False) -> List[Dict[str, Any]]:
+    """
+    explain() every declared query and classify its plan (see check_plan).
+
+    Raises:
+        QueryPlanRegression: If strict and any plan regressed
+    """
+    results = []
+    for query in queries or QUERY_PLANS:
+        try:
+            results.append(check_plan(query, explain_query(db, query)))
+        except Exception as e:
+            results.append({'query': query['name'], 'collection': query['collection'], 'stages': [],
+                            'indexes': [], 'status': 'error', 'problem': f"{type(e).__name__}: {e}"})
+    regressions = [result for result in results if result['status'] == 'regression']
+    if strict and regressions:
+        raise QueryPlanRegression(regressions)
+    return results
+
+
+def status_lines(statuses: List[Dict[str, Any]]) -> List[str]:
+    symbols = {'present': "✓", 'built': "✓", 'missing': "✗", 'failed': "✗", 'conflict': "⚠"}
+    lines = []
+    for status in statuses:
+        line = f"{symbols[status['state']]} {status['collection'] + '.' + status['name']:<56} {status['state']}"
+        if status.get('error'):
+            line += f": {status['error']}"
+        elif status['state'] == 'conflict':
+            line += f" (declared unique={status['unique']})"
+        lines.append(line)
+    return lines
+
+
+def plan_lines(results: List[Dict[str, Any]]) -> List[str]:
+    symbols = {'ok': "✓", 'warning': "⚠", 'regression': "❌", 'skipped': "·", 'error': "⚠"}
+    lines = []
+    for result in results:
+        line = f"{symbols[result['status']]} {result['query']:<58} {'+'.join(result['stages']) or '-'}"
+        if result['problem']:
+            line += f" | {result['problem']}"
+        lines.append(line)
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the required MongoDB indexes and verify query plans")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--check", action="store_true", help="Only verify query plans (no index builds)")
+    mode.add_argument("--list", action="store_true", help="List declared indexes and whether they exist")
+    parser.add_argument("--collection", action="append", help="Restrict index builds to this collection (repeatable)")
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    if args.list:
+        for status in index_status(db, args.collection):
+            print(f"{status_lines([status])[0]}\n      used by: {status['usedBy']}")
+        return 0
+
+    failed_builds = []
+    if not args.check:
+        print("🗂️ Required indexes:")
+        statuses = ensure_indexes(db, args.collection)
+        for line in status_lines(statuses):
+            print(f"  {line}")
+        failed_builds = [status for status in statuses if status['state'] == 'failed']
+
+    print("\n🔎 Query plans:")
+    results = verify_query_plans(db)
+    for line in plan_lines(results):
+        print(f"  {line}")
+    regressions = [result for result in results if result['status'] == 'regression']
+    if regressions:
+        print(f"\n❌ {len(regressions)} query plan(s) regressed to a collection scan or in-memory sort")
+        return 1
+    if failed_builds:
+        print(f"\n❌ {len(failed_builds)} index build(s) failed")
+        return 1
+    print("\n✓ Every declared query uses an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""
+Live metrics for long-running System B runs: an optional localhost HTTP
+endpoint and a periodic console summary line.
+
+While a run is generating, the collector refreshes one snapshot per
+REFRESH_SECONDS on the event loop:
+
+- queue depth (sessions waiting for a worker slot) and in-flight OpenAI requests,
+- completions/sec, session error rate and API error rate over the last
+  RATE_WINDOW_SECONDS, and overall,
+- prompt + completion token throughput,
+- OpenAI call latency percentiles (the openai_call histogram in profiling.py),
+- done / failed / skipped, total and ETA from the run tracker.
+
+With --metrics-port PORT the snapshot is served from a background thread on
+127.0.0.1:
+
+    GET /metrics   Prometheus text format (plus every stage histogram and counter)
+    GET /status    the snapshot as JSON
+
+The HTTP thread only reads the last snapshot (under a lock), never the
+tracker itself, so serving a scrape costs the event loop nothing.
+
+With --summary-interval SECONDS (default SUMMARY_INTERVAL) the per-session
+progress lines are replaced by one summary line every SECONDS; 0 restores
+the per-session lines.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+from .profiling import METRIC_PREFIX, PROFILER
+
+
+# Seconds between console summary lines (0: one line per session instead)
+SUMMARY_INTERVAL = 10.0
+
+# Seconds between snapshot refreshes while a run is generating
+REFRESH_SECONDS = 1.0
+
+# Window for completions/sec, error rates and token throughput
+RATE_WINDOW_SECONDS = 60.0
+
+# The HTTP endpoint only listens on the loopback interface
+METRICS_HOST = "127.0.0.1"
+
+# Stage whose histogram provides the reported latency percentiles
+LATENCY_STAGE = "openai_call"
+
+
+class LiveMetrics:
+    """Snapshot of a running collector, refreshed on the event loop and read by the HTTP thread."""
+
+    def __init__(self):
+        self.summary_interval = SUMMARY_INTERVAL
+        self.in_flight = 0
+        self.phase = "starting"
+        self._tracker = None
+        self._queue_depth: Optional[Callable[[], Optional[int]]] = None
+        self._samples: deque = deque()
+        self._snapshot: Dict[str, Any] = {'phase': self.phase}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def configure(self, summary_interval: float = SUMMARY_INTERVAL) -> None:
+        self.summary_interval = summary_interval
+
+    @property
+    def per_session_output(self) -> bool:
+        """True if progress is printed per session rather than as periodic summaries."""
+        return not self.summary_interval
+
+    def attach(self, tracker) -> None:
+        """Report on tracker (a run_state.RunTracker) until finish()."""
+        self._tracker = tracker
+        self._samples.clear()
+        self.phase = "generating"
+
+    def watch_queue(self, queue_depth: Callable[[], Optional[int]]) -> None:
+        """queue_depth returns the number of sessions waiting for a worker slot (None: unknown)."""
+        self._queue_depth = queue_depth
+
+    def request(self) -> "_InFlight":
+        """Count the enclosed OpenAI call as in flight."""
+        return _InFlight(self)
+
+    # ------------------------------
+    # Snapshot (event loop side)
+    # ------------------------------
+    def refresh(self) -> Dict[str, Any]:
+        """Recompute the snapshot; call from the event loop that updates the tracker."""
+        now = time.monotonic()
+        tracker = self._tracker
+        run = tracker.snapshot() if tracker is not None else {}
+        counters = PROFILER.report()['counters']
+        errors = sum(value for name, value in counters.items() if name.startswith("openai_errors_"))
+        requests = counters.get('openai_requests', 0)
+        tokens = run.get('promptTokens', 0) + run.get('completionTokens', 0)
+        finished = run.get('done', 0) + run.get('failed', 0) + run.get('skipped', 0)
+
+        sample = (now, finished, run.get('failed', 0), tokens, requests, errors)
+        self._samples.append(sample)
+        while len(self._samples) > 2 and now - self._samples[1][0] >= RATE_WINDOW_SECONDS:
+            self._samples.popleft()
+        oldest = self._samples[0]
+        window = now - oldest[0]
+        d_finished, d_failed, d_tokens, d_requests, d_errors = (
+            current - previous for current, previous in zip(sample[1:], oldest[1:])
+        )
+        elapsed = run.get('elapsedSeconds') or 0
+
+        snapshot = {
+            'runId': getattr(tracker, 'run_id', None),
+            'phase': self.phase,
+            'updatedAt': datetime.utcnow().isoformat() + 'Z',
+            'queueDepth': self._read_queue_depth(),
+            'inFlight': self.in_flight,
+            'total': run.get('total'),
+            'done': run.get('done', 0),
+            'failed': run.get('failed', 0),
+            'skipped': run.get('skipped', 0),
+            'completionsPerSec': _rate(d_finished, window),
+            'completionsPerSecOverall': _rate(finished, elapsed),
+            'errorRate': _ratio(d_failed, d_finished),
+            'errorRateOverall': _ratio(run.get('failed', 0), finished),
+            'apiErrorRate': _ratio(d_errors, d_requests),
+            'tokensPerSec': _rate(d_tokens, window),
+            'tokensPerSecOverall': _rate(tokens, elapsed),
+            'promptTokens': run.get('promptTokens', 0),
+            'completionTokens': run.get('completionTokens', 0),
+            'latency': PROFILER.stage_summary(LATENCY_STAGE),
+            'elapsedSeconds': elapsed,
+            'etaSeconds': run.get('etaSeconds'),
+        }
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def _read_queue_depth(self) -> Optional[int]:
+        if self._queue_depth is None:
+            return None
+        try:
+            return self._queue_depth()
+        except Exception:
+            return None
+
+    def finish(self, phase: str = "finished") -> None:
+        """Refresh once more and detach from the tracker."""
+        self.phase = phase
+        if self._tracker is not None:
+            self.refresh()
+        self._tracker = None
+        self._queue_depth = None
+
+    def status(self) -> Dict[str, Any]:
+        """Last snapshot (safe to call from any thread)."""
+        with self._lock:
+            return dict(self._snapshot, phase=self.phase)
+
+    # ------------------------------
+    # Output
+    # ------------------------------
+    def summary_line(self, snapshot: Dict[str, Any] = None) -> str:
+        s = snapshot or self.status()
+        finished = s['done'] + s['failed'] + s['skipped']
+        total = s['total'] or 0
+        progress = f"{finished}/{total} ({finished / total * 100:.1f}%)" if total else f"{finished}"
+        latency = s['latency']
+        parts = [
+            f"[{datetime.now():%H:%M:%S}] {progress}",
+            f"queue {_fmt(s['queueDepth'])} | in flight {s['inFlight']}",
+            f"{s['completionsPerSec']:.2f}/s",
+            f"errors {s['errorRate'] * 100:.1f}% (api {s['apiErrorRate'] * 100:.1f}%)",
+            f"{s['tokensPerSec']:,.0f} tok/s",
+        ]
+        if latency['count']:
+            parts.append(f"p50 {latency['p50Seconds']:.1f}s p95 {latency['p95Seconds']:.1f}s")
+        if s['etaSeconds'] is not None:
+            parts.append(f"ETA {_fmt_duration(s['etaSeconds'])}")
+        return " | ".join(parts)
+
+    def prometheus_text(self, prefix: str = METRIC_PREFIX) -> str:
+        """Live gauges followed by the stage histograms and counters of profiling.py."""
+        s = self.status()
+        lines = []
+        gauges = [
+            ("queue_depth", "Sessions waiting for a worker slot.", s.get('queueDepth')),
+            ("in_flight_requests", "OpenAI requests currently in flight.", s.get('inFlight')),
+            ("completions_per_second", f"Finished sessions per second over the last {RATE_WINDOW_SECONDS:g}s.",
+             s.get('completionsPerSec')),
+            ("error_rate", "Fraction of finished sessions that failed (rate window).", s.get('errorRate')),
+            ("api_error_rate", "Fraction of OpenAI attempts that errored (rate window).", s.get('apiErrorRate')),
+            ("tokens_per_second", "Prompt + completion tokens per second (rate window).", s.get('tokensPerSec')),
+            ("sessions_expected", "Sessions expected in this run.", s.get('total')),
+            ("eta_seconds", "Estimated seconds until the run finishes.", s.get('etaSeconds')),
+        ]
+        for name, help_text, value in gauges:
+            if value is None:
+                continue
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value:g}")
+        lines.append(f"# HELP {prefix}_sessions_finished Finished sessions by outcome.")
+        lines.append(f"# TYPE {prefix}_sessions_finished gauge")
+        for outcome in ("done", "failed", "skipped"):
+            lines.append(f'{prefix}_sessions_finished{{outcome="{outcome}"}} {s.get(outcome, 0)}')
+        return "\n".join(lines) + "\n" + PROFILER.prometheus_text(prefix)
+
+    # ------------------------------
+    # HTTP endpoint
+    # ------------------------------
+    def serve(self, port: int, host: str = METRICS_HOST) -> str:
+        """Start the HTTP endpoint in a daemon thread; returns its base URL."""
+        live = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == "/metrics":
+                    body = live.prometheus_text().encode('utf-8')
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path in ("/", "/status"):
+                    body = json.dumps(live.status(), indent=2).encode('utf-8')
+                    content_type = "application/json"
+                else:
+                    self.send_error(404, "Try /metrics or /status")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes every few seconds would drown the console
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="live-metrics", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    async def run_reporter(self) -> None:
+        """Refresh the snapshot every REFRESH_SECONDS and print summary lines until cancelled."""
+        last_summary = time.monotonic()
+        while True:
+            await asyncio.sleep(REFRESH_SECONDS)
+            snapshot = self.refresh()
+            if self.summary_interval and time.monotonic() - last_summary >= self.summary_interval:
+                last_summary = time.monotonic()
+                print(f"  📊 {self.summary_line(snapshot)}")
+
+
+class _InFlight:
+    __slots__ = ('live',)
+
+    def __init__(self, live: LiveMetrics):
+        self.live = live
+
+    def __enter__(self):
+        self.live.in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.live.in_flight -= 1
+        return False
+
+
+def _rate(delta: float, seconds: float) -> float:
+    return round(delta / seconds, 4) if seconds and seconds > 0 else 0.0
+
+
+def _ratio(part: float, whole: float) -> float:
+    return round(part / whole, 4) if whole else 0.0
+
+
+def _fmt(value: Optional[int]) -> str:
+    return "--" if value is None else str(value)
+
+
+def _fmt_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+# Process-wide live metrics shared by the collector, the reporter task and the HTTP endpoint
+LIVE = LiveMetrics()
@@ -0,0 +1,214 @@
+"""
+Per-stage memory tracking and memory budgets for System B runs.
+
+Coarse pipeline steps (fetch, shape, DataFrame build, generate, write) are
+wrapped in memory_stage() blocks. With --memprofile each block records:
+
+- the peak RSS of the process when the stage ended, and how much the stage
+  raised it (the OOM-relevant number),
+- the tracemalloc peak of Python allocations during the stage, and how far
+  it rose above the allocations live when the stage started,
+- the top allocation sites (file:line) by growth over the stage.
+
+A memory budget (--memory-budget MB) is checked at the end of every stage,
+with or without --memprofile, and raises MemoryBudgetExceeded so the run
+fails instead of the box running out of memory later. The budget applies to
+peak RSS; where RSS is not available (Windows without psutil) the tracemalloc
+peak is used.
+
+tracemalloc slows allocation-heavy code by roughly 2-3x, so it is only
+started in --memprofile mode. Stages are meant for whole pipeline steps, not
+per-session work, and must not nest (each one resets the tracemalloc peak).
+
+Usage:
+    from .memprofile import memory_stage
+
+    with memory_stage("fetch"):
+        sessions = list(collection.find())
+"""
+import json
+import os
+import sys
+import threading
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+
+# Allocation sites reported per stage
+TOP_ALLOCATORS = 10
+
+# Frames kept per allocation (1 = the allocating line)
+TRACE_FRAMES = 1
+
+MB = 1024 * 1024
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised at the end of a stage whose memory peak is above the configured budget."""
+
+    def __init__(self, stage: str, peak_mb: float, budget_mb: float):
+        super().__init__(f"Memory budget exceeded in stage '{stage}': peak {peak_mb:.1f} MB > budget {budget_mb:.1f} MB")
+        self.stage = stage
+        self.peak_mb = peak_mb
+        self.budget_mb = budget_mb
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, or None if it cannot be read."""
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss() -> Optional[int]:
+    """Highest resident set size of this process so far in bytes, or None."""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        return getattr(psutil.Process().memory_info(), 'peak_wset', None)
+    except ImportError:
+        return None
+
+
+class MemoryProfiler:
+    """Collects per-stage memory measurements and enforces the budget."""
+
+    def __init__(self):
+        self.enabled = False
+        self.budget_mb: Optional[float] = None
+        self.top = TOP_ALLOCATORS
+        self.stages: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: bool = False, budget_mb: Optional[float] = None, top: int = TOP_ALLOCATORS) -> None:
+        self.enabled = enabled
+        self.budget_mb = budget_mb
+        self.top = top
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    @property
+    def active(self) -> bool:
+        return self.enabled or self.budget_mb is not None
+
+    def stage(self, name: str) -> "_MemoryStage":
+        return _MemoryStage(self, name)
+
+    def check_budget(self, name: str, peak_bytes: Optional[int]) -> None:
+        if self.budget_mb is not None and peak_bytes is not None and peak_bytes / MB > self.budget_mb:
+            raise MemoryBudgetExceeded(name, peak_bytes / MB, self.budget_mb)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = list(self.stages)
+        return {
+            'budgetMb': self.budget_mb,
+            'peakRssMb': _mb(peak_rss()),
+            'stages': stages,
+        }
+
+    def write_report(self, base_path: str) -> str:
+        path = f"{base_path}.memory.json"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+    def lines(self) -> List[str]:
+        lines = []
+        for entry in self.report()['stages']:
+            line = (f"{entry['stage']:<12} peak RSS {_fmt_mb(entry['peakRssMb'])} "
+                    f"(+{_fmt_mb(entry['rssGrowthMb'])}) | rss after {_fmt_mb(entry['rssAfterMb'])}")
+            if entry.get('tracemallocPeakMb') is not None:
+                line += f" | python peak {_fmt_mb(entry['tracemallocPeakMb'])}"
+            lines.append(line)
+            for allocator in entry.get('topAllocators', [])[:3]:
+                lines.append(f"{'':<14}{allocator['sizeMb']:>8.1f} MB  {allocator['site']}")
+        return lines
+
+
+class _MemoryStage:
+    __slots__ = ('profiler', 'name', 'rss_before', 'peak_before', 'traced_before', 'snapshot')
+
+    def __init__(self, profiler: MemoryProfiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        profiler = self.profiler
+        if not profiler.active:
+            return self
+        self.rss_before = current_rss()
+        self.peak_before = peak_rss()
+        self.snapshot = None
+        if profiler.enabled and tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot()
+            self.traced_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, *exc_info):
+        profiler = self.profiler
+        if not profiler.active:
+            return False
+        peak_after = peak_rss()
+        entry = {
+            'stage': self.name,
+            'peakRssMb': _mb(peak_after),
+            'rssGrowthMb': _mb(peak_after - self.peak_before) if peak_after is not None and self.peak_before is not None else None,
+            'rssAfterMb': _mb(current_rss()),
+            'rssBeforeMb': _mb(self.rss_before),
+        }
+        python_peak = None
+        if self.snapshot is not None:
+            _, python_peak = tracemalloc.get_traced_memory()
+            entry['tracemallocPeakMb'] = _mb(python_peak)
+            entry['tracemallocGrowthMb'] = _mb(python_peak - self.traced_before)
+            stats = tracemalloc.take_snapshot().compare_to(self.snapshot, 'lineno')
+            entry['topAllocators'] = [
+                {'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 'sizeMb': round(stat.size_diff / MB, 2), 'count': stat.count_diff}
+                for stat in sorted(stats, key=lambda stat: stat.size_diff, reverse=True)[:profiler.top]
+                if stat.size_diff > 0
+            ]
+            self.snapshot = None
+        with profiler._lock:
+            profiler.stages.append(entry)
+        if exc_info[0] is None:
+            profiler.check_budget(self.name, peak_after if peak_after is not None else python_peak)
+        return False
+
+
+def _mb(value: Optional[int]) -> Optional[float]:
+    return None if value is None else round(value / MB, 1)
+
+
+def _fmt_mb(value: Optional[float]) -> str:
+    return "--" if value is None else f"{value:.1f} MB"
+
+
+# Process-wide memory profiler shared by every memory_stage() block
+MEMORY = MemoryProfiler()
+
+
+def memory_stage(name: str):
+    """Measure the enclosed pipeline step (no-op unless --memprofile or a budget is set)."""
+    return MEMORY.stage(name)
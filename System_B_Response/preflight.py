@@ -0,0 +1,453 @@
+"""
+Concurrent preflight checks and a performance probe for System B runs.
+
+run_checks() runs independent validation checks (dependencies, .env,
+MongoDB, output directory, ...) in parallel threads, each with a timeout, so
+one slow or hanging check no longer stalls the others. Whatever a check
+prints is buffered per thread and replayed in declaration order, so the
+console reads as if the checks had run one after another. Output of a check
+after it timed out is never shown.
+
+run_probe() then measures what a big run will actually hit:
+
+    mongo_rtt     round-trip latency of a MongoDB ping
+    cursor        docs/sec and MB/sec scanning a sample of sessions
+    bulk_write    docs/sec and MB/sec inserting into a scratch collection,
+                  per document and in batches (the collection is dropped)
+    llm           latency of a tiny completion and the key's rate limits
+
+and recommend() turns the measurements into batch sizes and a concurrency
+limit. A batch is sized so the round trip costs at most MAX_RTT_OVERHEAD of
+the batch's transfer time; concurrency follows Little's law (requests in
+flight = request rate x generation latency), capped by the OpenAI rate
+limits and the asyncio.to_thread pool that carries the MongoDB writes.
+
+Usage (from the repository root):
+    python validate_system_b_setup.py
+    python -m System_B_Response.preflight            # probe only
+    python -m System_B_Response.preflight --no-llm   # skip the (tiny, billed) LLM calls
+"""
+import argparse
+import asyncio
+import io
+import math
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .clients import get_db, get_openai_client
+from .collector import MODEL, SESSIONS_COLLECTION, SYSTEM_B_COLLECTION
+from .run_state import RUNS_COLLECTION, latest_run
+from .settings import DB_NAME
+
+
+# Seconds each check (or probe step) may take before it is reported as timed out
+CHECK_TIMEOUT = 30.0
+
+# Probe sizes
+PING_SAMPLES = 10
+SCAN_DOCS = 2000
+WRITE_DOCS = 2000
+SINGLE_WRITES = 50
+WRITE_BATCH = 500
+LLM_SAMPLES = 3
+LLM_MODEL = MODEL
+
+# Scratch collection for the write probe (suffixed with the pid, dropped afterwards)
+SCRATCH_PREFIX = "systembpreflight"
+
+# Largest share of a batch's time the round trip may take
+MAX_RTT_OVERHEAD = 0.10
+
+# MongoDB caps a cursor batch at 16 MB
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+
+# Used when no earlier run recorded latency / token usage
+DEFAULT_GENERATION_SECONDS = 20.0
+DEFAULT_TOKENS_PER_REQUEST = 3000
+
+# Fraction of the rate limit a run should plan to use
+RATE_LIMIT_HEADROOM = 0.8
+
+MB = 1024 * 1024
+
+
+# ==============================
+# Concurrent checks
+# ==============================
+class _ThreadStdout(io.TextIOBase):
+    """
+    sys.stdout stand-in that sends each registered thread's output to its own
+    buffer. Other threads write through to the original stream, so the proxy
+    can stay installed after run_checks() returns.
+    """
+
+    def __init__(self, original):
+        self.original = original
+        self.buffers: Dict[int, io.StringIO] = {}
+
+    def write(self, text: str) -> int:
+        buffer = self.buffers.get(threading.get_ident())
+        return (buffer or self.original).write(text)
+
+    def flush(self) -> None:
+        self.original.flush()
+
+    @property
+    def encoding(self):
+        return self.original.encoding
+
+    def isatty(self) -> bool:
+        return self.original.isatty()
+
+    def fileno(self) -> int:
+        return self.original.fileno()
+
+
+def run_checks(checks: List[Tuple[str, Callable[[], Any]]], timeout: float = CHECK_TIMEOUT,
+               echo: bool = True) -> List[Dict[str, Any]]:
+    """
+    Run every check in its own daemon thread and wait at most timeout seconds
+    for all of them. A check passes if it returns a truthy value without raising.
+    A timed-out check keeps running; whatever it prints from then on stays in
+    its buffer, so the stdout proxy is left installed while such a check exists.
+
+    Returns:
+        One dict per check, in the given order:
+        {'name', 'ok', 'value', 'seconds', 'timedOut', 'error', 'output'}
+    """
+    proxy = _ThreadStdout(sys.stdout)
+    results = [{'name': name, 'ok': False, 'value': None, 'seconds': None,
+                'timedOut': False, 'error': None, 'output': ''} for name, _ in checks]
+
+    def target(result: Dict[str, Any], check: Callable[[], Any]) -> None:
+        proxy.buffers[threading.get_ident()] = buffer = io.StringIO()
+        started = time.perf_counter()
+        try:
+            result['value'] = check()
+            result['ok'] = bool(result['value'])
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+        finally:
+            result['seconds'] = round(time.perf_counter() - started, 3)
+            result['output'] = buffer.getvalue()
+
+    threads = []
+    sys.stdout = proxy
+    try:
+        for result, (_, check) in zip(results, checks):
+            thread = threading.Thread(target=target, args=(result, check), daemon=True,
+                                      name=f"check-{result['name']}")
+            thread.start()
+            threads.append(thread)
+        deadline = time.monotonic() + timeout
+        for thread, result in zip(threads, results):
+            thread.join(max(deadline - time.monotonic(), 0))
+            if thread.is_alive():
+                # Daemon threads cannot be stopped; a hung check is abandoned, not waited for
+                result['timedOut'] = True
+                result['error'] = f"timed out after {timeout:g}s"
+                buffer = proxy.buffers.get(thread.ident)
+                result['output'] = buffer.getvalue() if buffer else ''
+    finally:
+        # Restoring stdout would let an abandoned check print into the replay below
+        if not any(result['timedOut'] for result in results):
+            sys.stdout = proxy.original
+
+    if echo:
+        for result in results:
+            print(result['output'], end='')
+            if result['error']:
+                print(f"❌ {result['name']}: {result['error']}\n")
+    return results
+
+
+def check_summary_lines(results: List[Dict[str, Any]]) -> List[str]:
+    """One line per run_checks() result: status, name and duration."""
+    lines = []
+    for result in results:
+        status = "✓" if result['ok'] else "✗"
+        took = "timed out" if result['timedOut'] else f"{result['seconds']:.2f}s"
+        lines.append(f"{status} {result['name']:<18} {took}")
+    return lines
+
+
+# ==============================
+# Performance probe
+# ==============================
+def probe_mongo_rtt(db, samples: int = PING_SAMPLES) -> Dict[str, Any]:
+    """Round-trip latency of a ping (the first call also pays for connecting)."""
+    timings = []
+    for _ in range(samples + 1):
+        started = time.perf_counter()
+        db.command('ping')
+        timings.append(time.perf_counter() - started)
+    timings = sorted(timings[1:])
+    return {
+        'samples': samples,
+        'minMs': round(timings[0] * 1000, 2),
+        'p50Ms': round(timings[len(timings) // 2] * 1000, 2),
+        'maxMs': round(timings[-1] * 1000, 2),
+    }
+
+
+def probe_cursor(collection, limit: int = SCAN_DOCS) -> Dict[str, Any]:
+    """Scan up to limit documents as raw BSON, which measures the wire and server, not decoding."""
+    from bson.codec_options import CodecOptions
+    from bson.raw_bson import RawBSONDocument
+
+    raw = collection.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+    documents = 0
+    size = 0
+    started = time.perf_counter()
+    for document in raw.find({}).limit(limit):
+        documents += 1
+        size += len(document.raw)
+    seconds = time.perf_counter() - started
+    return {
+        'collection': collection.name,
+        'documents': documents,
+        'avgDocKb': round(size / documents / 1024, 2) if documents else None,
+        'docsPerSec': round(documents / seconds, 1) if seconds > 0 else None,
+        'mbPerSec': round(size / MB / seconds, 2) if seconds > 0 else None,
+        'estimatedCount': collection.estimated_document_count(),
+    }
+
+
+def probe_bulk_write(db, doc_kb: float = 8.0, documents: int = WRITE_DOCS,
+                     singles: int = SINGLE_WRITES, batch: int = WRITE_BATCH) -> Dict[str, Any]:
+    """Insert synthetic systembresponses-sized documents one by one and in batches."""
+    scratch = db[f"{SCRATCH_PREFIX}_{os.getpid()}"]
+    text = "x" * max(int(doc_kb * 1024) - 200, 16)
+
+    def make(index: int) -> Dict[str, Any]:
+        return {'sessionId': f"preflight-{index}", 'messageIndex': 0, 'questionType': "GeneralQuestion",
+                'assistantResponse': text}
+
+    try:
+        started = time.perf_counter()
+        for index in range(singles):
+            scratch.insert_one(make(index))
+        single_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for offset in range(singles, singles + documents, batch):
+            scratch.insert_many([make(index) for index in range(offset, min(offset + batch, singles + documents))],
+                                ordered=False)
+        bulk_seconds = time.perf_counter() - started
+    finally:
+        scratch.drop()
+
+    size_mb = len(text) / MB
+    return {
+        'docKb': round(doc_kb, 2),
+        'singleDocsPerSec': round(singles / single_seconds, 1),
+        'bulkBatch': batch,
+        'bulkDocsPerSec': round(documents / bulk_seconds, 1),
+        'bulkMbPerSec': round(documents * size_mb / bulk_seconds, 2),
+    }
+
+
+async def _probe_llm(model: str, samples: int) -> Dict[str, Any]:
+    client = get_openai_client()
+    timings = []
+    headers = {}
+    for _ in range(samples):
+        started = time.perf_counter()
+        raw = await client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=[{"role": "user", "content": "Reply with OK."}],
+            max_tokens=1,
+        )
+        timings.append(time.perf_counter() - started)
+        raw.parse()
+        headers = raw.headers
+
+    def limit(name: str) -> Optional[int]:
+        value = headers.get(name)
+        return int(value) if value and value.isdigit() else None
+
+    timings.sort()
+    return {
+        'model': model,
+        'samples': samples,
+        'minMs': round(timings[0] * 1000, 1),
+        'p50Ms': round(timings[len(timings) // 2] * 1000, 1),
+        'maxMs': round(timings[-1] * 1000, 1),
+        'requestsPerMinute': limit('x-ratelimit-limit-requests'),
+        'tokensPerMinute': limit('x-ratelimit-limit-tokens'),
+    }
+
+
+def probe_llm(model: str = LLM_MODEL, samples: int = LLM_SAMPLES) -> Dict[str, Any]:
+    """Latency of a one-token completion plus the rate limits reported for the key."""
+    return asyncio.run(_probe_llm(model, samples))
+
+
+def run_history(db) -> Dict[str, Any]:
+    """Generation latency and tokens per request of the latest recorded run, if any."""
+    run = latest_run(db[RUNS_COLLECTION]) or {}
+    done = run.get('done') or 0
+    tokens = (run.get('promptTokens') or 0) + (run.get('completionTokens') or 0)
+    return {
+        'runId': run.get('_id'),
+        'latencyP50': run.get('latencyP50'),
+        'tokensPerRequest': round(tokens / done) if done and tokens else None,
+    }
+
+
+def run_probe(db=None, include_llm: bool = True, timeout: float = CHECK_TIMEOUT,
+              scan_docs: int = SCAN_DOCS, write_docs: int = WRITE_DOCS) -> Dict[str, Any]:
+    """
+    Run the probe steps one after another (concurrent steps would skew each
+    other's numbers), each under timeout. A failed step leaves its entry None.
+    """
+    db = db if db is not None else get_db()
+    steps: List[Tuple[str, Callable[[], Any]]] = [
+        ('mongo_rtt', lambda: probe_mongo_rtt(db)),
+        ('cursor', lambda: probe_cursor(db[SESSIONS_COLLECTION], scan_docs)),
+    ]
+    report: Dict[str, Any] = {'errors': {}}
+    for name, step in steps:
+        report[name] = _run_step(name, step, timeout, report)
+
+    stored_kb = _run_step('doc_size', lambda: _average_kb(db[SYSTEM_B_COLLECTION]), timeout, report)
+    report['bulk_write'] = _run_step('bulk_write', lambda: probe_bulk_write(db, stored_kb or 8.0, write_docs),
+                                     timeout, report)
+    report['llm'] = _run_step('llm', probe_llm, timeout, report) if include_llm else None
+    report['history'] = _run_step('history', lambda: run_history(db), timeout, report) or {}
+    report['recommendations'] = recommend(report)
+    return report
+
+
+def _run_step(name: str, step: Callable[[], Any], timeout: float, report: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    result = run_checks([(name, step)], timeout, echo=False)[0]
+    if result['error']:
+        report['errors'][name] = result['error']
+    return result['value']
+
+
+def _average_kb(collection) -> Optional[float]:
+    """Average BSON size of up to 100 sampled documents in KB (None if the collection is empty)."""
+    sample = list(collection.aggregate([
+        {'$sample': {'size': 100}},
+        {'$group': {'_id': None, 'bytes': {'$avg': {'$bsonSize': '$$ROOT'}}}},
+    ]))
+    return round(sample[0]['bytes'] / 1024, 2) if sample and sample[0]['bytes'] else None
+
+
+def batch_for_rtt(rtt_seconds: float, docs_per_sec: float, floor: int, ceiling: int) -> int:
+    """
+    Smallest batch whose round trip takes at most MAX_RTT_OVERHEAD of the
+    total: rtt / (rtt + batch / rate) <= overhead.
+    """
+    batch = rtt_seconds * docs_per_sec * (1 - MAX_RTT_OVERHEAD) / MAX_RTT_OVERHEAD
+    return int(min(max(math.ceil(batch), floor), ceiling))
+
+
+def recommend(report: Dict[str, Any]) -> Dict[str, Any]:
+    """Batch sizes and a concurrency limit from the probe measurements."""
+    recommendations: Dict[str, Any] = {'notes': []}
+    notes = recommendations['notes']
+    rtt = report.get('mongo_rtt')
+    cursor = report.get('cursor')
+    writes = report.get('bulk_write')
+    llm = report.get('llm')
+    history = report.get('history') or {}
+    rtt_seconds = rtt['p50Ms'] / 1000 if rtt else None
+
+    if cursor and cursor['docsPerSec'] and rtt_seconds is not None:
+        ceiling = 10000
+        if cursor['avgDocKb']:
+            ceiling = max(101, min(ceiling, int(MAX_BATCH_BYTES / (cursor['avgDocKb'] * 1024))))
+        recommendations['fetchBatchSize'] = batch_for_rtt(rtt_seconds, cursor['docsPerSec'], 101, ceiling)
+        if cursor['estimatedCount']:
+            recommendations['fullScanSeconds'] = round(cursor['estimatedCount'] / cursor['docsPerSec'], 1)
+
+    if writes and rtt_seconds is not None:
+        recommendations['writeBatchSize'] = batch_for_rtt(rtt_seconds, writes['bulkDocsPerSec'], 10, 1000)
+        speedup = writes['bulkDocsPerSec'] / writes['singleDocsPerSec'] if writes['singleDocsPerSec'] else None
+        if speedup and speedup >= 3:
+            notes.append(f"Batched writes are {speedup:.0f}x faster than one document per round trip; "
+                         f"a single writer tops out at {writes['singleDocsPerSec']:.0f} docs/s.")
+
+    # Little's law: requests in flight = request rate x time per request
+    latency = history.get('latencyP50') or DEFAULT_GENERATION_SECONDS
+    tokens = history.get('tokensPerRequest') or DEFAULT_TOKENS_PER_REQUEST
+    if not history.get('latencyP50'):
+        notes.append(f"No earlier run recorded latency; assuming {DEFAULT_GENERATION_SECONDS:g}s per generation.")
+    limits = {'threadPool': min(32, (os.cpu_count() or 1) + 4)}
+    if llm and llm.get('requestsPerMinute'):
+        limits['requestsPerMinute'] = llm['requestsPerMinute'] / 60 * RATE_LIMIT_HEADROOM * latency
+    if llm and llm.get('tokensPerMinute'):
+        limits['tokensPerMinute'] = llm['tokensPerMinute'] / 60 / tokens * RATE_LIMIT_HEADROOM * latency
+    if llm is None:
+        notes.append("LLM rate limits unknown (probe skipped or failed); concurrency is bounded by the thread pool only.")
+    bound, value = min(limits.items(), key=lambda item: item[1])
+    concurrency = recommendations['concurrency'] = max(1, int(value))
+    recommendations['concurrencyBoundBy'] = bound
+    recommendations['expectedSessionsPerMinute'] = round(concurrency / latency * 60, 1)
+    if llm and llm.get('tokensPerMinute'):
+        notes.append(f"At --concurrency {concurrency} expect about {concurrency / latency * tokens * 60:,.0f} "
+                     f"of {llm['tokensPerMinute']:,} tokens/min.")
+    return recommendations
+
+
+def probe_lines(report: Dict[str, Any]) -> List[str]:
+    """Console summary of run_probe()."""
+    lines = []
+    rtt, cursor, writes, llm = (report.get(key) for key in ('mongo_rtt', 'cursor', 'bulk_write', 'llm'))
+    if rtt:
+        lines.append(f"MongoDB round trip: p50 {rtt['p50Ms']:.1f} ms (min {rtt['minMs']:.1f}, max {rtt['maxMs']:.1f})")
+    if cursor and cursor['documents']:
+        lines.append(f"Cursor scan ({cursor['collection']}, {cursor['documents']} docs, avg {cursor['avgDocKb']} KB): "
+                     f"{cursor['docsPerSec']:,.0f} docs/s, {cursor['mbPerSec']:.1f} MB/s")
+    if writes:
+        lines.append(f"Writes ({writes['docKb']} KB docs): {writes['singleDocsPerSec']:,.0f} docs/s one by one, "
+                     f"{writes['bulkDocsPerSec']:,.0f} docs/s ({writes['bulkMbPerSec']:.1f} MB/s) "
+                     f"in batches of {writes['bulkBatch']}")
+    if llm:
+        limits = ", ".join(f"{value:,} {name}" for name, value in
+                           (("req/min", llm['requestsPerMinute']), ("tokens/min", llm['tokensPerMinute'])) if value)
+        lines.append(f"LLM ({llm['model']}): p50 {llm['p50Ms']:.0f} ms for a 1-token reply"
+                     + (f" | limits: {limits}" if limits else ""))
+    for name, error in report['errors'].items():
+        lines.append(f"⚠ {name}: {error}")
+
+    recommendations = report['recommendations']
+    lines.append("Recommendations:")
+    if 'fetchBatchSize' in recommendations:
+        scan = recommendations.get('fullScanSeconds')
+        lines.append(f"  fetch batch_size={recommendations['fetchBatchSize']}"
+                     + (f" (full scan of sessions ~{scan:.0f}s)" if scan is not None else ""))
+    if 'writeBatchSize' in recommendations:
+        lines.append(f"  write batch size={recommendations['writeBatchSize']}")
+    lines.append(f"  --concurrency {recommendations['concurrency']} (bound by {recommendations['concurrencyBoundBy']}, "
+                 f"~{recommendations['expectedSessionsPerMinute']:g} sessions/min)")
+    lines.extend(f"  ℹ {note}" for note in recommendations['notes'])
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure MongoDB and LLM performance before a big System B run")
+    parser.add_argument("--no-llm", action="store_true", help="Skip the LLM latency / rate-limit probe")
+    parser.add_argument("--timeout", type=float, default=CHECK_TIMEOUT,
+                        help=f"Seconds per probe step (default: {CHECK_TIMEOUT:g})")
+    parser.add_argument("--scan-docs", type=int, default=SCAN_DOCS,
+                        help=f"Sessions scanned by the cursor probe (default: {SCAN_DOCS})")
+    parser.add_argument("--write-docs", type=int, default=WRITE_DOCS,
+                        help=f"Documents written by the bulk-write probe (default: {WRITE_DOCS})")
+    args = parser.parse_args(argv)
+
+    print(f"⏱ Probing {DB_NAME} and the LLM endpoint...")
+    report = run_probe(include_llm=not args.no_llm, timeout=args.timeout,
+                       scan_docs=args.scan_docs, write_docs=args.write_docs)
+    for line in probe_lines(report):
+        print(f"  {line}")
+    return 1 if report['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Per-stage timing histograms and counters for System B runs.
+
+Pipeline stages (fetching sessions, building prompts, the OpenAI call,
+parsing and storing responses, the Excel export, ...) are wrapped in
+stage() blocks. Each stage feeds an HDR-style log-linear histogram, so
+percentiles stay accurate to about 1% from microseconds to minutes with a
+few hundred integer buckets and no stored samples. Recording a duration
+costs one perf_counter_ns() pair and a dict increment, cheap enough to
+leave on for every run.
+
+At the end of a run the process-wide PROFILER is written as
+
+    <base>.profile.json   stage percentiles and counters
+    <base>.prom           Prometheus text format (node_exporter textfile collector)
+
+Usage:
+    from .profiling import count, stage
+
+    with stage("openai_call"):
+        response = await client.chat.completions.create(...)
+    count("openai_retries")
+
+capture() additionally records a cProfile (or pyinstrument) profile of the
+whole run for finding hot spots inside a stage.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Sub-buckets per power of two: values are kept to within 1 / 2**(SUB_BUCKET_BITS - 1)
+SUB_BUCKET_BITS = 7
+
+# Percentiles reported in JSON and as Prometheus summary quantiles
+REPORT_QUANTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+CAPTURE_MODES = ("cprofile", "pyinstrument")
+
+METRIC_PREFIX = "systemb"
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of durations in microseconds.
+
+    A value v lands in bucket (shift << SUB_BUCKET_BITS) + (v >> shift), where
+    shift keeps v >> shift below 2**SUB_BUCKET_BITS. Values below
+    2**SUB_BUCKET_BITS microseconds are exact; larger ones share a bucket with
+    neighbours less than 1 / 2**(SUB_BUCKET_BITS - 1) apart.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    @staticmethod
+    def bucket_index(value: int) -> int:
+        shift = max(value.bit_length() - SUB_BUCKET_BITS, 0)
+        return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+    @staticmethod
+    def bucket_upper(index: int) -> int:
+        """Highest value that maps to bucket index."""
+        shift = index >> SUB_BUCKET_BITS
+        return (((index & ((1 << SUB_BUCKET_BITS) - 1)) + 1) << shift) - 1
+
+    def record(self, micros: int) -> None:
+        micros = max(int(micros), 0)
+        index = self.bucket_index(micros)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += micros
+        if self.min is None or micros < self.min:
+            self.min = micros
+        if self.max is None or micros > self.max:
+            self.max = micros
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentiles(self, quantiles=REPORT_QUANTILES) -> Dict[float, int]:
+        """Value at or below which each quantile of recorded durations falls (microseconds)."""
+        if not self.count:
+            return {q: 0 for q in quantiles}
+        targets = sorted((max(1, int(round(q * self.count))), q) for q in quantiles)
+        result = {}
+        seen = 0
+        pending = iter(targets)
+        target, quantile = next(pending)
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            while seen >= target:
+                result[quantile] = min(self.bucket_upper(index), self.max)
+                try:
+                    target, quantile = next(pending)
+                except StopIteration:
+                    return result
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        """Seconds-based summary used by the JSON report."""
+        if not self.count:
+            return {'count': 0}
+        summary = {
+            'count': self.count,
+            'totalSeconds': round(self.total / 1e6, 6),
+            'meanSeconds': round(self.total / self.count / 1e6, 6),
+            'minSeconds': round(self.min / 1e6, 6),
+            'maxSeconds': round(self.max / 1e6, 6),
+        }
+        for quantile, value in self.percentiles().items():
+            summary[f"p{quantile * 100:g}Seconds".replace('.', '')] = round(value / 1e6, 6)
+        return summary
+
+
+class StageProfiler:
+    """Thread-safe registry of per-stage histograms and named counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[str, float] = {}
+        self.started_at = datetime.utcnow()
+        self._started = time.perf_counter()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds * 1e6)
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def stage(self, name: str) -> "_StageTimer":
+        return _StageTimer(self, name)
+
+    def stage_summary(self, name: str) -> Dict[str, Any]:
+        """Summary of one stage so far ({'count': 0} if it never ran)."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            return histogram.summary() if histogram is not None else {'count': 0}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.started_at = datetime.utcnow()
+            self._started = time.perf_counter()
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Returns:
+            {'startedAt', 'wallSeconds', 'stages': {name: summary}, 'counters': {name: value}}
+            with stages ordered by total time spent
+        """
+        with self._lock:
+            stages = sorted(self.histograms.items(), key=lambda item: item[1].total, reverse=True)
+            return {
+                'startedAt': self.started_at.isoformat() + 'Z',
+                'wallSeconds': round(time.perf_counter() - self._started, 3),
+                'stages': {name: histogram.summary() for name, histogram in stages},
+                'counters': dict(sorted(self.counters.items())),
+            }
+
+    def prometheus_text(self, prefix: str = METRIC_PREFIX) -> str:
+        """Stage histograms as summaries and counters as *_total, in Prometheus text format."""
+        with self._lock:
+            stages = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent per pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name, histogram in stages:
+            label = _label(name)
+            for quantile, value in histogram.percentiles().items():
+                lines.append(f'{prefix}_stage_seconds{{stage="{label}",quantile="{quantile:g}"}} {value / 1e6:.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{label}"}} {histogram.total / 1e6:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{label}"}} {histogram.count}')
+        for name, value in counters:
+            metric = f"{prefix}_{_metric_name(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_reports(self, base_path: str) -> Tuple[str, str]:
+        """Write <base_path>.profile.json and <base_path>.prom; returns both paths."""
+        directory = os.path.dirname(base_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        json_path = f"{base_path}.profile.json"
+        prom_path = f"{base_path}.prom"
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        # Write then rename so a textfile collector never reads a partial file
+        with open(prom_path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(prom_path + ".tmp", prom_path)
+        return json_path, prom_path
+
+    def lines(self, limit: int = 10) -> List[str]:
+        """Console summary of the stages that took the most total time."""
+        lines = []
+        for name, summary in list(self.report()['stages'].items())[:limit]:
+            if summary['count']:
+                lines.append(f"{name:<18} n={summary['count']:<6} total {summary['totalSeconds']:8.2f}s | "
+                             f"p50 {summary['p50Seconds'] * 1000:8.1f}ms | p99 {summary['p99Seconds'] * 1000:8.1f}ms")
+        return lines
+
+
+class _StageTimer:
+    """Context manager behind stage(); a plain class keeps per-block overhead near a microsecond."""
+
+    __slots__ = ('profiler', 'name', 'started')
+
+    def __init__(self, profiler: StageProfiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, (time.perf_counter_ns() - self.started) / 1e9)
+        return False
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _metric_name(value: str) -> str:
+    return "".join(char if char.isalnum() else "_" for char in value)
+
+
+# Process-wide profiler shared by every stage hook
+PROFILER = StageProfiler()
+
+
+def stage(name: str):
+    """Time the enclosed block as one sample of stage name."""
+    return PROFILER.stage(name)
+
+
+def count(name: str, value: float = 1) -> None:
+    PROFILER.count(name, value)
+
+
+@contextmanager
+def capture(mode: Optional[str], base_path: str):
+    """
+    Profile the enclosed block with cProfile or pyinstrument (mode None: no-op).
+
+    cProfile writes <base_path>.prof (open with snakeviz or pstats) plus the top
+    functions by cumulative time in <base_path>.prof.txt; it only sees the
+    calling thread, so blocking driver calls moved to worker threads show up
+    as time awaited. pyinstrument (pip install pyinstrument) samples instead,
+    has lower overhead and writes <base_path>.profile.html.
+    """
+    if mode is None:
+        yield
+        return
+    if mode not in CAPTURE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode} (expected one of {CAPTURE_MODES})")
+    directory = os.path.dirname(base_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if mode == "cprofile":
+        import cProfile
+        import io
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{base_path}.prof")
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(40)
+            with open(f"{base_path}.prof.txt", 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+        return
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        raise RuntimeError("--profile pyinstrument requires pyinstrument: pip install pyinstrument")
+    profiler = Profiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        with open(f"{base_path}.profile.html", 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
@@ -0,0 +1,301 @@
+"""
+Python port of Prompt/responseParser.ts.
+
+Parses the tagged response format ([answer], [code-title], [code]...[end-code],
+[fixed-code], [annotated-code], "Topics covered:", "Probable Question Type:")
+once, when a System B response is written, so readers never have to re-run the
+regexes on raw text. All patterns are compiled once at import time.
+
+parse_response() mirrors parseResponse() field for field, and additionally
+returns every code block and code title found in the response.
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+
+_I = re.IGNORECASE
+_IM = re.IGNORECASE | re.MULTILINE
+
+ANSWER_PATTERN = re.compile(
+    r"\[answer\]:\s*([\s\S]*?)(?=\[code\]|\[code-title\]|\[fixed-code\]|\[explanation\]|\[annotated-code\]|Topics covered:|$)", _I)
+EXPLANATION_PATTERN = re.compile(
+    r"\[explanation\]:\s*([\s\S]*?)(?=\[annotated-code\]|\[code\]|\[code-title\]|\[fixed-code\]|Topics covered:|$)", _I)
+CODE_TITLE_PATTERN = re.compile(r"\[code-title\]:\s*([^\n\r]+)", _I)
+ANNOTATED_CODE_PATTERN = re.compile(r"\[annotated-code\]:\s*([\s\S]*?)\[end-annotated-code\]", _I)
+CODE_BLOCK_PATTERN = re.compile(
+    r"\[(?:fixed-|annotated-)?code\]:\s*([\s\S]*?)\[(?:end-)?(?:fixed-|annotated-)?code\]", _I)
+CODE_TITLE_LINE_PATTERN = re.compile(r"\[code-title\]:[^\n]*\n?")
+MARKDOWN_CODE_PATTERN = re.compile(r"```(?:[a-zA-Z]*\n)?([\s\S]*?)```")
+POST_CODE_PATTERN = re.compile(
+    r"\[end-(?:fixed-)?(?:annotated-)?code\]\s*([\s\S]*?)(?=Topics covered:|Main topics:|Key concepts:|Programming topics:|Concepts discussed:|\[topics\]:|Topics:|Probable Question Type:|$)", _I)
+MARKDOWN_FENCE_LINE_PATTERN = re.compile(r"^```\s*$", re.MULTILINE)
+BLANK_LINES_PATTERN = re.compile(r"^\s*\n+", re.MULTILINE)
+
+TOPICS_PATTERNS = [
+    re.compile(r"Topics covered:\s*([^\n\r]+)", _I),
+    re.compile(r"Main topics:\s*([^\n\r]+)", _I),
+    re.compile(r"Key concepts:\s*([^\n\r]+)", _I),
+    re.compile(r"Programming topics:\s*([^\n\r]+)", _I),
+    re.compile(r"Concepts discussed:\s*([^\n\r]+)", _I),
+    re.compile(r"\[topics\]:\s*([^\n\r]+)", _I),
+    re.compile(r"Topics:\s*([^\n\r]+)", _I),
+]
+TOPIC_SPLIT_PATTERN = re.compile(r"[,;]")
+
+QUESTION_TYPE_PATTERNS = [
+    re.compile(r"Probable Question Type:\s*\[?([^\n\r\]]+)\]?", _I),
+    re.compile(r"Question Type:\s*\[?([^\n\r\]]+)\]?", _I),
+    re.compile(r"Type:\s*\[?([^\n\r\]]+)\]?", _I),
+    re.compile(r"\[question-type\]:\s*([^\n\r]+)", _I),
+    re.compile(r"\[type\]:\s*([^\n\r]+)", _I),
+]
+
+BEFORE_CODE_OR_TOPICS_PATTERN = re.compile(
+    r"^([\s\S]*?)(?=\[(?:fixed-)?(?:annotated-)?code\]|\[code-title\]|\[explanation\]|Topics covered:)", _I)
+BEFORE_FIXED_OR_ANNOTATED_PATTERN = re.compile(r"^([\s\S]*?)(?=\[(?:fixed-code|annotated-code)\])", _I)
+BEFORE_TOPICS_PATTERN = re.compile(
+    r"^([\s\S]*?)(?=Topics covered:|Main topics:|Key concepts:|Programming topics:|Concepts discussed:|\[topics\]:|Topics:|Probable Question Type:)", _I)
+LEADING_TAG_PATTERN = re.compile(r"^\[(?:answer|explanation)\]:\s*", _I)
+CODE_SECTION_PATTERN = re.compile(
+    r"\[(?:fixed-)?(?:annotated-)?code\][\s\S]*?\[(?:end-)?(?:fixed-)?(?:annotated-)?code\]", _I)
+
+POST_CODE_EXPLANATION_PATTERNS = [
+    re.compile(r"###?\s*(Explanation|Changes|Fixes?):\s*([\s\S]*?)(?=Topics covered:|Probable Question Type:|$)", _I),
+    re.compile(r"###?\s*(Explanation|Changes|Fixes?)[:\s]*([\s\S]*?)(?=Topics covered:|Probable Question Type:|$)", _I),
+    re.compile(r"^###?\s*([\s\S]*?)(?=Topics covered:|Probable Question Type:|$)", _I),
+    re.compile(r"([\s\S]*?)(?=Topics covered:|Probable Question Type:|$)", _I),
+]
+
+# Line-level cleanup applied to the final content (case-sensitive, as in the TS parser)
+CONTENT_CLEANUP_PATTERNS = [
+    re.compile(r"Topics covered:.*$", re.MULTILINE),
+    re.compile(r"Main topics:.*$", re.MULTILINE),
+    re.compile(r"Key concepts:.*$", re.MULTILINE),
+    re.compile(r"Probable Question Type:.*$", re.MULTILINE),
+    MARKDOWN_FENCE_LINE_PATTERN,
+]
+TRAILING_TOPICS_PATTERN = re.compile(r"Topics covered:[\s\S]*$", _I)
+TRAILING_QUESTION_TYPE_PATTERN = re.compile(r"Probable Question Type:[\s\S]*$", _I)
+
+
+def _clean_code(code: str) -> str:
+    """Strip [code-title] lines and unwrap a markdown fence inside a code block."""
+    code = CODE_TITLE_LINE_PATTERN.sub("", code.strip())
+    if "```" in code:
+        markdown_match = MARKDOWN_CODE_PATTERN.search(code)
+        if markdown_match and markdown_match.group(1):
+            code = markdown_match.group(1).strip()
+    return code.strip()
+
+
+def _first_group(pattern: re.Pattern, text: str) -> Optional[str]:
+    match = pattern.search(text)
+    if match and match.group(1):
+        return match.group(1)
+    return None
+
+
+def _extract_topics(response: str) -> List[str]:
+    for pattern in TOPICS_PATTERNS:
+        raw = _first_group(pattern, response)
+        if raw:
+            topics = [topic.strip() for topic in TOPIC_SPLIT_PATTERN.split(raw)]
+            topics = [topic for topic in topics if 0 < len(topic) < 100][:6]
+            if topics:
+                return topics
+    return []
+
+
+def _extract_question_type(response: str) -> Optional[str]:
+    for pattern in QUESTION_TYPE_PATTERNS:
+        raw = _first_group(pattern, response)
+        if raw:
+            return raw.strip()
+    return None
+
+
+def extract_code_blocks(response: str) -> List[str]:
+    """Every [code]/[fixed-code]/[annotated-code] block in the response, cleaned."""
+    blocks = [_clean_code(match.group(1)) for match in CODE_BLOCK_PATTERN.finditer(response)]
+    return [block for block in blocks if block]
+
+
+def extract_code_titles(response: str) -> List[str]:
+    """Every [code-title] in the response."""
+    return [match.group(1).strip() for match in CODE_TITLE_PATTERN.finditer(response)]
+
+
+def parse_response(response: str) -> Dict[str, Any]:
+    """
+    Parse a tagged assistant response.
+
+    Returns:
+        Dict with content, topics, rawCode, codeTitle, postCodeContent and
+        probableQuestionType (same semantics as parseResponse() in
+        responseParser.ts), plus codeBlocks and codeTitles (all occurrences)
+    """
+    response = response or ""
+    content = ""
+    raw_code = None
+    post_code_content = None
+
+    # [answer] content, then [explanation] (CodeExplanation responses)
+    content = (_first_group(ANSWER_PATTERN, response) or "").strip()
+    if not content:
+        content = (_first_group(EXPLANATION_PATTERN, response) or "").strip()
+
+    code_title = _first_group(CODE_TITLE_PATTERN, response)
+    if code_title:
+        code_title = code_title.strip()
+
+    # [annotated-code] first, then [code]/[fixed-code]
+    annotated = _first_group(ANNOTATED_CODE_PATTERN, response)
+    if annotated:
+        raw_code = _clean_code(annotated)
+    if not raw_code:
+        code = _first_group(CODE_BLOCK_PATTERN, response)
+        if code:
+            raw_code = _clean_code(code)
+
+    # Content after the code block but before topics
+    post_code = _first_group(POST_CODE_PATTERN, response)
+    if post_code:
+        post_code_content = MARKDOWN_FENCE_LINE_PATTERN.sub("", post_code.strip()).strip()
+        post_code_content = BLANK_LINES_PATTERN.sub("\n", post_code_content).strip()
+
+    topics = _extract_topics(response)
+    probable_question_type = _extract_question_type(response)
+
+    has_fixed = "[fixed-code]" in response
+    has_annotated = "[annotated-code]" in response
+
+    # No [answer]/[explanation]: everything before the first code block or topics
+    if not content and ("[code" in response or "[fixed-code" in response
+                        or "[annotated-code" in response or "Topics covered:" in response):
+        before = _first_group(BEFORE_CODE_OR_TOPICS_PATTERN, response)
+        if before:
+            content = LEADING_TAG_PATTERN.sub("", before.strip())
+
+    # Fixed-code responses: explanation after the code block
+    if not content and has_fixed and post_code_content:
+        for pattern in POST_CODE_EXPLANATION_PATTERNS:
+            match = pattern.search(post_code_content)
+            if match:
+                groups = match.groups()
+                explanation = (groups[1] if len(groups) > 1 else None) or groups[0]
+                if explanation and len(explanation.strip()) > 10:
+                    content = explanation.strip()
+                    break
+
+    # Explanation written before a [fixed-code]/[annotated-code] block
+    if not content and (has_fixed or has_annotated):
+        before = _first_group(BEFORE_FIXED_OR_ANNOTATED_PATTERN, response)
+        if before:
+            before = LEADING_TAG_PATTERN.sub("", before.strip())
+            if len(before) > 10:
+                content = before
+
+    # Everything before the topics section, without code blocks
+    if not content and topics:
+        before = _first_group(BEFORE_TOPICS_PATTERN, response)
+        if before:
+            content = LEADING_TAG_PATTERN.sub("", before.strip())
+            content = CODE_SECTION_PATTERN.sub("", content).strip()
+
+    if (has_fixed or has_annotated) and not content and post_code_content:
+        content = post_code_content
+
+    # Fallback: the whole response without topics and code sections
+    if not content:
+        content = response.strip()
+        content = CONTENT_CLEANUP_PATTERNS[0].sub("", content).strip()
+        content = CONTENT_CLEANUP_PATTERNS[3].sub("", content).strip()
+        content = CODE_SECTION_PATTERN.sub("", content).strip()
+
+    for pattern in CONTENT_CLEANUP_PATTERNS:
+        content = pattern.sub("", content).strip()
+    content = TRAILING_TOPICS_PATTERN.sub("", content).strip()
+    content = TRAILING_QUESTION_TYPE_PATTERN.sub("", content).strip()
+
+    return {
+        'content': content,
+        'topics': topics,
+        'rawCode': raw_code,
+        'codeTitle': code_title,
+        'postCodeContent': post_code_content,
+        'probableQuestionType': probable_question_type,
+        'codeBlocks': extract_code_blocks(response),
+        'codeTitles': extract_code_titles(response),
+    }
+
+
+def parse_responses(responses: Iterable[str]) -> List[Dict[str, Any]]:
+    """Parse many responses (batch form of parse_response)."""
+    return [parse_response(response) for response in responses]
+
+
+def parsed_document_fields(response: str) -> Dict[str, Any]:
+    """
+    Fields stored on a systembresponses document for a response, so readers
+    can use them directly instead of parsing assistantResponse.
+    """
+    parsed = parse_response(response)
+    return {
+        'parsedAnswer': parsed['content'],
+        'codeBlocks': parsed['codeBlocks'],
+        'codeTitles': parsed['codeTitles'],
+        'postCodeContent': parsed['postCodeContent'],
+        'topics': parsed['topics'],
+        'probableQuestionType': parsed['probableQuestionType'],
+    }
+
+
+def backfill_parsed_fields(collection, batch_size: int = 500, only_missing: bool = True) -> int:
+    """
+    Parse assistantResponse of existing documents and store the parsed fields,
+    in bulk batches.
+
+    Args:
+        collection: The systembresponses collection
+        batch_size: Documents per bulk write
+        only_missing: Skip documents that already have parsed fields
+
+    Returns:
+        Number of documents updated
+    """
+    from pymongo import UpdateOne
+
+    query = {'assistantResponse': {'$type': 'string'}}
+    if only_missing:
+        query['parsedAnswer'] = {'$exists': False}
+
+    updated = 0
+    batch = []
+    for doc in collection.find(query, {'assistantResponse': 1}, batch_size=batch_size):
+        batch.append(UpdateOne({'_id': doc['_id']}, {'$set': parsed_document_fields(doc['assistantResponse'])}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+# ==============================
+# 🏁 Entry point
+# ==============================
+if __name__ == "__main__":
+    import argparse
+
+    from .clients import close_clients, get_db
+    from .collector import SYSTEM_B_COLLECTION
+
+    parser = argparse.ArgumentParser(description="Store parsed fields on existing systembresponses documents")
+    parser.add_argument("--all", action="store_true", help="Re-parse documents that already have parsed fields")
+    args = parser.parse_args()
+
+    try:
+        count = backfill_parsed_fields(get_db()[SYSTEM_B_COLLECTION], only_missing=not args.all)
+    finally:
+        close_clients()
+    print(f"✓ Parsed fields stored on {count} documents")
@@ -0,0 +1,244 @@
+"""
+Append-only, crash-safe results journal for the System B collector.
+
+Each generated response is appended as one JSON line and the file is
+flushed + fsync'd every FLUSH_EVERY rows, so a crash loses at most one
+flush interval and the collector never has to hold results in memory.
+The journal can be replayed later into Excel or MongoDB.
+
+The file is shared by every run that writes to the same path, so rows carry
+the runId of the run that wrote them and the collector exports only its own
+run's rows to Excel.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from .response_parser import parsed_document_fields
+
+
+# Rows buffered between fsyncs (also the maximum rows lost on a crash)
+FLUSH_EVERY = 10
+
+# Columns exported to Excel, in order
+EXCEL_COLUMNS = [
+    'sessionId',
+    'questionType',
+    'messageIndex',
+    'userMessage',
+    'userCodeContent',
+    'codeOutputPreference',
+    'fullUserInput',
+    'systemAResponse',
+    'systemBResponse_COT',
+]
+
+
+def _json_default(value: Any):
+    """Serialize values json does not handle natively (datetimes, ObjectIds)."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class ResultsJournal:
+    """
+    Append-only JSON Lines writer with periodic fsync.
+
+    Usage:
+        with ResultsJournal(path, run_id=run_id) as journal:
+            journal.append(row)            # or: await journal.append_async(row)
+    """
+
+    def __init__(self, path: str, flush_every: int = FLUSH_EVERY, run_id: Optional[str] = None):
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.run_id = run_id
+        self.rows_written = 0
+        self._pending = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _write(self, row: Dict[str, Any]) -> bool:
+        """Write one row (stamped with run_id); returns True when a flush is due."""
+        if self.run_id is not None:
+            row = {**row, 'runId': self.run_id}
+        self._file.write(json.dumps(row, ensure_ascii=False, default=_json_default))
+        self._file.write('\n')
+        self.rows_written += 1
+        self._pending += 1
+        return self._pending >= self.flush_every
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """Append one result row; fsyncs once every flush_every rows."""
+        if self._write(row):
+            self.flush()
+
+    async def append_async(self, row: Dict[str, Any]) -> None:
+        """append() for the event loop: the periodic fsync runs in a worker thread."""
+        if self._write(row):
+            self._file.flush()
+            self._pending = 0
+            await asyncio.to_thread(os.fsync, self._file.fileno())
+
+    def flush(self) -> None:
+        """Flush buffered rows and fsync them to disk."""
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# ==============================
+# 🔁 Replay helpers
+# ==============================
+def read_journal(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream rows from a journal file.
+
+    A truncated final line (from a crash mid-write) is skipped. When the same
+    (sessionId, messageIndex) appears more than once, every occurrence is
+    yielded; use latest_rows() to keep only the newest.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def latest_rows(path: str, run_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream rows keeping only the last occurrence of each (sessionId, messageIndex),
+    optionally only among the rows written by run_id.
+
+    Only the line offsets of each key are held in memory, not the rows.
+    """
+    last_line = {}
+    for line_no, row in enumerate(read_journal(path)):
+        if run_id is not None and row.get('runId') != run_id:
+            continue
+        last_line[(row.get('sessionId'), row.get('messageIndex'))] = line_no
+    keep = set(last_line.values())
+    for line_no, row in enumerate(read_journal(path)):
+        if line_no in keep:
+            yield row
+
+
+def export_journal_to_excel(path: str, output_file: str, columns: Optional[List[str]] = None,
+                            run_id: Optional[str] = None) -> int:
+    """
+    Write the journal (or only the rows of run_id) to an Excel file in
+    streaming (write-only) mode so memory stays constant regardless of the
+    number of rows.
+
+    Returns:
+        Number of rows written
+    """
+    from openpyxl import Workbook
+
+    columns = columns or EXCEL_COLUMNS
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns)
+
+    count = 0
+    for row in latest_rows(path, run_id):
+        sheet.append([row.get(column) for column in columns])
+        count += 1
+
+    workbook.save(output_file)
+    return count
+
+
+def replay_journal_to_mongo(path: str, collection, batch_size: int = 500) -> int:
+    """
+    Upsert every journaled response into the systembresponses collection.
+
+    Uses the same (sessionId, messageIndex) key and document fields as the
+    collector, in bulk batches of batch_size.
+
+    Returns:
+        Number of documents upserted or modified
+    """
+    from pymongo import UpdateOne
+
+    written = 0
+    batch = []
+    for row in latest_rows(path):
+        now = datetime.utcnow()
+        document = {
+            'sessionId': row['sessionId'],
+            'messageIndex': row['messageIndex'],
+            'userMessage': row.get('fullUserInput'),
+            'assistantResponse': row.get('systemBResponse_COT'),
+            'questionType': row.get('questionType'),
+            'codeContent': row.get('userCodeContent'),
+            'codeLanguage': row.get('codeLanguage'),
+            'codeOutputPreference': row.get('codeOutputPreference'),
+            **parsed_document_fields(row.get('systemBResponse_COT') or ''),
+            'inputFingerprint': row.get('inputFingerprint'),
+            'updatedAt': now,
+        }
+        batch.append(UpdateOne(
+            {'sessionId': row['sessionId'], 'messageIndex': row['messageIndex']},
+            {'$set': document, '$setOnInsert': {'createdAt': now}},
+            upsert=True
+        ))
+        if len(batch) >= batch_size:
+            result = collection.bulk_write(batch, ordered=False)
+            written += result.upserted_count + result.modified_count
+            batch = []
+
+    if batch:
+        result = collection.bulk_write(batch, ordered=False)
+        written += result.upserted_count + result.modified_count
+    return written
+
+
+# ==============================
+# 🏁 Entry point
+# ==============================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a System B results journal")
+    parser.add_argument("journal", help="Path to the .jsonl results journal")
+    parser.add_argument("--excel", help="Write the journal to this Excel file")
+    parser.add_argument("--run-id", help="Only export the rows written by this run")
+    parser.add_argument("--mongo", action="store_true",
+                        help="Upsert the journal into the systembresponses collection (uses MONGODB_URI)")
+    args = parser.parse_args()
+
+    if args.excel:
+        rows = export_journal_to_excel(args.journal, args.excel, run_id=args.run_id)
+        print(f"✓ Exported {rows} rows to {args.excel}")
+
+    if args.mongo:
+        from .clients import close_clients, get_db
+
+        try:
+            written = replay_journal_to_mongo(args.journal, get_db()["systembresponses"])
+        finally:
+            close_clients()
+        print(f"✓ Upserted {written} documents into systembresponses")
@@ -0,0 +1,259 @@
+"""
+Cost- and latency-aware model routing for System B generation.
+
+A route is a (model, max_tokens) choice for one request. With the "fixed"
+policy every session goes to the standard route (gpt-4o, max_tokens=2000),
+exactly as before. With the "adaptive" policy:
+
+- max_tokens comes from the historical completion-token distribution of the
+  session's (questionType, codeOutputPreference) bucket: the BUDGET_PERCENTILE
+  value plus BUDGET_HEADROOM, clamped to [MIN_OUTPUT_TOKENS, MAX_OUTPUT_TOKENS].
+  Shorter budgets let the API admit more concurrent requests under a
+  tokens-per-minute limit and cap runaway answers.
+- Short, no-code / pseudo-code explanatory questions (LIGHT_BUCKETS, at most
+  LIGHT_MAX_INPUT_TOKENS of input) go to the light model, unless that route's
+  history for the bucket shows too many truncated answers
+  (finish_reason == "length") or a P95 latency no better than the standard
+  route's, in which case they stay on the standard model.
+
+A response cut off on the light model or under a reduced budget is never
+stored: the collector regenerates it on the standard route at
+MAX_OUTPUT_TOKENS and records the cut-off attempt in usage.escalatedFrom,
+which counts as a truncated sample of the original route here.
+
+Every System B document records the route it took ('route', 'model',
+'maxTokens') and its usage (prompt/completion tokens, latency, finish
+reason), which is the history the next run learns from. report_routes()
+summarizes throughput and cost per route:
+
+    python -m System_B_Response.routing --report
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from .scheduler import CHARS_PER_TOKEN, DEFAULT_OUTPUT_TOKENS, MAX_OUTPUT_TOKENS, estimate_input_tokens
+
+
+ROUTING_POLICIES = ("fixed", "adaptive")
+
+# USD per 1M tokens (input, output); update when pricing changes
+ROUTES = {
+    "standard": {'model': "gpt-4o", 'inputPrice': 2.50, 'outputPrice': 10.00},
+    "light": {'model': "gpt-4o-mini", 'inputPrice': 0.15, 'outputPrice': 0.60},
+}
+DEFAULT_ROUTE = "standard"
+
+# (questionType, codeOutputPreference) buckets the light model may answer
+LIGHT_BUCKETS = {
+    ("GeneralQuestion", "NoCode"),
+    ("GeneralQuestion", "PseudoCode"),
+    ("CodeExplanation", "NoCode"),
+    ("QuestionFromCode", "NoCode"),
+}
+LIGHT_MAX_INPUT_TOKENS = 600
+
+# Light route is abandoned for a bucket above this truncation rate
+MAX_TRUNCATION_RATE = 0.05
+
+# Token budget from history
+BUDGET_PERCENTILE = 99
+BUDGET_HEADROOM = 1.25
+MIN_OUTPUT_TOKENS = 512
+MIN_HISTORY = 20
+
+
+def _bucket(question_type: Optional[str], code_output_preference: Optional[str]) -> Tuple[str, str]:
+    return (question_type or "GeneralQuestion", code_output_preference or "WithCode")
+
+
+def load_route_history(collection) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    Per-bucket output-length and latency distributions from stored responses.
+
+    Documents written before usage was recorded contribute an output length
+    estimated from the response text. Only numbers are projected, and the
+    percentiles are computed locally with NumPy.
+
+    Returns:
+        {(questionType, codeOutputPreference): {
+            'samples', 'outputTokensP50', 'outputTokensP99',
+            'routes': {route: {'samples', 'latencyP50', 'latencyP95', 'truncationRate'}}}}
+    """
+    import numpy as np
+
+    pipeline = [
+        {'$match': {'assistantResponse': {'$type': 'string'}}},
+        {'$project': {
+            '_id': 0,
+            'questionType': 1,
+            'codeOutputPreference': 1,
+            'route': 1,
+            'latency': '$usage.latency',
+            'finishReason': '$usage.finishReason',
+            'escalatedFrom': '$usage.escalatedFrom',
+            'tokens': {'$ifNull': [
+                '$usage.completionTokens',
+                {'$divide': [{'$strLenCP': '$assistantResponse'}, CHARS_PER_TOKEN]},
+            ]},
+        }},
+    ]
+    tokens: Dict[Tuple[str, str], List[float]] = {}
+    per_route: Dict[Tuple[Tuple[str, str], str], Dict[str, list]] = {}
+    for doc in collection.aggregate(pipeline):
+        bucket = _bucket(doc.get('questionType'), doc.get('codeOutputPreference'))
+        tokens.setdefault(bucket, []).append(doc['tokens'])
+        if doc.get('route') and doc.get('latency') is not None:
+            samples = per_route.setdefault((bucket, doc['route']), {'latency': [], 'truncated': []})
+            samples['latency'].append(doc['latency'])
+            samples['truncated'].append(doc.get('finishReason') == 'length')
+        escalated = doc.get('escalatedFrom')
+        if escalated and escalated.get('route') and escalated.get('latency') is not None:
+            samples = per_route.setdefault((bucket, escalated['route']), {'latency': [], 'truncated': []})
+            samples['latency'].append(escalated['latency'])
+            samples['truncated'].append(True)
+
+    history = {}
+    for bucket, values in tokens.items():
+        values = np.asarray(values, dtype=float)
+        history[bucket] = {
+            'samples': len(values),
+            'outputTokensP50': float(np.percentile(values, 50)),
+            'outputTokensP99': float(np.percentile(values, BUDGET_PERCENTILE)),
+            'routes': {},
+        }
+    for (bucket, route), samples in per_route.items():
+        latency = np.asarray(samples['latency'], dtype=float)
+        history.setdefault(bucket, {'samples': 0, 'routes': {}})['routes'][route] = {
+            'samples': len(latency),
+            'latencyP50': float(np.percentile(latency, 50)),
+            'latencyP95': float(np.percentile(latency, 95)),
+            'truncationRate': float(np.mean(samples['truncated'])),
+        }
+    return history
+
+
+def light_route_allowed(bucket_history: Dict[str, Any]) -> bool:
+    """
+    True unless the bucket's light-route history shows too many truncations,
+    or a P95 latency no better than the standard route's (both need MIN_HISTORY samples).
+    """
+    routes = bucket_history.get('routes', {})
+    light = routes.get("light")
+    if not light or light['samples'] < MIN_HISTORY:
+        return True
+    if light['truncationRate'] > MAX_TRUNCATION_RATE:
+        return False
+    standard = routes.get(DEFAULT_ROUTE)
+    if standard and standard['samples'] >= MIN_HISTORY and light['latencyP95'] >= standard['latencyP95']:
+        return False
+    return True
+
+
+def token_budget(bucket: Tuple[str, str], history: Dict[Tuple[str, str], Dict[str, Any]]) -> int:
+    stats = history.get(bucket)
+    if stats and stats.get('samples', 0) >= MIN_HISTORY:
+        expected = stats['outputTokensP99']
+    else:
+        expected = 2 * DEFAULT_OUTPUT_TOKENS.get(bucket[0], DEFAULT_OUTPUT_TOKENS["GeneralQuestion"])
+    return int(min(max(expected * BUDGET_HEADROOM, MIN_OUTPUT_TOKENS), MAX_OUTPUT_TOKENS))
+
+
+def choose_route(session_data: Dict[str, Any], history: Dict[Tuple[str, str], Dict[str, Any]],
+                 policy: str = "fixed") -> Dict[str, Any]:
+    """
+    Pick the route for one session.
+
+    Returns:
+        {'route', 'model', 'maxTokens'}
+    """
+    if policy not in ROUTING_POLICIES:
+        raise ValueError(f"Unknown routing policy: {policy} (expected one of {ROUTING_POLICIES})")
+    if policy == "fixed":
+        return {'route': DEFAULT_ROUTE, 'model': ROUTES[DEFAULT_ROUTE]['model'], 'maxTokens': MAX_OUTPUT_TOKENS}
+
+    bucket = _bucket(session_data.get('questionType'), session_data.get('codeOutputPreference'))
+    route = DEFAULT_ROUTE
+    if bucket in LIGHT_BUCKETS and estimate_input_tokens(session_data) <= LIGHT_MAX_INPUT_TOKENS:
+        if light_route_allowed(history.get(bucket, {})):
+            route = "light"
+    return {'route': route, 'model': ROUTES[route]['model'], 'maxTokens': token_budget(bucket, history)}
+
+
+def request_cost(route: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = ROUTES.get(route, ROUTES[DEFAULT_ROUTE])
+    return (prompt_tokens * prices['inputPrice'] + completion_tokens * prices['outputPrice']) / 1_000_000
+
+
+class RouteStats:
+    """Per-route request, token, latency and cost totals for one run."""
+
+    def __init__(self):
+        self.routes: Dict[str, Dict[str, float]] = {}
+
+    def record(self, route: str, prompt_tokens: int, completion_tokens: int, latency: float) -> None:
+        stats = self.routes.setdefault(route, {'requests': 0, 'promptTokens': 0, 'completionTokens': 0,
+                                               'latency': 0.0, 'cost': 0.0})
+        stats['requests'] += 1
+        stats['promptTokens'] += prompt_tokens
+        stats['completionTokens'] += completion_tokens
+        stats['latency'] += latency
+        stats['cost'] += request_cost(route, prompt_tokens, completion_tokens)
+
+    def lines(self) -> List[str]:
+        return [format_route_line(route, stats) for route, stats in sorted(self.routes.items())]
+
+
+def format_route_line(route: str, stats: Dict[str, float]) -> str:
+    requests = stats['requests'] or 1
+    latency = stats['latency'] or 1e-9
+    return (f"{route:<9} {ROUTES.get(route, {}).get('model', '?'):<12} "
+            f"requests {stats['requests']:>6} | avg latency {stats['latency'] / requests:5.1f}s | "
+            f"{stats['completionTokens'] / latency:6.1f} out tok/s | "
+            f"tokens {stats['promptTokens']:,} in / {stats['completionTokens']:,} out | "
+            f"cost ${stats['cost']:.2f} (${stats['cost'] / requests * 1000:.2f} per 1k)")
+
+
+def report_routes(collection) -> Dict[str, Dict[str, float]]:
+    """Throughput and cost per route over every stored response with recorded usage."""
+    pipeline = [
+        {'$match': {'route': {'$exists': True}, 'usage.completionTokens': {'$exists': True}}},
+        {'$group': {
+            '_id': '$route',
+            'requests': {'$sum': 1},
+            'promptTokens': {'$sum': '$usage.promptTokens'},
+            'completionTokens': {'$sum': '$usage.completionTokens'},
+            'latency': {'$sum': '$usage.latency'},
+        }},
+    ]
+    routes = {}
+    for doc in collection.aggregate(pipeline):
+        stats = {key: doc[key] for key in ('requests', 'promptTokens', 'completionTokens', 'latency')}
+        stats['cost'] = request_cost(doc['_id'], stats['promptTokens'], stats['completionTokens'])
+        routes[doc['_id']] = stats
+    return routes
+
+
+# ==============================
+# 🏁 Entry point
+# ==============================
+if __name__ == "__main__":
+    import argparse
+
+    from .clients import close_clients, get_db
+
+    parser = argparse.ArgumentParser(description="Inspect System B model routing")
+    parser.add_argument("--report", action="store_true", help="Throughput and cost per route")
+    parser.add_argument("--history", action="store_true", help="Per-bucket budgets and latency history")
+    args = parser.parse_args()
+
+    collection = get_db()["systembresponses"]
+
+    if args.history:
+        for bucket, stats in sorted(load_route_history(collection).items()):
+            routes = ", ".join(f"{name} p95 {r['latencyP95']:.1f}s trunc {r['truncationRate']:.0%}"
+                               for name, r in stats['routes'].items())
+            print(f"{bucket[0]:<17} {bucket[1]:<11} n={stats['samples']:<5} "
+                  f"budget {token_budget(bucket, {bucket: stats})} {routes}")
+    if args.report or not args.history:
+        for route, stats in sorted(report_routes(collection).items()):
+            print(format_route_line(route, stats))
+    close_clients()
@@ -0,0 +1,211 @@
+"""
+Run-state tracking for System B collector runs.
+
+Every run registers a document in the systembruns collection (config, prompt
+hash, model) and keeps rolling counters on it: done, failed, skipped, tokens,
+requests/sec, p50/p95 latency and ETA. Counters are kept in memory and a
+background task (run_flusher) writes them every FLUSH_INTERVAL seconds from a
+worker thread, so tracking costs one small update per interval regardless of
+throughput and never blocks the event loop. Use watch_run.py to follow a run from
+another terminal.
+
+Run document:
+    {
+        _id: "<run id>",
+        status: "running" | "completed" | "failed" | "interrupted",
+        model, promptHash, config: {...},
+        startedAt, updatedAt, finishedAt,
+        total, done, failed, skipped,
+        promptTokens, completionTokens,
+        requestsPerSec, recentRequestsPerSec,
+        latencyP50, latencyP95, etaSeconds
+    }
+"""
+import asyncio
+import hashlib
+import os
+import socket
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+
+RUNS_COLLECTION = "systembruns"
+
+# Seconds between run-document updates
+FLUSH_INTERVAL = 5.0
+
+# Window used for the "recent" throughput and ETA
+RATE_WINDOW_SECONDS = 60.0
+
+# Number of most recent latencies kept for percentiles
+LATENCY_SAMPLES = 1000
+
+
+def compute_prompt_hash(prompts: Iterable[str]) -> str:
+    """Stable short hash identifying a set of system prompts."""
+    digest = hashlib.sha256()
+    for prompt in prompts:
+        digest.update(prompt.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def new_run_id() -> str:
+    return f"{datetime.utcnow():%Y%m%d-%H%M%S}-{socket.gethostname()}-{os.getpid()}"
+
+
+def _percentile(sorted_values, fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class RunTracker:
+    """
+    In-memory run counters with batched writes to the runs collection.
+
+    Usage:
+        tracker = RunTracker(collection, model=MODEL, prompt_hash=h, config={...}, total=n)
+        tracker.start()
+        flusher = asyncio.create_task(tracker.run_flusher())
+        tracker.record("done", latency=1.8, prompt_tokens=900, completion_tokens=650)
+        flusher.cancel()
+        tracker.finish("completed")
+    """
+
+    def __init__(self, collection, model: str, prompt_hash: str, config: Dict[str, Any],
+                 total: int, run_id: str = None, flush_interval: float = FLUSH_INTERVAL):
+        self.collection = collection
+        self.run_id = run_id or new_run_id()
+        self.model = model
+        self.prompt_hash = prompt_hash
+        self.config = config
+        self.total = total
+        self.flush_interval = flush_interval
+
+        self.counts = {'done': 0, 'failed': 0, 'skipped': 0}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._finished_at = deque()
+        self._started = time.monotonic()
+
+    @property
+    def completed(self) -> int:
+        return sum(self.counts.values())
+
+    def start(self) -> None:
+        """Register the run document."""
+        now = datetime.utcnow()
+        try:
+            self.collection.insert_one({
+                '_id': self.run_id,
+                'status': 'running',
+                'model': self.model,
+                'promptHash': self.prompt_hash,
+                'config': self.config,
+                'host': socket.gethostname(),
+                'pid': os.getpid(),
+                'startedAt': now,
+                'updatedAt': now,
+                'total': self.total,
+                **self.counts,
+            })
+        except Exception as e:
+            print(f"  ⚠ Could not register run document: {e}")
+
+    def record(self, outcome: str, latency: float = None,
+               prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        """Count one finished session ("done", "failed" or "skipped"). run_flusher writes it."""
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+        if latency is not None:
+            self._latencies.append(latency)
+        self._finished_at.append(time.monotonic())
+
+    def add_total(self, count: int) -> None:
+        """Grow the expected total (for runs whose work arrives over time)."""
+        self.total += count
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current counters and derived metrics."""
+        now = time.monotonic()
+        elapsed = max(now - self._started, 1e-9)
+        while self._finished_at and now - self._finished_at[0] > RATE_WINDOW_SECONDS:
+            self._finished_at.popleft()
+        window = min(elapsed, RATE_WINDOW_SECONDS)
+        recent_rate = len(self._finished_at) / window if window > 0 else 0.0
+        overall_rate = self.completed / elapsed
+
+        remaining = max(self.total - self.completed, 0)
+        rate = recent_rate or overall_rate
+        eta = remaining / rate if rate > 0 else None
+
+        latencies = sorted(self._latencies)
+        return {
+            **self.counts,
+            'total': self.total,
+            'promptTokens': self.prompt_tokens,
+            'completionTokens': self.completion_tokens,
+            'elapsedSeconds': round(elapsed, 1),
+            'requestsPerSec': round(overall_rate, 4),
+            'recentRequestsPerSec': round(recent_rate, 4),
+            'latencyP50': _percentile(latencies, 0.50),
+            'latencyP95': _percentile(latencies, 0.95),
+            'etaSeconds': round(eta, 1) if eta is not None else None,
+        }
+
+    def _write(self, snapshot: Dict[str, Any]) -> None:
+        try:
+            self.collection.update_one(
+                {'_id': self.run_id},
+                {'$set': {**snapshot, 'updatedAt': datetime.utcnow()}}
+            )
+        except Exception:
+            pass
+
+    def flush(self) -> None:
+        """Write the current snapshot to the run document (blocking)."""
+        self._write(self.snapshot())
+
+    async def run_flusher(self) -> None:
+        """Write the snapshot every flush_interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Snapshot on the loop, where the counters change; only the write runs in a thread
+            await asyncio.to_thread(self._write, self.snapshot())
+
+    def finish(self, status: str = "completed") -> None:
+        """Final flush and mark the run finished."""
+        self.flush()
+        try:
+            self.collection.update_one(
+                {'_id': self.run_id},
+                {'$set': {'status': status, 'finishedAt': datetime.utcnow()}}
+            )
+        except Exception:
+            pass
+
+
+# ==============================
+# 👀 Reading runs
+# ==============================
+def ensure_run_indexes(collection) -> None:
+    collection.create_index([('startedAt', -1)])
+
+
+def latest_run(collection, active_only: bool = False) -> Optional[Dict[str, Any]]:
+    query = {'status': 'running'} if active_only else {}
+    return collection.find_one(query, sort=[('startedAt', -1)])
+
+
+def is_stale(run: Dict[str, Any], flush_interval: float = FLUSH_INTERVAL) -> bool:
+    """A 'running' run that has not updated for many flush intervals has likely crashed."""
+    updated_at = run.get('updatedAt')
+    if run.get('status') != 'running' or updated_at is None:
+        return False
+    return datetime.utcnow() - updated_at > timedelta(seconds=max(60.0, 12 * flush_interval))
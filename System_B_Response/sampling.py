@@ -0,0 +1,109 @@
+"""
+Stratified session sampling for smoke and test runs.
+
+Taking the first N sessions after fetching all of them is slow and biased
+toward the oldest sessions. sample_session_ids() instead draws N sessions
+stratified by the questionType and codeOutputPreference of their first user
+message, so every combination present in the collection is represented
+(one session at least, then proportionally to its size).
+
+Strata are computed server-side by one aggregation that returns only _id and
+the stratum of each usable session (one with a user and an assistant
+message). The sample is drawn from those ids with a seeded random.Random,
+because $sample cannot be seeded: the same --seed and data give the same
+sample. The collector then fetches only the sampled documents.
+
+Usage:
+    python -m System_B_Response --sample 20 --seed 7
+"""
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+from .profiling import stage
+
+
+# Fields of the first user message that define a stratum, with the collector's defaults
+STRATA_FIELDS = {
+    'questionType': 'GeneralQuestion',
+    'codeOutputPreference': 'WithCode',
+}
+
+# Cheap pre-filter for sessions extract_session_data() can use
+USABLE_SESSION = {'messages.1': {'$exists': True}, 'messages.role': {'$all': ['user', 'assistant']}}
+
+Stratum = Tuple[str, ...]
+
+
+def stratum_pipeline(query: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """Aggregation returning {_id, stratum: {questionType, codeOutputPreference}} per usable session."""
+    first_user = {'$arrayElemAt': [
+        {'$filter': {'input': '$messages', 'as': 'm', 'cond': {'$eq': ['$$m.role', 'user']}}}, 0
+    ]}
+    return [
+        {'$match': {**(query or {}), **USABLE_SESSION}},
+        {'$project': {'_id': 1, 'first': first_user}},
+        {'$project': {'stratum': {
+            field: {'$ifNull': [f'$first.{field}', default]} for field, default in STRATA_FIELDS.items()
+        }}},
+    ]
+
+
+def allocate(sizes: Dict[Stratum, int], n: int) -> Dict[Stratum, int]:
+    """
+    Split n draws across strata: one per stratum first (largest strata first
+    if n is smaller than the number of strata), the rest proportionally to
+    size with largest remainders.
+    """
+    total = sum(sizes.values())
+    if n >= total:
+        return dict(sizes)
+    by_size = sorted(sizes, key=lambda stratum: (-sizes[stratum], stratum))
+    allocation = {stratum: 0 for stratum in sizes}
+    for stratum in by_size[:n]:
+        allocation[stratum] = 1
+    remaining = n - sum(allocation.values())
+    if remaining <= 0:
+        return allocation
+
+    spare = {stratum: sizes[stratum] - allocation[stratum] for stratum in sizes}
+    spare_total = sum(spare.values())
+    shares = {stratum: remaining * spare[stratum] / spare_total for stratum in sizes}
+    for stratum in sizes:
+        allocation[stratum] += int(shares[stratum])
+    leftover = n - sum(allocation.values())
+    by_remainder = sorted(sizes, key=lambda stratum: (-(shares[stratum] % 1), -sizes[stratum], stratum))
+    for stratum in by_remainder[:leftover]:
+        allocation[stratum] += 1
+    return allocation
+
+
+def sample_session_ids(collection, n: int, seed: Optional[int] = None,
+                       query: Dict[str, Any] = None) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Draw a stratified sample of n usable sessions matching query.
+
+    Returns:
+        (sampled _ids, report with 'population', 'sampled' and 'strata':
+         {"questionType/codeOutputPreference": (sampled, population)})
+    """
+    with stage("sample_strata"):
+        members: Dict[Stratum, List[Any]] = {}
+        for doc in collection.aggregate(stratum_pipeline(query)):
+            stratum = tuple(str(doc['stratum'][field]) for field in STRATA_FIELDS)
+            members.setdefault(stratum, []).append(doc['_id'])
+
+    sizes = {stratum: len(ids) for stratum, ids in members.items()}
+    allocation = allocate(sizes, n)
+    sampled = []
+    for stratum in sorted(members):
+        # Sorted ids and a per-stratum generator: the sample only depends on the seed and the data
+        ids = sorted(members[stratum], key=str)
+        rng = random.Random(f"{seed}:{'/'.join(stratum)}") if seed is not None else random.Random()
+        sampled.extend(rng.sample(ids, allocation[stratum]))
+
+    report = {
+        'population': sum(sizes.values()),
+        'sampled': len(sampled),
+        'strata': {'/'.join(stratum): (allocation[stratum], sizes[stratum]) for stratum in sorted(sizes)},
+    }
+    return sampled, report
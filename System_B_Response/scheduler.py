@@ -0,0 +1,155 @@
+"""
+Scheduling of System B generation work.
+
+Sessions differ a lot in cost: a HelpFixCode prompt with a long [Code]: block
+produces a long answer, while a short GeneralQuestion finishes quickly. When
+work runs concurrently, processing in collection order leaves a long tail of
+expensive requests at the end of the run. This module estimates the cost of
+each session and orders the work queue:
+
+- "longest-first": Longest Processing Time first, which minimizes makespan
+- "fair-share":    round-robin across questionType buckets (longest-first within
+                   a bucket), so a partial run already holds a balanced sample
+- "collection":    original collection order
+"""
+from typing import Any, Dict, List
+
+
+SCHEDULE_MODES = ("longest-first", "fair-share", "collection")
+
+# Rough characters-per-token ratio for English text and C/C++ code
+CHARS_PER_TOKEN = 4
+
+# Input tokens are processed in parallel (prefill) and cost far less wall time
+# than generated tokens; they are weighted down accordingly
+INPUT_TOKEN_WEIGHT = 0.05
+
+# Generated tokens are capped by max_tokens in get_response
+MAX_OUTPUT_TOKENS = 2000
+
+# Fallback output length per question type when there is no history yet
+DEFAULT_OUTPUT_TOKENS = {
+    "GeneralQuestion": 700,
+    "HelpWriteCode": 1100,
+    "HelpFixCode": 1200,
+    "CodeExplanation": 1000,
+    "QuestionFromCode": 800,
+}
+
+
+def estimate_input_tokens(session_data: Dict[str, Any]) -> int:
+    """Approximate prompt tokens of a session's (message + code) user input."""
+    return len(session_data.get('userMessage') or '') // CHARS_PER_TOKEN
+
+
+def load_cost_model(collection) -> Dict[str, Dict[str, float]]:
+    """
+    Fit output_tokens ~ intercept + slope * input_tokens per questionType from
+    responses already stored in the systembresponses collection.
+
+    The least-squares sums are computed server-side in a single $group, so only
+    one small document per question type comes back.
+
+    Returns:
+        {questionType: {'intercept': float, 'slope': float, 'samples': int}}
+    """
+    pipeline = [
+        {'$match': {'assistantResponse': {'$type': 'string'}, 'userMessage': {'$type': 'string'}}},
+        {'$project': {
+            'questionType': 1,
+            'x': {'$divide': [{'$strLenCP': '$userMessage'}, CHARS_PER_TOKEN]},
+            'y': {'$divide': [{'$strLenCP': '$assistantResponse'}, CHARS_PER_TOKEN]},
+        }},
+        {'$group': {
+            '_id': '$questionType',
+            'n': {'$sum': 1},
+            'sx': {'$sum': '$x'},
+            'sy': {'$sum': '$y'},
+            'sxx': {'$sum': {'$multiply': ['$x', '$x']}},
+            'sxy': {'$sum': {'$multiply': ['$x', '$y']}},
+        }},
+    ]
+
+    model = {}
+    for doc in collection.aggregate(pipeline):
+        n = doc['n']
+        if not n:
+            continue
+        mean_x = doc['sx'] / n
+        mean_y = doc['sy'] / n
+        var_x = doc['sxx'] / n - mean_x ** 2
+        slope = 0.0
+        if n >= 5 and var_x > 1e-9:
+            slope = max(0.0, (doc['sxy'] / n - mean_x * mean_y) / var_x)
+        model[doc['_id']] = {
+            'intercept': mean_y - slope * mean_x,
+            'slope': slope,
+            'samples': n,
+        }
+    return model
+
+
+def estimate_cost(session_data: Dict[str, Any], cost_model: Dict[str, Dict[str, float]] = None) -> float:
+    """
+    Estimate the relative cost (≈ weighted tokens) of generating a session.
+
+    Args:
+        session_data: A session dict produced by fetch_sessions_from_mongodb, or an
+                      --all-turns session (the turns it will generate are summed)
+        cost_model: Output of load_cost_model; falls back to DEFAULT_OUTPUT_TOKENS
+    """
+    if 'turns' in session_data:
+        pending = session_data['turns'][session_data.get('startTurn', 0):]
+        return sum(estimate_cost(turn, cost_model) for turn in pending)
+    question_type = session_data.get('questionType')
+    input_tokens = estimate_input_tokens(session_data)
+
+    fit = (cost_model or {}).get(question_type)
+    if fit:
+        output_tokens = fit['intercept'] + fit['slope'] * input_tokens
+    else:
+        output_tokens = DEFAULT_OUTPUT_TOKENS.get(question_type, DEFAULT_OUTPUT_TOKENS["GeneralQuestion"])
+    output_tokens = min(max(output_tokens, 0.0), MAX_OUTPUT_TOKENS)
+
+    return output_tokens + INPUT_TOKEN_WEIGHT * input_tokens
+
+
+def order_longest_first(items: List[Dict[str, Any]], cost_model=None) -> List[Dict[str, Any]]:
+    """Order work by descending estimated cost (LPT scheduling)."""
+    return sorted(items, key=lambda item: estimate_cost(item, cost_model), reverse=True)
+
+
+def order_fair_share(items: List[Dict[str, Any]], cost_model=None) -> List[Dict[str, Any]]:
+    """
+    Interleave questionType buckets round-robin so every prefix of the
+    schedule holds a balanced mix. Within a bucket, longest work goes first.
+    """
+    buckets: Dict[str, List[Dict[str, Any]]] = {}
+    for item in items:
+        buckets.setdefault(item.get('questionType'), []).append(item)
+
+    queues = [order_longest_first(bucket, cost_model) for bucket in buckets.values()]
+    ordered = []
+    position = 0
+    while len(ordered) < len(items):
+        for queue in queues:
+            if position < len(queue):
+                ordered.append(queue[position])
+        position += 1
+    return ordered
+
+
+def schedule(items: List[Dict[str, Any]], mode: str = "longest-first", cost_model=None) -> List[Dict[str, Any]]:
+    """
+    Order the work queue according to the given scheduling mode.
+
+    Raises:
+        ValueError: If mode is not one of SCHEDULE_MODES
+    """
+    if mode == "longest-first":
+        return order_longest_first(items, cost_model)
+    if mode == "fair-share":
+        return order_fair_share(items, cost_model)
+    if mode == "collection":
+        return list(items)
+    raise ValueError(f"Unknown schedule mode '{mode}'. Expected one of: {', '.join(SCHEDULE_MODES)}")
@@ -0,0 +1,104 @@
+"""
+Change-stream plumbing for the collector's --watch service mode.
+
+The collector watches the sessions collection and generates System B
+responses for new first turns as they are recorded. This module keeps the
+parts that make restarts safe:
+
+- Resume tokens are persisted in the systembwatch collection, so a restarted
+  watcher continues exactly where the previous one stopped.
+- Events are processed concurrently and can finish out of order, so the token
+  that is persisted is the one of the last event for which every earlier
+  event has finished (a contiguous-completion watermark). A crash can then
+  only cause events to be seen again, never skipped; replays are harmless
+  because sessions whose input fingerprint is unchanged are not regenerated.
+
+Change streams require a replica set. For local testing, a single-node
+replica set is enough:
+
+    mongod --replSet rs0 --dbpath <dir>
+    mongosh --eval "rs.initiate()"
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+WATCH_COLLECTION = "systembwatch"
+
+# Seconds a change-stream getMore waits for new events before returning
+MAX_AWAIT_SECONDS = 1.0
+
+# Minimum seconds between resume-token writes
+SAVE_INTERVAL = 2.0
+
+
+def watch_pipeline() -> List[Dict[str, Any]]:
+    """Only inserts and updates can create or complete a first turn."""
+    return [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace']}}}]
+
+
+def open_session_stream(sessions_collection, resume_token: Optional[Dict[str, Any]] = None):
+    """Open a change stream on sessions returning full documents, resuming after resume_token."""
+    return sessions_collection.watch(
+        watch_pipeline(),
+        full_document='updateLookup',
+        resume_after=resume_token,
+        max_await_time_ms=int(MAX_AWAIT_SECONDS * 1000),
+    )
+
+
+def load_resume_token(collection, name: str) -> Optional[Dict[str, Any]]:
+    doc = collection.find_one({'_id': name}, {'resumeToken': 1})
+    return (doc or {}).get('resumeToken')
+
+
+def save_resume_token(collection, name: str, token: Dict[str, Any], processed: int) -> None:
+    collection.update_one(
+        {'_id': name},
+        {'$set': {'resumeToken': token, 'updatedAt': datetime.utcnow()},
+         '$inc': {'eventsProcessed': processed}},
+        upsert=True
+    )
+
+
+class ResumeWatermark:
+    """
+    Track which change events have finished and expose the newest resume
+    token that is safe to persist.
+
+    Usage:
+        seq = watermark.begin(change['_id'])
+        ... process the event, possibly concurrently ...
+        watermark.finish(seq)
+        token = watermark.safe_token   # every event up to this token is done
+    """
+
+    def __init__(self):
+        self._next_seq = 0
+        self._tokens: Dict[int, Dict[str, Any]] = {}
+        self._finished = set()
+        self._low = 0  # every seq below this has finished
+        self.safe_token: Optional[Dict[str, Any]] = None
+        self.advanced = 0  # events covered by safe_token since the last take_advanced()
+
+    def begin(self, token: Dict[str, Any]) -> int:
+        seq = self._next_seq
+        self._next_seq += 1
+        self._tokens[seq] = token
+        return seq
+
+    def finish(self, seq: int) -> None:
+        self._finished.add(seq)
+        while self._low in self._finished:
+            self._finished.discard(self._low)
+            self.safe_token = self._tokens.pop(self._low)
+            self._low += 1
+            self.advanced += 1
+
+    @property
+    def in_flight(self) -> int:
+        return self._next_seq - self._low
+
+    def take_advanced(self) -> int:
+        advanced, self.advanced = self.advanced, 0
+        return advanced
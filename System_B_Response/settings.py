@@ -0,0 +1,22 @@
+"""
+Shared settings for the System B package.
+
+Nothing here touches the network or the filesystem at import time. Paths
+default to the repository's data/ directory and can be moved with the
+SYSTEM_B_DATA_DIR environment variable.
+"""
+import os
+
+
+DB_NAME = "Eeffective_Learning_db"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def data_dir() -> str:
+    """Directory for Excel outputs and journals (SYSTEM_B_DATA_DIR or <repo>/data)."""
+    return os.environ.get("SYSTEM_B_DATA_DIR") or os.path.join(REPO_ROOT, "data")
+
+
+def data_path(filename: str) -> str:
+    return os.path.join(data_dir(), filename)
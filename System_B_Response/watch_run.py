@@ -0,0 +1,96 @@
+"""
+Watch System B collector runs from another terminal.
+
+Examples:
+    python -m System_B_Response.watch_run                 # follow the latest run
+    python -m System_B_Response.watch_run --run-id <id>   # follow a specific run
+    python -m System_B_Response.watch_run --list          # list recent runs
+"""
+import argparse
+import sys
+import time
+
+from .clients import close_clients, get_db
+from .run_state import RUNS_COLLECTION, is_stale, latest_run
+
+
+def format_duration(seconds) -> str:
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours:d}:{minutes:02d}:{secs:02d}"
+
+
+def format_latency(value) -> str:
+    return f"{value:.2f}s" if value is not None else "--"
+
+
+def format_run_line(run) -> str:
+    total = run.get('total') or 0
+    completed = run.get('done', 0) + run.get('failed', 0) + run.get('skipped', 0)
+    percentage = (completed / total * 100) if total else 0.0
+    tokens = (run.get('promptTokens') or 0) + (run.get('completionTokens') or 0)
+    status = run.get('status', '?')
+    if is_stale(run):
+        status = "stale?"
+    return (
+        f"[{completed}/{total}] ({percentage:.1f}%) | {status:<10} | "
+        f"done {run.get('done', 0)} failed {run.get('failed', 0)} skipped {run.get('skipped', 0)} | "
+        f"{run.get('recentRequestsPerSec') or 0:.2f} req/s | "
+        f"p50 {format_latency(run.get('latencyP50'))} p95 {format_latency(run.get('latencyP95'))} | "
+        f"{tokens:,} tokens | ETA {format_duration(run.get('etaSeconds'))}"
+    )
+
+
+def list_runs(collection, limit: int) -> None:
+    print(f"{'Run ID':<45} {'Status':<11} {'Model':<12} {'Prompt':<17} Progress")
+    print("-" * 110)
+    for run in collection.find({}, sort=[('startedAt', -1)], limit=limit):
+        total = run.get('total') or 0
+        completed = run.get('done', 0) + run.get('failed', 0) + run.get('skipped', 0)
+        status = "stale?" if is_stale(run) else run.get('status', '?')
+        print(f"{run['_id']:<45} {status:<11} {run.get('model', ''):<12} "
+              f"{run.get('promptHash', ''):<17} {completed}/{total}")
+
+
+def watch(collection, run_id: str, interval: float, once: bool) -> int:
+    run = collection.find_one({'_id': run_id}) if run_id else latest_run(collection)
+    if run is None:
+        print("❌ No run found.")
+        return 1
+
+    print(f"Run {run['_id']} | model {run.get('model')} | prompt {run.get('promptHash')}")
+    print(f"Config: {run.get('config')}")
+    while True:
+        print(format_run_line(run))
+        if once or run.get('status') != 'running' or is_stale(run):
+            return 0
+        time.sleep(interval)
+        run = collection.find_one({'_id': run['_id']})
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Watch System B collector runs")
+    parser.add_argument("--run-id", help="Run to watch (default: latest run)")
+    parser.add_argument("--list", type=int, nargs="?", const=20, metavar="N",
+                        help="List the N most recent runs (default: 20)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Refresh interval in seconds")
+    parser.add_argument("--once", action="store_true", help="Print the current state once and exit")
+    args = parser.parse_args()
+
+    collection = get_db()[RUNS_COLLECTION]
+    try:
+        if args.list is not None:
+            list_runs(collection, args.list)
+            return 0
+        return watch(collection, args.run_id, args.interval, args.once)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        close_clients()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Shared MongoDB work queue with leases for multi-worker System B generation.
+
+One process enqueues sessions into a work collection; any number of worker
+processes (on any host) claim items with an atomic find-and-modify that sets
+a lease owner and expiry. Workers renew leases with heartbeats while an item
+is in flight. If a worker crashes, its lease expires and the item becomes
+claimable again, so no session is lost.
+
+Work item document:
+    {
+        _id: "<sessionId>:<messageIndex>",
+        sessionId, messageIndex,
+        payload: {...session_data...},
+        priority: float,            # estimated cost, highest claimed first
+        status: "pending" | "leased" | "done",
+        outcome: "stored" | "invalid" | "failed" | "storage_failed",
+        leaseOwner, leaseExpiresAt, attempts,
+        enqueuedAt, completedAt
+    }
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+
+# Seconds a claim stays valid without a heartbeat
+LEASE_SECONDS = 120
+
+# Seconds between lease renewals (must be well below LEASE_SECONDS)
+HEARTBEAT_SECONDS = 30
+
+# Items claimed this many times without completing are no longer handed out
+MAX_CLAIMS = 5
+
+
+def work_item_id(session_id: str, message_index: int) -> str:
+    return f"{session_id}:{message_index}"
+
+
+def ensure_work_indexes(collection) -> None:
+    """Create the indexes used by claim_next and queue_stats."""
+    collection.create_index([('status', 1), ('priority', -1)])
+    collection.create_index([('status', 1), ('leaseExpiresAt', 1)])
+
+
+def enqueue_sessions(collection, sessions_data: List[Dict[str, Any]], priorities: List[float],
+                     requeue: bool = False) -> int:
+    """
+    Add sessions to the work collection.
+
+    Items that already exist keep their status (so finished work is not redone)
+    unless requeue is True, in which case they are reset to pending.
+
+    Returns:
+        Number of items inserted or reset
+    """
+    now = datetime.utcnow()
+    from pymongo import UpdateOne
+
+    operations = []
+    for session_data, priority in zip(sessions_data, priorities):
+        fields = {
+            'sessionId': session_data['sessionId'],
+            'messageIndex': session_data['messageIndex'],
+            'payload': session_data,
+            'priority': priority,
+        }
+        base = {'attempts': 0, 'enqueuedAt': now, 'status': 'pending'}
+        if requeue:
+            update = {
+                '$set': {**fields, **base},
+                '$unset': {'leaseOwner': '', 'leaseExpiresAt': '', 'outcome': '', 'completedAt': ''},
+            }
+        else:
+            update = {'$setOnInsert': {**fields, **base}}
+        operations.append(UpdateOne(
+            {'_id': work_item_id(session_data['sessionId'], session_data['messageIndex'])},
+            update,
+            upsert=True
+        ))
+
+    if not operations:
+        return 0
+    result = collection.bulk_write(operations, ordered=False)
+    return result.upserted_count + (result.modified_count if requeue else 0)
+
+
+def claim_next(collection, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+    """
+    Atomically claim the highest-priority pending item, or an item whose
+    lease has expired (its worker crashed or stalled).
+
+    Returns:
+        The claimed work item document, or None if nothing is claimable
+    """
+    from pymongo import ReturnDocument
+
+    now = datetime.utcnow()
+    return collection.find_one_and_update(
+        {
+            '$or': [
+                {'status': 'pending'},
+                {'status': 'leased', 'leaseExpiresAt': {'$lt': now}},
+            ],
+            'attempts': {'$lt': MAX_CLAIMS},
+        },
+        {
+            '$set': {
+                'status': 'leased',
+                'leaseOwner': worker_id,
+                'leasedAt': now,
+                'leaseExpiresAt': now + timedelta(seconds=lease_seconds),
+            },
+            '$inc': {'attempts': 1},
+        },
+        sort=[('priority', -1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def renew_leases(collection, item_ids: List[str], worker_id: str,
+                 lease_seconds: int = LEASE_SECONDS) -> int:
+    """
+    Heartbeat: extend the leases this worker still owns.
+
+    Returns:
+        Number of leases renewed (fewer than requested means some were lost)
+    """
+    if not item_ids:
+        return 0
+    result = collection.update_many(
+        {'_id': {'$in': list(item_ids)}, 'status': 'leased', 'leaseOwner': worker_id},
+        {'$set': {'leaseExpiresAt': datetime.utcnow() + timedelta(seconds=lease_seconds)}}
+    )
+    return result.modified_count
+
+
+def complete_item(collection, item_id: str, worker_id: str, outcome: str) -> bool:
+    """
+    Mark a claimed item done. Only succeeds while this worker owns the lease.
+
+    Returns:
+        True if the item was marked done
+    """
+    result = collection.update_one(
+        {'_id': item_id, 'status': 'leased', 'leaseOwner': worker_id},
+        {
+            '$set': {'status': 'done', 'outcome': outcome, 'completedAt': datetime.utcnow()},
+            '$unset': {'leaseExpiresAt': ''},
+        }
+    )
+    return result.modified_count == 1
+
+
+def has_open_work(collection) -> bool:
+    """True while any item is pending or leased (possibly by another worker)."""
+    return collection.find_one(
+        {'status': {'$in': ['pending', 'leased']}, 'attempts': {'$lt': MAX_CLAIMS}},
+        {'_id': 1}
+    ) is not None
+
+
+def pending_count(collection) -> int:
+    """Items waiting to be claimed (uses the status index)."""
+    return collection.count_documents({'status': 'pending', 'attempts': {'$lt': MAX_CLAIMS}})
+
+
+def queue_stats(collection) -> Dict[str, int]:
+    """Count work items by status."""
+    pipeline = [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]
+    return {doc['_id']: doc['count'] for doc in collection.aggregate(pipeline)}
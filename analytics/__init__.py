@@ -0,0 +1,6 @@
+"""
+Offline analytics jobs over the sessions, systembresponses and evaluations
+collections. Run each job from the repository root, e.g.:
+
+    python -m analytics.topic_index
+"""
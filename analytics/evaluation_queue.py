@@ -0,0 +1,225 @@
+"""
+Precomputed per-evaluator evaluation work queue.
+
+The GET /api/evaluation handler loads every System B response and then looks
+up the session and existing evaluation for each candidate on every request.
+This job does that join once, in MongoDB, and writes the result into the
+evaluationqueue collection:
+
+- one entry per (evaluatorId, sessionId, messageIndex) still to be rated,
+  holding only keys: the pair, its rank and the system shown on the left.
+  The handler reads the texts by key, so the queue does not hold a copy of
+  every response per evaluator
+- pairs the evaluator has already rated (the unique sessionId / messageIndex /
+  evaluatorId index on evaluations) are removed
+- left/right is randomized once, deterministically per (evaluator, pair), so
+  re-running the job never flips a pair's sides
+- every evaluator the queue was built for gets a marker in
+  evaluationqueuestate, so the handler can tell "all evaluated" (queue built
+  and empty) from "no queue yet" (fall back to scanning systembresponses)
+
+Serving the next pair is then a single read on the (evaluatorId, rank) index:
+
+    db.evaluationqueue.find({evaluatorId}).sort({rank: 1}).limit(1)
+
+Evaluators are everyone with at least one evaluation plus any --evaluator
+given on the command line (for new evaluators).
+
+Usage (from the repository root):
+    python -m analytics.evaluation_queue
+    python -m analytics.evaluation_queue --evaluator someone@example.com --rebuild
+"""
+import argparse
+import hashlib
+import sys
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+
+from System_B_Response.clients import close_clients, get_db
+
+
+SESSIONS_COLLECTION = "sessions"
+SYSTEM_B_COLLECTION = "systembresponses"
+EVALUATIONS_COLLECTION = "evaluations"
+QUEUE_COLLECTION = "evaluationqueue"
+QUEUE_STATE_COLLECTION = "evaluationqueuestate"
+
+# Operations per bulk write
+BATCH_SIZE = 500
+
+
+def ensure_queue_indexes(collection) -> None:
+    collection.create_index([('evaluatorId', ASCENDING), ('rank', ASCENDING)])
+    collection.create_index([('sessionId', ASCENDING), ('messageIndex', ASCENDING)])
+
+
+def queue_entry_id(evaluator_id: str, session_id: str, message_index: int) -> str:
+    return f"{evaluator_id}|{session_id}:{message_index}"
+
+
+def left_system_for(evaluator_id: str, session_id: str, message_index: int) -> str:
+    """Deterministic fair coin per (evaluator, pair): the same inputs always give the same side."""
+    digest = hashlib.sha1(queue_entry_id(evaluator_id, session_id, message_index).encode('utf-8')).digest()
+    return "B" if digest[0] & 1 else "A"
+
+
+# ==============================
+# 🔗 Server-side join
+# ==============================
+def system_a_lookup(as_field: str = 'session') -> Dict[str, Any]:
+    """
+    $lookup stage adding {systemAResponse} from the session's assistant message
+    of the same turn: the messageIndex-th one, so turn 0 is the first.
+
+    Only that message's content is returned, not the whole conversation.
+    """
+    return {'$lookup': {
+        'from': SESSIONS_COLLECTION,
+        'localField': 'sessionId',
+        'foreignField': 'sessionId',
+        'let': {'messageIndex': {'$ifNull': ['$messageIndex', 0]}},
+        'as': as_field,
+        'pipeline': [
+            {'$project': {
+                '_id': 0,
+                'systemAResponse': {'$let': {
+                    'vars': {'turn': {'$arrayElemAt': [
+                        {'$filter': {'input': {'$ifNull': ['$messages', []]},
+                                     'as': 'm', 'cond': {'$eq': ['$$m.role', 'assistant']}}},
+                        '$$messageIndex'
+                    ]}},
+                    'in': '$$turn.content',
+                }},
+            }},
+            {'$limit': 1},
+        ],
+    }}
+
+
+def iter_pairs(db) -> Iterator[Dict[str, Any]]:
+    """
+    Keys of the System B responses whose session has an assistant message of
+    the same turn (System A), in (sessionId, messageIndex) order like the GET handler.
+    """
+    pipeline = [
+        {'$sort': {'sessionId': 1, 'messageIndex': 1}},
+        {'$project': {'_id': 0, 'sessionId': 1, 'messageIndex': 1, 'userMessage': 1,
+                      'codeContent': 1, 'codeLanguage': 1, 'assistantResponse': 1}},
+        system_a_lookup(),
+        {'$unwind': '$session'},
+        {'$match': {'session.systemAResponse': {'$nin': [None, '']}, 'assistantResponse': {'$nin': [None, '']}}},
+        {'$project': {'sessionId': 1, 'messageIndex': 1}},
+    ]
+    yield from db[SYSTEM_B_COLLECTION].aggregate(pipeline, allowDiskUse=True)
+
+
+def evaluated_pairs(db, evaluators: List[str]) -> Dict[str, Set[Tuple[str, int]]]:
+    """Pairs each evaluator has already rated (skipped ones included, as in the handler)."""
+    rated: Dict[str, Set[Tuple[str, int]]] = {evaluator: set() for evaluator in evaluators}
+    cursor = db[EVALUATIONS_COLLECTION].find(
+        {'evaluatorId': {'$in': evaluators}},
+        {'_id': 0, 'evaluatorId': 1, 'sessionId': 1, 'messageIndex': 1}
+    )
+    for doc in cursor:
+        rated[doc['evaluatorId']].add((doc['sessionId'], doc.get('messageIndex', 0)))
+    return rated
+
+
+def build_entry(evaluator_id: str, pair: Dict[str, Any], rank: int) -> Dict[str, Any]:
+    session_id, message_index = pair['sessionId'], pair.get('messageIndex', 0)
+    return {
+        'evaluatorId': evaluator_id,
+        'sessionId': session_id,
+        'messageIndex': message_index,
+        'rank': rank,
+        'leftSystem': left_system_for(evaluator_id, session_id, message_index),
+    }
+
+
+# ==============================
+# 🔄 Queue refresh
+# ==============================
+def refresh_queue(db, evaluators: Optional[List[str]] = None, rebuild: bool = False) -> Dict[str, int]:
+    """
+    Bring evaluationqueue in line with systembresponses and evaluations.
+
+    Returns:
+        Counts: evaluators, pairs, pending, removed
+    """
+    queue = db[QUEUE_COLLECTION]
+    state = db[QUEUE_STATE_COLLECTION]
+    ensure_queue_indexes(queue)
+    if rebuild:
+        queue.delete_many({})
+        state.delete_many({})
+
+    known = db[EVALUATIONS_COLLECTION].distinct('evaluatorId')
+    evaluators = sorted(set(known) | set(evaluators or []))
+    rated = evaluated_pairs(db, evaluators)
+    now = datetime.utcnow()
+    refresh_id = uuid.uuid4().hex
+
+    pairs = 0
+    pending = 0
+    operations = []
+
+    def flush():
+        if operations:
+            queue.bulk_write(operations, ordered=False)
+            operations.clear()
+
+    for rank, pair in enumerate(iter_pairs(db)):
+        pairs += 1
+        key = (pair['sessionId'], pair.get('messageIndex', 0))
+        for evaluator_id in evaluators:
+            if key in rated[evaluator_id]:
+                continue
+            pending += 1
+            operations.append(UpdateOne(
+                {'_id': queue_entry_id(evaluator_id, *key)},
+                {'$set': {**build_entry(evaluator_id, pair, rank), 'refreshId': refresh_id, 'updatedAt': now},
+                 '$setOnInsert': {'createdAt': now}},
+                upsert=True
+            ))
+            if len(operations) >= BATCH_SIZE:
+                flush()
+    flush()
+
+    # Anything not refreshed this run was rated since, or its System B response is gone
+    removed = queue.delete_many({'refreshId': {'$ne': refresh_id}}).deleted_count
+
+    # Mark the evaluators as queued only now that their entries are complete
+    if evaluators:
+        state.bulk_write([
+            UpdateOne({'_id': evaluator_id},
+                      {'$set': {'refreshId': refresh_id, 'refreshedAt': now}}, upsert=True)
+            for evaluator_id in evaluators
+        ], ordered=False)
+
+    return {'evaluators': len(evaluators), 'pairs': pairs, 'pending': pending, 'removed': removed}
+
+
+# ==============================
+# 🏁 Entry point
+# ==============================
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rebuild the per-evaluator pending-pairs queue")
+    parser.add_argument("--evaluator", action="append", default=[],
+                        help="Also queue pairs for this evaluator (repeatable)")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the queue before refreshing")
+    args = parser.parse_args()
+
+    try:
+        counts = refresh_queue(get_db(), args.evaluator, rebuild=args.rebuild)
+        print(f"✓ {counts['pending']} pending pairs for {counts['evaluators']} evaluators "
+              f"({counts['pairs']} A/B pairs, {counts['removed']} stale entries removed)")
+        return 0
+    finally:
+        close_clients()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
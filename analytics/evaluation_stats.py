@@ -0,0 +1,291 @@
+"""
+Materialized A/B evaluation statistics.
+
+Computes win / tie / both_bad rates, mean systemAScores / systemBScores and
+bootstrap confidence intervals, overall and per questionType and
+codeOutputPreference, and writes them into one small document in the
+evaluationstats collection, so the stats page reads a single document instead
+of rescanning evaluations on every view.
+
+The job is incremental: it keeps sufficient statistics (preference counts and
+1-5 score histograms per bucket) in the stats document and only reads
+evaluations created after the last processed one. Since preferences and
+scores are categorical, bootstrap resampling from these counts is exactly
+equivalent to resampling the raw evaluations, and is fully vectorized with
+NumPy multinomial draws.
+
+Usage (from the repository root):
+    python -m analytics.evaluation_stats            # incremental update
+    python -m analytics.evaluation_stats --rebuild  # recompute from scratch
+"""
+import argparse
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from System_B_Response.clients import close_clients, get_db
+
+
+EVALUATIONS_COLLECTION = "evaluations"
+SYSTEM_B_COLLECTION = "systembresponses"
+STATS_COLLECTION = "evaluationstats"
+STATS_ID = "summary"
+
+PREFERENCES = ["A", "B", "tie", "both_bad"]
+SCORE_VALUES = np.arange(1, 6)
+
+# Evaluations read per batch
+BATCH_SIZE = 5000
+
+# Bootstrap resamples and confidence level
+BOOTSTRAP_SAMPLES = 2000
+CONFIDENCE = 0.95
+
+
+# ==============================
+# 📥 Loading new evaluations
+# ==============================
+def new_evaluations_query(last_created_at: Optional[datetime], last_id) -> Dict[str, Any]:
+    """Evaluations after the (createdAt, _id) watermark, excluding skipped ones."""
+    query: Dict[str, Any] = {'skipped': {'$ne': True}}
+    if last_created_at is not None:
+        query['$or'] = [
+            {'createdAt': {'$gt': last_created_at}},
+            {'createdAt': last_created_at, '_id': {'$gt': last_id}},
+        ]
+    return query
+
+
+def load_batch_metadata(db, batch: List[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+    """questionType / codeOutputPreference for the batch's (sessionId, messageIndex) pairs."""
+    session_ids = list({doc['sessionId'] for doc in batch})
+    metadata = {}
+    cursor = db[SYSTEM_B_COLLECTION].find(
+        {'sessionId': {'$in': session_ids}},
+        {'sessionId': 1, 'messageIndex': 1, 'questionType': 1, 'codeOutputPreference': 1}
+    )
+    for doc in cursor:
+        metadata[(doc['sessionId'], doc.get('messageIndex', 0))] = doc
+    return metadata
+
+
+def batch_to_arrays(db, batch: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Columnar view of one batch of evaluations."""
+    metadata = load_batch_metadata(db, batch)
+    preference_codes = {name: code for code, name in enumerate(PREFERENCES)}
+
+    def score(doc, field):
+        value = (doc.get(field) or {}).get('overall')
+        return int(value) if value in (1, 2, 3, 4, 5) else 0
+
+    meta = [metadata.get((doc['sessionId'], doc.get('messageIndex', 0)), {}) for doc in batch]
+    return {
+        'preference': np.array([preference_codes.get(doc.get('preference'), -1) for doc in batch], dtype=np.int64),
+        'scoreA': np.array([score(doc, 'systemAScores') for doc in batch], dtype=np.int64),
+        'scoreB': np.array([score(doc, 'systemBScores') for doc in batch], dtype=np.int64),
+        'timeSpent': np.array([float(doc.get('timeSpent') or 0) for doc in batch]),
+        'questionType': np.array([m.get('questionType') or 'Unknown' for m in meta], dtype=object),
+        'codeOutputPreference': np.array([m.get('codeOutputPreference') or 'Unknown' for m in meta], dtype=object),
+    }
+
+
+# ==============================
+# ➕ Sufficient statistics
+# ==============================
+def empty_bucket() -> Dict[str, Any]:
+    return {
+        'n': 0,
+        'preferences': [0] * len(PREFERENCES),
+        'scoreHistA': [0] * len(SCORE_VALUES),
+        'scoreHistB': [0] * len(SCORE_VALUES),
+        'timeSpentSum': 0.0,
+    }
+
+
+def accumulate(state: Dict[str, Dict[str, Any]], arrays: Dict[str, np.ndarray]) -> None:
+    """Add one batch to the per-bucket counts (vectorized with bincount per bucket)."""
+    bucket_labels = [('overall', np.full(len(arrays['preference']), 'all', dtype=object))]
+    bucket_labels.append(('questionType', arrays['questionType']))
+    bucket_labels.append(('codeOutputPreference', arrays['codeOutputPreference']))
+
+    for dimension, labels in bucket_labels:
+        values, inverse = np.unique(labels.astype(str), return_inverse=True)
+        for code, value in enumerate(values):
+            mask = inverse == code
+            key = 'overall' if dimension == 'overall' else f"{dimension}:{value}"
+            bucket = state.setdefault(key, empty_bucket())
+
+            preferences = arrays['preference'][mask]
+            preferences = preferences[preferences >= 0]
+            scores_a = arrays['scoreA'][mask]
+            scores_b = arrays['scoreB'][mask]
+
+            bucket['n'] += int(mask.sum())
+            bucket['preferences'] = (np.asarray(bucket['preferences'])
+                                     + np.bincount(preferences, minlength=len(PREFERENCES))).tolist()
+            bucket['scoreHistA'] = (np.asarray(bucket['scoreHistA'])
+                                    + np.bincount(scores_a[scores_a > 0] - 1, minlength=len(SCORE_VALUES))).tolist()
+            bucket['scoreHistB'] = (np.asarray(bucket['scoreHistB'])
+                                    + np.bincount(scores_b[scores_b > 0] - 1, minlength=len(SCORE_VALUES))).tolist()
+            bucket['timeSpentSum'] += float(arrays['timeSpent'][mask].sum())
+
+
+# ==============================
+# 📈 Statistics with bootstrap CIs
+# ==============================
+def _interval(samples: np.ndarray) -> List[float]:
+    alpha = (1 - CONFIDENCE) / 2
+    low, high = np.quantile(samples, [alpha, 1 - alpha], axis=0)
+    return np.round(np.stack([low, high], axis=-1), 4).tolist()
+
+
+def summarize_bucket(bucket: Dict[str, Any], rng: np.random.Generator) -> Dict[str, Any]:
+    """Rates, mean scores and bootstrap confidence intervals for one bucket."""
+    counts = np.asarray(bucket['preferences'], dtype=np.int64)
+    hist_a = np.asarray(bucket['scoreHistA'], dtype=np.int64)
+    hist_b = np.asarray(bucket['scoreHistB'], dtype=np.int64)
+    n_pref, n_a, n_b = counts.sum(), hist_a.sum(), hist_b.sum()
+
+    summary: Dict[str, Any] = {
+        'totalEvaluations': bucket['n'],
+        'systemAWins': int(counts[0]),
+        'systemBWins': int(counts[1]),
+        'ties': int(counts[2]),
+        'bothBad': int(counts[3]),
+        'averageTimeSpent': round(bucket['timeSpentSum'] / bucket['n']) if bucket['n'] else 0,
+    }
+
+    if n_pref:
+        rates = counts / n_pref
+        draws = rng.multinomial(n_pref, rates, size=BOOTSTRAP_SAMPLES) / n_pref
+        intervals = _interval(draws)
+        # Difference in win rates (B - A): positive means System B is preferred
+        diff = draws[:, 1] - draws[:, 0]
+        summary['rates'] = {name: round(float(rate), 4) for name, rate in zip(PREFERENCES, rates)}
+        summary['rateCI'] = {name: interval for name, interval in zip(PREFERENCES, intervals)}
+        summary['winRateDiffBA'] = round(float(rates[1] - rates[0]), 4)
+        summary['winRateDiffBACI'] = _interval(diff)
+        # Same shape as the /api/evaluation/stats response the stats page renders
+        summary['winRate'] = {'systemA': f"{rates[0] * 100:.1f}", 'systemB': f"{rates[1] * 100:.1f}"}
+
+    for label, hist, n in (('systemA', hist_a, n_a), ('systemB', hist_b, n_b)):
+        if not n:
+            continue
+        probabilities = hist / n
+        means = rng.multinomial(n, probabilities, size=BOOTSTRAP_SAMPLES) @ SCORE_VALUES / n
+        summary[f'{label}AvgScore'] = round(float(probabilities @ SCORE_VALUES), 4)
+        summary[f'{label}AvgScoreCI'] = _interval(means)
+        summary[f'{label}AvgScores'] = {'overall': f"{probabilities @ SCORE_VALUES:.2f}"}
+
+    return summary
+
+
+def build_stats_document(state: Dict[str, Dict[str, Any]], seed: int = 0) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    document: Dict[str, Any] = {
+        'overall': summarize_bucket(state['overall'], rng) if 'overall' in state else None,
+        'byQuestionType': {},
+        'byCodeOutputPreference': {},
+    }
+    for key in sorted(state):
+        if ':' not in key:
+            continue
+        dimension, value = key.split(':', 1)
+        target = 'byQuestionType' if dimension == 'questionType' else 'byCodeOutputPreference'
+        document[target][value] = summarize_bucket(state[key], rng)
+    return document
+
+
+# ==============================
+# 🔄 Incremental update
+# ==============================
+def update_stats(db, rebuild: bool = False) -> int:
+    """
+    Fold evaluations newer than the last run into the materialized stats.
+
+    Returns:
+        Number of new evaluations processed
+    """
+    stats_collection = db[STATS_COLLECTION]
+    previous = None if rebuild else stats_collection.find_one({'_id': STATS_ID})
+    state = (previous or {}).get('state', {})
+    last_created_at = (previous or {}).get('lastCreatedAt')
+    last_id = (previous or {}).get('lastId')
+
+    cursor = db[EVALUATIONS_COLLECTION].find(
+        new_evaluations_query(last_created_at, last_id),
+        {'sessionId': 1, 'messageIndex': 1, 'preference': 1, 'systemAScores': 1,
+         'systemBScores': 1, 'timeSpent': 1, 'createdAt': 1},
+        batch_size=BATCH_SIZE
+    ).sort([('createdAt', 1), ('_id', 1)])
+
+    processed = 0
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            accumulate(state, batch_to_arrays(db, batch))
+            processed += len(batch)
+            last_created_at, last_id = batch[-1].get('createdAt'), batch[-1]['_id']
+            batch = []
+    if batch:
+        accumulate(state, batch_to_arrays(db, batch))
+        processed += len(batch)
+        last_created_at, last_id = batch[-1].get('createdAt'), batch[-1]['_id']
+
+    if processed == 0 and previous is not None:
+        return 0
+
+    stats_collection.replace_one(
+        {'_id': STATS_ID},
+        {
+            **build_stats_document(state),
+            'state': state,
+            'lastCreatedAt': last_created_at,
+            'lastId': last_id,
+            'updatedAt': datetime.utcnow(),
+        },
+        upsert=True
+    )
+    return processed
+
+
+def print_summary(name: str, summary: Optional[Dict[str, Any]]) -> None:
+    if not summary or 'rates' not in summary:
+        return
+    rates, ci = summary['rates'], summary['rateCI']
+    print(f"  {name[:24]:<24} n={summary['totalEvaluations']:<6} "
+          f"A {rates['A']:.1%} [{ci['A'][0]:.1%}, {ci['A'][1]:.1%}] | "
+          f"B {rates['B']:.1%} [{ci['B'][0]:.1%}, {ci['B'][1]:.1%}] | "
+          f"tie {rates['tie']:.1%} | both_bad {rates['both_bad']:.1%} | "
+          f"avg A {summary.get('systemAAvgScore', 0):.2f} B {summary.get('systemBAvgScore', 0):.2f}")
+
+
+# ==============================
+# 🏁 Entry point
+# ==============================
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Update the materialized A/B evaluation statistics")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute from all evaluations")
+    args = parser.parse_args()
+
+    db = get_db()
+    try:
+        processed = update_stats(db, rebuild=args.rebuild)
+        print(f"✓ Processed {processed} new evaluations into '{STATS_COLLECTION}'")
+
+        stats = db[STATS_COLLECTION].find_one({'_id': STATS_ID}) or {}
+        print_summary("Overall", stats.get('overall'))
+        for value, summary in (stats.get('byQuestionType') or {}).items():
+            print_summary(value, summary)
+        for value, summary in (stats.get('byCodeOutputPreference') or {}).items():
+            print_summary(value, summary)
+        return 0
+    finally:
+        close_clients()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Export joined System A / System B pairs to Parquet for offline comparison.
+
+The join happens entirely inside one MongoDB aggregation on
+(sessionId, messageIndex):
+
+    systembresponses
+      -> $lookup sessions     (assistant message of the same turn = System A response)
+      -> $lookup evaluations  ($group'd server-side into per-pair aggregates)
+
+and the cursor is streamed straight into a Parquet file in row groups of
+BATCH_ROWS, so neither collection is ever loaded in full and no join happens
+in Python. The result replaces eyeballing system_B_responses_COT.xlsx
+against data.xlsx.
+
+Requires pyarrow (pip install pyarrow).
+
+Usage (from the repository root):
+    python -m analytics.export_pairs
+    python -m analytics.export_pairs --output data/pairs_fix.parquet --question-type HelpFixCode
+    python -m analytics.export_pairs --evaluated-only
+"""
+import argparse
+import os
+import sys
+from typing import Any, Dict, Iterator, List, Optional
+
+from analytics.evaluation_queue import (
+    EVALUATIONS_COLLECTION,
+    SYSTEM_B_COLLECTION,
+    system_a_lookup,
+)
+from System_B_Response.clients import close_clients, get_db
+from System_B_Response.memprofile import MEMORY, memory_stage
+from System_B_Response.profiling import PROFILER, stage
+from System_B_Response.settings import data_path
+
+
+DEFAULT_OUTPUT = data_path("system_ab_pairs.parquet")
+
+# Rows per Parquet row group (and per cursor batch)
+BATCH_ROWS = 5000
+
+# (column, pyarrow type name) in file order
+COLUMNS = [
+    ('sessionId', 'string'),
+    ('messageIndex', 'int64'),
+    ('questionType', 'string'),
+    ('codeOutputPreference', 'string'),
+    ('codeLanguage', 'string'),
+    ('userMessage', 'string'),
+    ('codeContent', 'string'),
+    ('systemAResponse', 'string'),
+    ('systemBResponse', 'string'),
+    ('probableQuestionType', 'string'),
+    ('topics', 'list<string>'),
+    ('evaluations', 'int64'),
+    ('systemAWins', 'int64'),
+    ('systemBWins', 'int64'),
+    ('ties', 'int64'),
+    ('bothBad', 'int64'),
+    ('systemAAvgScore', 'float64'),
+    ('systemBAvgScore', 'float64'),
+    ('avgTimeSpent', 'float64'),
+    ('createdAt', 'timestamp'),
+]
+
+
+def _count_if(preference: str) -> Dict[str, Any]:
+    return {'$sum': {'$cond': [{'$eq': ['$preference', preference]}, 1, 0]}}
+
+
+def evaluation_lookup() -> Dict[str, Any]:
+    """$lookup stage adding per-pair evaluation aggregates (skipped evaluations excluded)."""
+    return {'$lookup': {
+        'from': EVALUATIONS_COLLECTION,
+        'localField': 'sessionId',
+        'foreignField': 'sessionId',
+        'let': {'messageIndex': '$messageIndex'},
+        'as': 'evaluation',
+        'pipeline': [
+            {'$match': {'$expr': {'$eq': ['$messageIndex', '$$messageIndex']}, 'skipped': {'$ne': True}}},
+            {'$group': {
+                '_id': None,
+                'evaluations': {'$sum': 1},
+                'systemAWins': _count_if('A'),
+                'systemBWins': _count_if('B'),
+                'ties': _count_if('tie'),
+                'bothBad': _count_if('both_bad'),
+                'systemAAvgScore': {'$avg': '$systemAScores.overall'},
+                'systemBAvgScore': {'$avg': '$systemBScores.overall'},
+                'avgTimeSpent': {'$avg': '$timeSpent'},
+            }},
+        ],
+    }}
+
+
+def build_pipeline(question_type: Optional[str] = None, evaluated_only: bool = False) -> List[Dict[str, Any]]:
+    match: Dict[str, Any] = {}
+    if question_type:
+        match['questionType'] = question_type
+
+    pipeline: List[Dict[str, Any]] = [
+        {'$match': match},
+        {'$sort': {'sessionId': 1, 'messageIndex': 1}},
+        system_a_lookup(),
+        evaluation_lookup(),
+    ]
+    if evaluated_only:
+        pipeline.append({'$match': {'evaluation.0': {'$exists': True}}})
+
+    evaluation = {'$arrayElemAt': ['$evaluation', 0]}
+    pipeline.append({'$project': {
+        '_id': 0,
+        'sessionId': 1,
+        'messageIndex': 1,
+        'questionType': 1,
+        'codeOutputPreference': 1,
+        'codeLanguage': 1,
+        'userMessage': 1,
+        'codeContent': 1,
+        'systemAResponse': {'$arrayElemAt': ['$session.systemAResponse', 0]},
+        'systemBResponse': '$assistantResponse',
+        'probableQuestionType': 1,
+        'topics': 1,
+        'evaluations': {'$ifNull': [{'$let': {'vars': {'e': evaluation}, 'in': '$$e.evaluations'}}, 0]},
+        'systemAWins': {'$let': {'vars': {'e': evaluation}, 'in': '$$e.systemAWins'}},
+        'systemBWins': {'$let': {'vars': {'e': evaluation}, 'in': '$$e.systemBWins'}},
+        'ties': {'$let': {'vars': {'e': evaluation}, 'in': '$$e.ties'}},
+        'bothBad': {'$let': {'vars': {'e': evaluation}, 'in': '$$e.bothBad'}},
+        'systemAAvgScore': {'$let': {'vars': {'e': evaluation}, 'in': '$$e.systemAAvgScore'}},
+        'systemBAvgScore': {'$let': {'vars': {'e': evaluation}, 'in': '$$e.systemBAvgScore'}},
+        'avgTimeSpent': {'$let': {'vars': {'e': evaluation}, 'in': '$$e.avgTimeSpent'}},
+        'createdAt': 1,
+    }})
+    return pipeline
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    types = {
+        'string': pa.string(),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'list<string>': pa.list_(pa.string()),
+        'timestamp': pa.timestamp('ms'),
+    }
+    return pa.schema([(name, types[type_name]) for name, type_name in COLUMNS])
+
+
+def iter_batches(cursor, size: int = BATCH_ROWS) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for row in cursor:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_pairs(db, output: str, question_type: Optional[str] = None,
+                 evaluated_only: bool = False, compression: str = 'zstd') -> int:
+    """
+    Stream the joined pairs into a Parquet file.
+
+    Returns:
+        Number of rows written
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+
+    schema = arrow_schema()
+    cursor = db[SYSTEM_B_COLLECTION].aggregate(
+        build_pipeline(question_type, evaluated_only), allowDiskUse=True, batchSize=BATCH_ROWS
+    )
+
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    rows = 0
+    batches = iter_batches(cursor)
+    with pq.ParquetWriter(output, schema, compression=compression) as writer:
+        while True:
+            # Time spent waiting on the server-side join vs. encoding Parquet
+            with stage("aggregate_batch"):
+                batch = next(batches, None)
+            if batch is None:
+                break
+            with stage("parquet_write"):
+                columns = {name: [row.get(name) for row in batch] for name in schema.names}
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            rows += len(batch)
+        if rows == 0:
+            writer.write_table(schema.empty_table())
+    return rows
+
+
+# ==============================
+# 🏁 Entry point
+# ==============================
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export joined System A / System B pairs to Parquet")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"Parquet file (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--question-type", help="Only export this questionType")
+    parser.add_argument("--evaluated-only", action="store_true", help="Only pairs with at least one evaluation")
+    parser.add_argument("--memprofile", action="store_true", help="Report peak RSS and top allocators of the export")
+    parser.add_argument("--memory-budget", type=float, metavar="MB", help="Fail if the export exceeds MB")
+    args = parser.parse_args()
+    MEMORY.configure(enabled=args.memprofile, budget_mb=args.memory_budget)
+
+    try:
+        with memory_stage("export"):
+            rows = export_pairs(get_db(), args.output, args.question_type, args.evaluated_only)
+    except RuntimeError as e:  # includes MemoryBudgetExceeded
+        print(f"❌ {e}")
+        return 1
+    finally:
+        close_clients()
+
+    print(f"✓ Exported {rows} pairs to {args.output}")
+    json_path, prom_path = PROFILER.write_reports(os.path.splitext(args.output)[0])
+    print(f"  Stage timings: {json_path} | {prom_path}")
+    for line in MEMORY.lines():
+        print(f"  {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
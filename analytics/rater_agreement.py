@@ -0,0 +1,429 @@
+"""
+Inter-rater agreement, left/right position bias and timeSpent outliers.
+
+Evaluations are loaded once into columnar NumPy arrays (one integer code per
+item, evaluator and category) and every statistic is computed with
+bincount / matrix products over those arrays, so the analysis stays fast at
+hundreds of thousands of evaluations:
+
+- Krippendorff's alpha over all evaluators, for the preference (nominal) and
+  the System A / System B overall scores (ordinal and interval)
+- Cohen's kappa on the preference for every pair of evaluators who rated at
+  least MIN_OVERLAP of the same items
+- Position bias: how often the left-hand response wins among decisive
+  (A or B) preferences, overall and per evaluator, separated from the
+  System A vs System B effect using the randomized leftSystem
+- timeSpent outliers by robust (median / MAD) z-scores on log time, both
+  globally and within each evaluator
+
+Usage (from the repository root):
+    python -m analytics.rater_agreement
+    python -m analytics.rater_agreement --save   # also store in evaluationstats
+"""
+import argparse
+import math
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from analytics.evaluation_stats import (
+    EVALUATIONS_COLLECTION,
+    PREFERENCES,
+    STATS_COLLECTION,
+)
+from System_B_Response.clients import close_clients, get_db
+
+
+AGREEMENT_ID = "agreement"
+
+# Minimum shared items for a pair of evaluators to get a Cohen's kappa
+MIN_OVERLAP = 10
+
+# Robust z-score above which a timeSpent is an outlier (Iglewicz & Hoaglin)
+OUTLIER_Z = 3.5
+
+# Minimum decisive evaluations before an evaluator's position bias is reported
+MIN_DECISIVE = 20
+
+# Evaluations fetched per cursor batch
+BATCH_SIZE = 10000
+
+_MAD_SCALE = 0.6745
+
+
+# ==============================
+# 📥 Columnar loading
+# ==============================
+def load_columns(db) -> Dict[str, np.ndarray]:
+    """Load non-skipped evaluations as integer-coded NumPy columns."""
+    sessions, indexes, evaluators, preferences = [], [], [], []
+    left_systems, scores_a, scores_b, times = [], [], [], []
+    preference_codes = {name: code for code, name in enumerate(PREFERENCES)}
+
+    cursor = db[EVALUATIONS_COLLECTION].find(
+        {'skipped': {'$ne': True}},
+        {'_id': 0, 'sessionId': 1, 'messageIndex': 1, 'evaluatorId': 1, 'preference': 1,
+         'leftSystem': 1, 'systemAScores.overall': 1, 'systemBScores.overall': 1, 'timeSpent': 1},
+        batch_size=BATCH_SIZE
+    )
+    for doc in cursor:
+        sessions.append(doc.get('sessionId'))
+        indexes.append(doc.get('messageIndex', 0))
+        evaluators.append(doc.get('evaluatorId'))
+        preferences.append(preference_codes.get(doc.get('preference'), -1))
+        left_systems.append(1 if doc.get('leftSystem') == 'B' else 0)
+        scores_a.append((doc.get('systemAScores') or {}).get('overall') or 0)
+        scores_b.append((doc.get('systemBScores') or {}).get('overall') or 0)
+        times.append(doc.get('timeSpent') or 0)
+
+    item_keys = np.array([f"{s}:{i}" for s, i in zip(sessions, indexes)], dtype=str)
+    items, item_codes = np.unique(item_keys, return_inverse=True)
+    evaluator_names, evaluator_codes = np.unique(np.array(evaluators, dtype=str), return_inverse=True)
+
+    return {
+        'item': np.asarray(item_codes, dtype=np.int64),
+        'evaluator': np.asarray(evaluator_codes, dtype=np.int64),
+        'evaluatorNames': evaluator_names,
+        'preference': np.array(preferences, dtype=np.int64),
+        'leftIsB': np.array(left_systems, dtype=np.int64),
+        'scoreA': np.array(scores_a, dtype=np.int64),
+        'scoreB': np.array(scores_b, dtype=np.int64),
+        'timeSpent': np.array(times, dtype=float),
+        'itemCount': len(items),
+    }
+
+
+# ==============================
+# 🤝 Krippendorff's alpha
+# ==============================
+def _distance_matrix(category_totals: np.ndarray, level: str) -> np.ndarray:
+    """Squared difference function delta^2 for nominal, ordinal or interval data."""
+    k = len(category_totals)
+    values = np.arange(k, dtype=float)
+    if level == 'nominal':
+        return 1.0 - np.eye(k)
+    if level == 'interval':
+        return (values[:, None] - values[None, :]) ** 2
+    if level == 'ordinal':
+        cumulative = np.concatenate([[0.0], np.cumsum(category_totals)])
+        low = np.minimum.outer(np.arange(k), np.arange(k))
+        high = np.maximum.outer(np.arange(k), np.arange(k))
+        between = cumulative[high + 1] - cumulative[low]
+        return (between - (category_totals[:, None] + category_totals[None, :]) / 2) ** 2
+    raise ValueError(f"Unknown measurement level: {level}")
+
+
+def krippendorff_alpha(item: np.ndarray, value: np.ndarray, categories: int,
+                       level: str = 'nominal') -> Optional[float]:
+    """
+    Krippendorff's alpha from (item, value) pairs.
+
+    value holds category codes 0..categories-1; negative codes are missing.
+    Uses the coincidence-matrix formulation, built with a single bincount
+    and one matrix product over the items x categories count matrix.
+    """
+    mask = value >= 0
+    item, value = item[mask], value[mask]
+    if len(item) == 0:
+        return None
+
+    _, item = np.unique(item, return_inverse=True)
+    counts = np.bincount(item * categories + value,
+                         minlength=(item.max() + 1) * categories).reshape(-1, categories).astype(float)
+    pairable = counts.sum(axis=1)
+    counts = counts[pairable >= 2]
+    pairable = pairable[pairable >= 2]
+    if len(counts) == 0:
+        return None
+
+    weighted = counts / (pairable - 1)[:, None]
+    coincidence = weighted.T @ counts - np.diag(weighted.sum(axis=0))
+    totals = coincidence.sum(axis=1)
+    n = totals.sum()
+    if n <= 1:
+        return None
+
+    delta = _distance_matrix(totals, level)
+    observed = (coincidence * delta).sum() / n
+    expected = (np.outer(totals, totals) * delta).sum() / (n * (n - 1))
+    if expected == 0:
+        return None
+    return float(1 - observed / expected)
+
+
+# ==============================
+# 👥 Pairwise Cohen's kappa
+# ==============================
+def rating_pairs(item: np.ndarray, evaluator: np.ndarray, value: np.ndarray):
+    """
+    All unordered pairs of ratings given to the same item, vectorized.
+
+    Ratings are sorted by item; pairs (i, i + d) for each offset d up to the
+    largest group size are kept when both fall in the same item.
+    """
+    mask = value >= 0
+    item, evaluator, value = item[mask], evaluator[mask], value[mask]
+    order = np.argsort(item, kind='stable')
+    item, evaluator, value = item[order], evaluator[order], value[order]
+
+    group_sizes = np.bincount(item) if len(item) else np.array([0])
+    left, right = [], []
+    for offset in range(1, int(group_sizes.max())):
+        same = item[:-offset] == item[offset:]
+        index = np.nonzero(same)[0]
+        left.append(index)
+        right.append(index + offset)
+    if not left:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty, empty
+    left, right = np.concatenate(left), np.concatenate(right)
+
+    # Order each pair by evaluator code so (x, y) and (y, x) share one key
+    swap = evaluator[left] > evaluator[right]
+    first = np.where(swap, right, left)
+    second = np.where(swap, left, right)
+    return evaluator[first], evaluator[second], value[first], value[second]
+
+
+def pairwise_cohen_kappa(item: np.ndarray, evaluator: np.ndarray, value: np.ndarray,
+                         categories: int, min_overlap: int = MIN_OVERLAP) -> List[Dict[str, Any]]:
+    """Cohen's kappa for every evaluator pair with at least min_overlap shared items."""
+    rater_x, rater_y, value_x, value_y = rating_pairs(item, evaluator, value)
+    if len(rater_x) == 0:
+        return []
+
+    pair_keys, pair_codes = np.unique(np.stack([rater_x, rater_y], axis=1), axis=0, return_inverse=True)
+    pair_codes = pair_codes.ravel()
+    cells = categories * categories
+    confusion = np.bincount(pair_codes * cells + value_x * categories + value_y,
+                            minlength=len(pair_keys) * cells).reshape(-1, categories, categories).astype(float)
+
+    n = confusion.sum(axis=(1, 2))
+    observed = np.trace(confusion, axis1=1, axis2=2) / n
+    expected = np.einsum('pi,pi->p', confusion.sum(axis=2), confusion.sum(axis=1)) / n ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kappa = np.where(expected < 1, (observed - expected) / (1 - expected), np.nan)
+
+    results = []
+    for index in np.nonzero(n >= min_overlap)[0]:
+        results.append({
+            'evaluators': [int(pair_keys[index][0]), int(pair_keys[index][1])],
+            'sharedItems': int(n[index]),
+            'agreement': round(float(observed[index]), 4),
+            'kappa': None if np.isnan(kappa[index]) else round(float(kappa[index]), 4),
+        })
+    return results
+
+
+# ==============================
+# ↔️ Position bias
+# ==============================
+def _proportion(successes: float, total: float) -> Dict[str, Any]:
+    """Proportion with a normal-approximation 95% CI and z-score against 0.5."""
+    if total == 0:
+        return {'rate': None, 'n': 0}
+    rate = successes / total
+    se = math.sqrt(rate * (1 - rate) / total) if 0 < rate < 1 else 0.0
+    return {
+        'rate': round(rate, 4),
+        'n': int(total),
+        'ci': [round(rate - 1.96 * se, 4), round(rate + 1.96 * se, 4)],
+        'z': round((rate - 0.5) / math.sqrt(0.25 / total), 2),
+    }
+
+
+def position_bias(columns: Dict[str, np.ndarray], min_decisive: int = MIN_DECISIVE) -> Dict[str, Any]:
+    """
+    How often the left-hand response wins among decisive preferences.
+
+    Because leftSystem is randomized, P(left wins) - 0.5 is the position
+    effect. The system effect is estimated separately as half the sum and the
+    position effect as half the difference of P(B wins | B on left) and
+    P(B wins | B on right).
+    """
+    preference, left_is_b, evaluator = columns['preference'], columns['leftIsB'], columns['evaluator']
+    decisive = (preference == 0) | (preference == 1)
+    picked_b = (preference == 1)[decisive].astype(np.int64)
+    left_is_b = left_is_b[decisive]
+    picked_left = (picked_b == left_is_b).astype(np.int64)
+    evaluator = evaluator[decisive]
+
+    b_left_n, b_left_wins = int(left_is_b.sum()), int(picked_b[left_is_b == 1].sum())
+    b_right_n, b_right_wins = int((1 - left_is_b).sum()), int(picked_b[left_is_b == 0].sum())
+    p_b_left = b_left_wins / b_left_n if b_left_n else float('nan')
+    p_b_right = b_right_wins / b_right_n if b_right_n else float('nan')
+
+    report: Dict[str, Any] = {
+        'leftWins': _proportion(picked_left.sum(), len(picked_left)),
+        'systemBWinsWhenLeft': round(p_b_left, 4) if b_left_n else None,
+        'systemBWinsWhenRight': round(p_b_right, 4) if b_right_n else None,
+        'positionEffect': round((p_b_left - p_b_right) / 2, 4) if b_left_n and b_right_n else None,
+        'systemEffect': round((p_b_left + p_b_right) / 2 - 0.5, 4) if b_left_n and b_right_n else None,
+        'byEvaluator': [],
+    }
+
+    evaluator_count = len(columns['evaluatorNames'])
+    totals = np.bincount(evaluator, minlength=evaluator_count)
+    left_wins = np.bincount(evaluator, weights=picked_left, minlength=evaluator_count)
+    for code in np.nonzero(totals >= min_decisive)[0]:
+        entry = _proportion(float(left_wins[code]), float(totals[code]))
+        entry['evaluator'] = str(columns['evaluatorNames'][code])
+        report['byEvaluator'].append(entry)
+    report['byEvaluator'].sort(key=lambda entry: -abs(entry['z']))
+    return report
+
+
+# ==============================
+# ⏱️ timeSpent outliers
+# ==============================
+def _group_median(groups: np.ndarray, values: np.ndarray, group_count: int) -> np.ndarray:
+    """Median of values within each group using one lexsort (no Python loop over groups)."""
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    safe = np.maximum(counts, 1)
+    low = np.minimum(starts + (safe - 1) // 2, len(values) - 1)
+    high = np.minimum(starts + safe // 2, len(values) - 1)
+    medians = (sorted_values[low] + sorted_values[high]) / 2 if len(values) else np.zeros(group_count)
+    return np.where(counts > 0, medians, np.nan)
+
+
+def robust_z(values: np.ndarray, groups: Optional[np.ndarray] = None, group_count: int = 1) -> np.ndarray:
+    """Modified z-score 0.6745 * (x - median) / MAD, optionally within groups."""
+    if groups is None:
+        groups = np.zeros(len(values), dtype=np.int64)
+    medians = _group_median(groups, values, group_count)
+    deviation = np.abs(values - medians[groups])
+    mad = _group_median(groups, deviation, group_count)[groups]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(mad > 0, _MAD_SCALE * (values - medians[groups]) / mad, 0.0)
+
+
+def time_outliers(columns: Dict[str, np.ndarray], threshold: float = OUTLIER_Z) -> Dict[str, Any]:
+    """Flag evaluations whose (log) timeSpent is extreme globally or for their evaluator."""
+    times = columns['timeSpent']
+    if len(times) == 0:
+        return {'n': 0}
+    log_times = np.log1p(np.maximum(times, 0))
+    evaluator_count = len(columns['evaluatorNames'])
+
+    global_z = robust_z(log_times)
+    evaluator_z = robust_z(log_times, columns['evaluator'], evaluator_count)
+    too_fast = (global_z < -threshold) | (evaluator_z < -threshold)
+    too_slow = (global_z > threshold) | (evaluator_z > threshold)
+
+    fast_share = np.bincount(columns['evaluator'], weights=too_fast, minlength=evaluator_count) \
+        / np.maximum(np.bincount(columns['evaluator'], minlength=evaluator_count), 1)
+    worst = np.argsort(-fast_share)[:10]
+
+    return {
+        'n': int(len(times)),
+        'medianSeconds': float(np.median(times)),
+        'tooFast': int(too_fast.sum()),
+        'tooSlow': int(too_slow.sum()),
+        'fastShareByEvaluator': [
+            {'evaluator': str(columns['evaluatorNames'][code]), 'fastShare': round(float(fast_share[code]), 4)}
+            for code in worst if fast_share[code] > 0
+        ],
+    }
+
+
+# ==============================
+# 📊 Report
+# ==============================
+def build_report(columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    item, evaluator = columns['item'], columns['evaluator']
+    score_a, score_b = columns['scoreA'] - 1, columns['scoreB'] - 1
+    names = columns['evaluatorNames']
+
+    kappas = pairwise_cohen_kappa(item, evaluator, columns['preference'], len(PREFERENCES))
+    for entry in kappas:
+        entry['evaluators'] = [str(names[code]) for code in entry['evaluators']]
+    valid = [entry for entry in kappas if entry['kappa'] is not None]
+    weights = np.array([entry['sharedItems'] for entry in valid], dtype=float)
+    values = np.array([entry['kappa'] for entry in valid], dtype=float)
+
+    return {
+        'evaluations': int(len(item)),
+        'items': int(columns['itemCount']),
+        'evaluators': int(len(names)),
+        'krippendorffAlpha': {
+            'preference': krippendorff_alpha(item, columns['preference'], len(PREFERENCES), 'nominal'),
+            'systemAScoreOrdinal': krippendorff_alpha(item, score_a, 5, 'ordinal'),
+            'systemBScoreOrdinal': krippendorff_alpha(item, score_b, 5, 'ordinal'),
+            'systemAScoreInterval': krippendorff_alpha(item, score_a, 5, 'interval'),
+            'systemBScoreInterval': krippendorff_alpha(item, score_b, 5, 'interval'),
+        },
+        'cohenKappa': {
+            'pairs': kappas,
+            'weightedMean': round(float(np.average(values, weights=weights)), 4) if len(valid) else None,
+        },
+        'positionBias': position_bias(columns),
+        'timeSpent': time_outliers(columns),
+    }
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.3f}"
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nEvaluations: {report['evaluations']}  Items: {report['items']}  "
+          f"Evaluators: {report['evaluators']}")
+
+    print("\nKrippendorff's alpha")
+    for name, value in report['krippendorffAlpha'].items():
+        print(f"  {name:<22} {_fmt(value)}")
+
+    kappa = report['cohenKappa']
+    print(f"\nCohen's kappa (preference): {len(kappa['pairs'])} evaluator pairs with "
+          f">= {MIN_OVERLAP} shared items, weighted mean {_fmt(kappa['weightedMean'])}")
+
+    bias = report['positionBias']
+    left = bias['leftWins']
+    if left.get('n'):
+        print(f"\nPosition bias: left wins {left['rate']:.1%} of {left['n']} decisive preferences "
+              f"(95% CI {left['ci'][0]:.1%}-{left['ci'][1]:.1%}, z={left['z']})")
+        print(f"  position effect {_fmt(bias['positionEffect'])}  system B effect {_fmt(bias['systemEffect'])}")
+        for entry in bias['byEvaluator'][:5]:
+            if abs(entry['z']) >= 3:
+                print(f"  ⚠️  {entry['evaluator']}: left wins {entry['rate']:.1%} of {entry['n']} (z={entry['z']})")
+
+    times = report['timeSpent']
+    if times.get('n'):
+        print(f"\ntimeSpent: median {times['medianSeconds']:.0f}s, {times['tooFast']} too fast, "
+              f"{times['tooSlow']} too slow (|robust z| > {OUTLIER_Z})")
+        for entry in times['fastShareByEvaluator'][:5]:
+            print(f"  {entry['evaluator']}: {entry['fastShare']:.1%} of evaluations too fast")
+
+
+# ==============================
+# 🏁 Entry point
+# ==============================
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inter-rater agreement and position-bias analysis")
+    parser.add_argument("--save", action="store_true",
+                        help=f"Store the report in '{STATS_COLLECTION}' (_id '{AGREEMENT_ID}')")
+    args = parser.parse_args()
+
+    db = get_db()
+    try:
+        report = build_report(load_columns(db))
+        print_report(report)
+        if args.save:
+            db[STATS_COLLECTION].replace_one(
+                {'_id': AGREEMENT_ID},
+                {**report, 'updatedAt': datetime.utcnow()},
+                upsert=True
+            )
+            print(f"\n✓ Saved to '{STATS_COLLECTION}'")
+        return 0
+    finally:
+        close_clients()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
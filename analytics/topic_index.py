@@ -0,0 +1,398 @@
+"""
+Topic and question-type inverted index for System A and System B responses.
+
+Every response ends with "Topics covered: ...;" and "Probable Question Type: ...".
+This job parses them once and maintains, in MongoDB:
+
+- topicindex:          one entry per (topic, system, sessionId, messageIndex),
+                       denormalized with the declared and probable question types.
+                       For System A, turn k is the k-th user message and the
+                       k-th assistant message of the session, as for System B
+- questiontypepairs:   one entry per (system, sessionId, messageIndex) with the
+                       declared vs probable question type and its topics
+- questiontypematrix:  counts per (system, declared, probable), rebuilt from
+                       questiontypepairs after each run
+
+The index is maintained incrementally: only sessions / System B documents whose
+updatedAt is at or after the last run's watermark are re-indexed (re-indexing is
+idempotent, so documents sharing the watermark timestamp are simply redone).
+Deletions leave no updatedAt behind, so every run also removes the entries of
+turns that no longer exist (deleted sessions or System B documents, sessions
+that lost turns) by comparing keys with the sources (see prune_removed).
+
+Usage (from the repository root):
+    python -m analytics.topic_index                   # incremental update
+    python -m analytics.topic_index --rebuild         # drop and rebuild
+    python -m analytics.topic_index --topic pointers --declared HelpFixCode --disagree
+"""
+import argparse
+import re
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, DeleteMany, InsertOne, ReplaceOne
+
+from System_B_Response.clients import close_clients, get_db
+from System_B_Response.response_parser import parse_response
+
+
+SESSIONS_COLLECTION = "sessions"
+SYSTEM_B_COLLECTION = "systembresponses"
+TOPIC_INDEX_COLLECTION = "topicindex"
+PAIRS_COLLECTION = "questiontypepairs"
+MATRIX_COLLECTION = "questiontypematrix"
+STATE_COLLECTION = "analyticsstate"
+STATE_ID = "topic_index"
+
+# Documents per bulk write
+BATCH_SIZE = 500
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = re.compile(r"^[\s.;:,*\-]+|[\s.;:,*\-]+$")
+
+
+def normalize_topic(topic: str) -> str:
+    """Lowercase, collapse whitespace and trim punctuation so variants share one key."""
+    return _EDGE_PUNCTUATION.sub("", _WHITESPACE.sub(" ", topic.lower()))
+
+
+def normalize_question_type(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    value = value.strip().strip("[]").strip()
+    return value or None
+
+
+# ==============================
+# 🗂️ Index setup
+# ==============================
+def ensure_indexes(db) -> None:
+    topic_index = db[TOPIC_INDEX_COLLECTION]
+    topic_index.create_index(
+        [('topic', ASCENDING), ('system', ASCENDING), ('sessionId', ASCENDING), ('messageIndex', ASCENDING)],
+        unique=True
+    )
+    topic_index.create_index(
+        [('topic', ASCENDING), ('system', ASCENDING), ('declared', ASCENDING), ('agree', ASCENDING)]
+    )
+    topic_index.create_index([('sessionId', ASCENDING), ('messageIndex', ASCENDING), ('system', ASCENDING)])
+
+    pairs = db[PAIRS_COLLECTION]
+    pairs.create_index([('system', ASCENDING), ('declared', ASCENDING), ('probable', ASCENDING)])
+    pairs.create_index([('sessionId', ASCENDING), ('messageIndex', ASCENDING)])
+
+
+# ==============================
+# 📥 Source readers
+# ==============================
+def iter_system_a(db, since: Optional[datetime]) -> Iterator[Tuple[Dict[str, Any], datetime]]:
+    """
+    Yield (entry, updatedAt) for every turn (the k-th user message with the
+    k-th assistant message, messageIndex k) of each session changed since the
+    watermark.
+    """
+    query = {'updatedAt': {'$gte': since}} if since else {}
+    projection = {'sessionId': 1, 'messages.role': 1, 'messages.content': 1,
+                  'messages.questionType': 1, 'messages.probableQuestionType': 1, 'updatedAt': 1}
+    for session in db[SESSIONS_COLLECTION].find(query, projection, batch_size=BATCH_SIZE):
+        messages = session.get('messages', [])
+        users = [m for m in messages if m.get('role') == 'user']
+        assistants = [m for m in messages if m.get('role') == 'assistant']
+        for message_index, (user, assistant) in enumerate(zip(users, assistants)):
+            if not assistant.get('content'):
+                continue
+            parsed = parse_response(assistant['content'])
+            yield {
+                'sessionId': session.get('sessionId', str(session['_id'])),
+                'messageIndex': message_index,
+                'system': 'A',
+                'declared': user.get('questionType', 'GeneralQuestion'),
+                'probable': assistant.get('probableQuestionType') or parsed['probableQuestionType'],
+                'topics': parsed['topics'],
+            }, session.get('updatedAt')
+
+
+def iter_system_b(db, since: Optional[datetime]) -> Iterator[Tuple[Dict[str, Any], datetime]]:
+    """
+    Yield (entry, updatedAt) for System B documents changed since the watermark.
+    Uses the fields parsed at write time when present.
+    """
+    query = {'updatedAt': {'$gte': since}} if since else {}
+    projection = {'sessionId': 1, 'messageIndex': 1, 'questionType': 1, 'assistantResponse': 1,
+                  'topics': 1, 'probableQuestionType': 1, 'updatedAt': 1}
+    for doc in db[SYSTEM_B_COLLECTION].find(query, projection, batch_size=BATCH_SIZE):
+        topics = doc.get('topics')
+        probable = doc.get('probableQuestionType')
+        if topics is None:
+            parsed = parse_response(doc.get('assistantResponse') or '')
+            topics = parsed['topics']
+            probable = parsed['probableQuestionType']
+        yield {
+            'sessionId': doc['sessionId'],
+            'messageIndex': doc.get('messageIndex', 0),
+            'system': 'B',
+            'declared': doc.get('questionType'),
+            'probable': probable,
+            'topics': topics,
+        }, doc.get('updatedAt')
+
+
+# ==============================
+# ✍️ Index maintenance
+# ==============================
+def build_operations(entry: Dict[str, Any]) -> Tuple[List, ReplaceOne]:
+    """Bulk operations replacing one response's index entries and its pair document."""
+    key = {'sessionId': entry['sessionId'], 'messageIndex': entry['messageIndex'], 'system': entry['system']}
+    declared = entry['declared']
+    probable = normalize_question_type(entry['probable'])
+    agree = probable is not None and declared == probable
+
+    topic_ops = [DeleteMany(key)]
+    seen = set()
+    for label in entry['topics'] or []:
+        topic = normalize_topic(label)
+        if not topic or topic in seen:
+            continue
+        seen.add(topic)
+        topic_ops.append(InsertOne({
+            **key,
+            'topic': topic,
+            'label': label.strip(),
+            'declared': declared,
+            'probable': probable,
+            'agree': agree,
+        }))
+
+    pair_op = ReplaceOne(
+        {'_id': f"{entry['system']}:{entry['sessionId']}:{entry['messageIndex']}"},
+        {**key, 'declared': declared, 'probable': probable, 'agree': agree, 'topics': sorted(seen)},
+        upsert=True
+    )
+    return topic_ops, pair_op
+
+
+def index_entries(db, entries: Iterator[Tuple[Dict[str, Any], datetime]]) -> Tuple[int, Optional[datetime]]:
+    """
+    Apply index updates in bulk batches.
+
+    Topic operations are written with ordered=True so each response's
+    DeleteMany runs before its InsertOnes.
+
+    Returns:
+        (number of responses indexed, newest updatedAt seen)
+    """
+    topic_index = db[TOPIC_INDEX_COLLECTION]
+    pairs = db[PAIRS_COLLECTION]
+    topic_batch, pair_batch = [], []
+    count = 0
+    newest = None
+
+    for entry, updated_at in entries:
+        topic_ops, pair_op = build_operations(entry)
+        topic_batch.extend(topic_ops)
+        pair_batch.append(pair_op)
+        count += 1
+        if updated_at and (newest is None or updated_at > newest):
+            newest = updated_at
+        if len(pair_batch) >= BATCH_SIZE:
+            topic_index.bulk_write(topic_batch, ordered=True)
+            pairs.bulk_write(pair_batch, ordered=False)
+            topic_batch, pair_batch = [], []
+
+    if pair_batch:
+        topic_index.bulk_write(topic_batch, ordered=True)
+        pairs.bulk_write(pair_batch, ordered=False)
+    return count, newest
+
+
+def system_a_turns(db) -> Dict[str, int]:
+    """Number of turns per session, counted server-side (no message text is read)."""
+    def role_count(role: str) -> Dict[str, Any]:
+        return {'$size': {'$filter': {'input': {'$ifNull': ['$messages', []]},
+                                      'as': 'm', 'cond': {'$eq': ['$$m.role', role]}}}}
+    pipeline = [{'$project': {
+        '_id': 0,
+        'sessionId': {'$ifNull': ['$sessionId', {'$toString': '$_id'}]},
+        'turns': {'$min': [role_count('user'), role_count('assistant')]},
+    }}]
+    return {doc['sessionId']: doc['turns'] for doc in db[SESSIONS_COLLECTION].aggregate(pipeline)}
+
+
+def system_b_keys(db) -> Set[Tuple[str, int]]:
+    """(sessionId, messageIndex) of every System B document."""
+    cursor = db[SYSTEM_B_COLLECTION].find({}, {'_id': 0, 'sessionId': 1, 'messageIndex': 1},
+                                          batch_size=BATCH_SIZE * 10)
+    return {(doc['sessionId'], doc.get('messageIndex', 0)) for doc in cursor}
+
+
+def prune_removed(db) -> Dict[str, int]:
+    """
+    Remove the index entries of turns that no longer exist in the sources.
+
+    The pairs collection holds one document per indexed response, so its keys
+    are compared with the turns of each session (System A) and the System B
+    documents. Only keys are read.
+
+    Returns:
+        Number of responses removed per system
+    """
+    turns = system_a_turns(db)
+    b_keys = system_b_keys(db)
+    stale: Dict[str, List[Dict[str, Any]]] = {'A': [], 'B': []}
+    cursor = db[PAIRS_COLLECTION].find({}, {'system': 1, 'sessionId': 1, 'messageIndex': 1},
+                                       batch_size=BATCH_SIZE * 10)
+    for doc in cursor:
+        if doc['system'] == 'A':
+            gone = doc['messageIndex'] >= turns.get(doc['sessionId'], 0)
+        else:
+            gone = (doc['sessionId'], doc['messageIndex']) not in b_keys
+        if gone:
+            stale[doc['system']].append(doc)
+
+    for system, docs in stale.items():
+        for start in range(0, len(docs), BATCH_SIZE):
+            batch = docs[start:start + BATCH_SIZE]
+            db[TOPIC_INDEX_COLLECTION].bulk_write([
+                DeleteMany({'sessionId': doc['sessionId'], 'messageIndex': doc['messageIndex'], 'system': system})
+                for doc in batch
+            ], ordered=False)
+            db[PAIRS_COLLECTION].delete_many({'_id': {'$in': [doc['_id'] for doc in batch]}})
+    return {system: len(docs) for system, docs in stale.items()}
+
+
+def rebuild_matrix(db) -> None:
+    """Recompute the declared-vs-probable matrix from the (small) pairs collection."""
+    db[PAIRS_COLLECTION].aggregate([
+        {'$group': {
+            '_id': {'system': '$system', 'declared': '$declared', 'probable': '$probable'},
+            'count': {'$sum': 1},
+        }},
+        {'$out': MATRIX_COLLECTION},
+    ])
+
+
+def update_index(db, rebuild: bool = False) -> Dict[str, int]:
+    """
+    Incrementally update the topic index and question-type matrix.
+
+    Args:
+        db: The database handle
+        rebuild: Drop the index collections and re-index everything
+
+    Returns:
+        Number of responses re-indexed per system ('A', 'B') and removed
+        per system ('removedA', 'removedB')
+    """
+    state = db[STATE_COLLECTION]
+    if rebuild:
+        db[TOPIC_INDEX_COLLECTION].drop()
+        db[PAIRS_COLLECTION].drop()
+        state.delete_one({'_id': STATE_ID})
+    ensure_indexes(db)
+
+    watermarks = (state.find_one({'_id': STATE_ID}) or {}).get('watermarks', {})
+    counts = {}
+    for system, reader in (('A', iter_system_a), ('B', iter_system_b)):
+        count, newest = index_entries(db, reader(db, watermarks.get(system)))
+        counts[system] = count
+        if newest:
+            watermarks[system] = newest
+    for system, removed in prune_removed(db).items():
+        counts[f"removed{system}"] = removed
+
+    rebuild_matrix(db)
+    state.update_one(
+        {'_id': STATE_ID},
+        {'$set': {'watermarks': watermarks, 'lastRunAt': datetime.utcnow()}},
+        upsert=True
+    )
+    return counts
+
+
+# ==============================
+# 🔍 Queries
+# ==============================
+def topic_query(topic: str, system: str = 'B', declared: str = None, disagree: bool = False) -> Dict[str, Any]:
+    """Filter for topicindex answering "which responses covered <topic> ...?"."""
+    query = {'topic': normalize_topic(topic), 'system': system}
+    if declared:
+        query['declared'] = declared
+    if disagree:
+        query['agree'] = False
+    return query
+
+
+def count_topic(db, topic: str, system: str = 'B', declared: str = None, disagree: bool = False) -> int:
+    return db[TOPIC_INDEX_COLLECTION].count_documents(topic_query(topic, system, declared, disagree))
+
+
+def top_topics(db, system: str = 'B', limit: int = 20) -> List[Dict[str, Any]]:
+    return list(db[TOPIC_INDEX_COLLECTION].aggregate([
+        {'$match': {'system': system}},
+        {'$group': {'_id': '$topic', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}},
+        {'$limit': limit},
+    ]))
+
+
+def question_type_matrix(db, system: str = 'B') -> Dict[str, Dict[str, int]]:
+    """{declared: {probable: count}} for one system."""
+    matrix: Dict[str, Dict[str, int]] = {}
+    for doc in db[MATRIX_COLLECTION].find({'_id.system': system}):
+        key = doc['_id']
+        matrix.setdefault(key.get('declared') or 'None', {})[key.get('probable') or 'None'] = doc['count']
+    return matrix
+
+
+def print_matrix(matrix: Dict[str, Dict[str, int]]) -> None:
+    columns = sorted({probable for row in matrix.values() for probable in row})
+    header = "declared \\ probable"
+    print(f"  {header:<22}" + "".join(f"{column[:16]:>18}" for column in columns))
+    for declared in sorted(matrix):
+        row = matrix[declared]
+        print(f"  {declared[:22]:<22}" + "".join(f"{row.get(column, 0):>18}" for column in columns))
+
+
+# ==============================
+# 🏁 Entry point
+# ==============================
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build and query the topic / question-type index")
+    parser.add_argument("--rebuild", action="store_true", help="Drop and rebuild the index from scratch")
+    parser.add_argument("--topic", help="Count responses that covered this topic")
+    parser.add_argument("--system", choices=["A", "B"], default="B", help="System to query (default: B)")
+    parser.add_argument("--declared", help="Only responses whose declared questionType is this")
+    parser.add_argument("--disagree", action="store_true",
+                        help="Only responses whose probable question type differs from the declared one")
+    args = parser.parse_args()
+
+    db = get_db()
+
+    try:
+        if args.topic:
+            count = count_topic(db, args.topic, args.system, args.declared, args.disagree)
+            print(f"✓ {count} System {args.system} responses match {topic_query(args.topic, args.system, args.declared, args.disagree)}")
+            return 0
+
+        print("=" * 80)
+        print("  TOPIC & QUESTION-TYPE INDEX")
+        print("=" * 80)
+        counts = update_index(db, rebuild=args.rebuild)
+        print(f"✓ Re-indexed System A: {counts['A']} | System B: {counts['B']} | "
+              f"Removed: System A {counts['removedA']}, System B {counts['removedB']}")
+
+        for system in ('A', 'B'):
+            print(f"\nSystem {system} — declared vs probable question type:")
+            print_matrix(question_type_matrix(db, system))
+            topics = top_topics(db, system, limit=10)
+            if topics:
+                summary = ', '.join(f"{t['_id']}({t['count']})" for t in topics)
+                print(f"  Top topics: {summary}")
+        return 0
+    finally:
+        close_clients()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,93 @@
 import { NextRequest, NextResponse } from "next/server";
 import dbConnect from "@/lib/dbConnect";
 import Session from "@/model/session-model";
-import SystemBResponse from "@/model/system-b-response-model";
+import SystemBResponse, {
+  ISystemBResponse,
+} from "@/model/system-b-response-model";
 import Evaluation from "@/model/evaluation-model";
+import EvaluationQueue, {
+  EvaluationQueueState,
+  IEvaluationQueueEntry,
+} from "@/model/evaluation-queue-model";
 import { getServerSession } from "next-auth";
 import { authOptions } from "@/app/api/auth/[...nextauth]/route";
 
+// Fields the collector parses out of a System B response at write time
+const PARSED_FIELDS =
+  "parsedAnswer codeBlocks codeTitles postCodeContent topics probableQuestionType";
+
+// Stored parse of a System B response, or null if the document predates the
+// parsed fields and has not been backfilled (the page parses the text instead)
+function storedParse(
+  systemBResp: Pick<
+    ISystemBResponse,
+    | "parsedAnswer"
+    | "codeBlocks"
+    | "codeTitles"
+    | "postCodeContent"
+    | "topics"
+    | "probableQuestionType"
+  >
+) {
+  if (systemBResp.parsedAnswer === undefined) return null;
+  return {
+    parsedAnswer: systemBResp.parsedAnswer,
+    codeBlocks: systemBResp.codeBlocks ?? [],
+    codeTitles: systemBResp.codeTitles ?? [],
+    postCodeContent: systemBResp.postCodeContent,
+    topics: systemBResp.topics ?? [],
+    probableQuestionType: systemBResp.probableQuestionType,
+  };
+}
+
+// Texts of a queued pair, read by key. Returns null if the pair was rated
+// after the queue was last refreshed, or its System A/B response is gone.
+async function loadQueuedPair(
+  queued: IEvaluationQueueEntry,
+  evaluatorId: string
+) {
+  const key = { sessionId: queued.sessionId, messageIndex: queued.messageIndex };
+  const [alreadyRated, systemBResp, sessionDoc] = await Promise.all([
+    Evaluation.exists({ ...key, evaluatorId }),
+    SystemBResponse.findOne(key)
+      .select(
+        `userMessage codeContent codeLanguage assistantResponse ${PARSED_FIELDS}`
+      )
+      .lean(),
+    Session.findOne({ sessionId: queued.sessionId }).select("messages").lean(),
+  ]);
+  if (alreadyRated || !systemBResp?.assistantResponse || !sessionDoc?.messages) {
+    return null;
+  }
+
+  // Turn k = the k-th user message and the k-th assistant message
+  const assistantMessage = sessionDoc.messages.filter(
+    (message) => message.role === "assistant"
+  )[queued.messageIndex];
+  if (!assistantMessage?.content) return null;
+
+  const leftSystem = queued.leftSystem;
+  const rightSystem = leftSystem === "A" ? "B" : "A";
+  const systemBParsed = storedParse(systemBResp);
+  return {
+    sessionId: queued.sessionId,
+    messageIndex: queued.messageIndex,
+    userMessage: {
+      content: systemBResp.userMessage, // Combined message + code from System B
+      codeContent: systemBResp.codeContent,
+      codeLanguage: systemBResp.codeLanguage,
+    },
+    leftSystem,
+    rightSystem,
+    leftResponse:
+      leftSystem === "A" ? assistantMessage.content : systemBResp.assistantResponse,
+    rightResponse:
+      rightSystem === "A" ? assistantMessage.content : systemBResp.assistantResponse,
+    leftParsed: leftSystem === "B" ? systemBParsed : null,
+    rightParsed: rightSystem === "B" ? systemBParsed : null,
+  };
+}
+
 // GET - Fetch next evaluation pair
 export async function GET(request: NextRequest) {
   try {
@@ -21,8 +103,54 @@ export async function GET(request: NextRequest) {
 
     const evaluatorId = session.user.email;
 
-    // Find sessions that have both System A and System B responses
-    // and haven't been evaluated by this evaluator yet
+    // Fast path: next pair from the precomputed queue (analytics/evaluation_queue.py)
+    let queued = await EvaluationQueue.findOne({ evaluatorId })
+      .sort({ rank: 1 })
+      .lean();
+    let pair = null;
+    while (queued) {
+      pair = await loadQueuedPair(queued, evaluatorId);
+      if (pair) break;
+      await EvaluationQueue.deleteOne({ _id: queued._id });
+      queued = await EvaluationQueue.findOne({ evaluatorId })
+        .sort({ rank: 1 })
+        .lean();
+    }
+
+    if (pair) {
+      const [totalEvaluated, remaining] = await Promise.all([
+        Evaluation.countDocuments({ evaluatorId }),
+        EvaluationQueue.countDocuments({ evaluatorId }),
+      ]);
+
+      return NextResponse.json({
+        success: true,
+        data: {
+          ...pair,
+          progress: {
+            evaluated: totalEvaluated,
+            total: totalEvaluated + remaining,
+          },
+        },
+      });
+    }
+
+    // The queue was built for this evaluator and is empty: nothing left to rate
+    if (await EvaluationQueueState.exists({ _id: evaluatorId })) {
+      const totalEvaluated = await Evaluation.countDocuments({ evaluatorId });
+      return NextResponse.json({
+        success: true,
+        data: null,
+        message: "All pairs have been evaluated",
+        progress: {
+          evaluated: totalEvaluated,
+          total: totalEvaluated,
+        },
+      });
+    }
+
+    // No queue for this evaluator yet: find sessions that have both System A
+    // and System B responses and haven't been evaluated by this evaluator yet
 
     // Get all System B responses
     const systemBResponses = await SystemBResponse.find({})
@@ -166,24 +294,15 @@ Note: This is a dummy response for UI testing. The actual System B response woul
         continue;
       }
 
-      // Find the first user message and its assistant response
+      // Find the user message of this turn and its assistant response
+      // (turn k = the k-th user message and the k-th assistant message)
       const messages = sessionDoc.messages;
-      let userMessage = null;
-      let assistantMessage = null;
-
-      for (let i = 0; i < messages.length; i++) {
-        if (messages[i].role === "user" && !userMessage) {
-          userMessage = messages[i];
-          // Find the next assistant message
-          for (let j = i + 1; j < messages.length; j++) {
-            if (messages[j].role === "assistant") {
-              assistantMessage = messages[j];
-              break;
-            }
-          }
-          break;
-        }
-      }
+      const turn = systemBResp.messageIndex ?? 0;
+      const userMessage =
+        messages.filter((message) => message.role === "user")[turn] ?? null;
+      const assistantMessage =
+        messages.filter((message) => message.role === "assistant")[turn] ??
+        null;
 
       if (!userMessage || !assistantMessage) {
         continue;
@@ -197,6 +316,7 @@ Note: This is a dummy response for UI testing. The actual System B response woul
       // Get total evaluated count for progress
       const totalEvaluated = await Evaluation.countDocuments({ evaluatorId });
       const totalAvailable = systemBResponses.length;
+      const systemBParsed = storedParse(systemBResp);
 
       return NextResponse.json({
         success: true,
@@ -218,6 +338,8 @@ Note: This is a dummy response for UI testing. The actual System B response woul
             rightSystem === "A"
               ? assistantMessage.content
               : systemBResp.assistantResponse,
+          leftParsed: leftSystem === "B" ? systemBParsed : null,
+          rightParsed: rightSystem === "B" ? systemBParsed : null,
           progress: {
             evaluated: totalEvaluated,
             total: totalAvailable,
@@ -326,6 +448,13 @@ export async function POST(request: NextRequest) {
 
     await evaluation.save();
 
+    // Remove the pair from this evaluator's precomputed queue
+    await EvaluationQueue.deleteOne({
+      evaluatorId,
+      sessionId,
+      messageIndex,
+    });
+
     return NextResponse.json({
       success: true,
       message: "Evaluation submitted successfully",
@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for the System B pipeline. They use synthetic data and
+need neither MongoDB nor an API key. Run each one from the repository root, e.g.:
+
+    python -m benchmarks.memory_pipeline
+"""
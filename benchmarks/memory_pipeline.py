@@ -0,0 +1,147 @@
+"""
+Memory benchmark for the collector's in-process pipeline stages.
+
+tracemalloc slows the run considerably (about 30 s for the default 5,000
+sessions), so keep --sessions modest.
+
+Builds SESSIONS synthetic sessions documents shaped like the sessions
+collection and runs them through the same code the collector uses, one
+memory_stage() per step:
+
+    shape     extract_session_data over every document
+    dedup     exact + near-duplicate grouping
+    journal   results journal append (what generation writes per session)
+    write     Excel export streamed from the journal
+    dataframe pandas DataFrame of the shaped rows (legacy collectors, exporters)
+
+Each stage's peak Python allocation above what was live when it started
+(tracemalloc; independent of earlier stages, unlike peak RSS) is compared
+to STAGE_BUDGETS_MB, which scales with the session count. The run exits non-zero if
+any stage is over budget, so a change that makes a stage hold more than it
+should fails here before it OOMs the analysis box.
+
+Usage (from the repository root):
+    python -m benchmarks.memory_pipeline
+    python -m benchmarks.memory_pipeline --sessions 50000 --verbose
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import uuid
+
+from System_B_Response.collector import extract_session_data
+from System_B_Response.dedup import deduplicate
+from System_B_Response.memprofile import MEMORY, memory_stage
+from System_B_Response.results_journal import ResultsJournal, export_journal_to_excel
+
+
+SESSIONS = 5000
+SEED = 7
+
+# Allowed peak allocation growth per stage in MB: (fixed, per 10,000 sessions),
+# about 1.5x what the stages measured when the benchmark was added. The fixed
+# part covers one-off costs such as importing openpyxl.
+STAGE_BUDGETS_MB = {
+    'shape': (2, 15),
+    'dedup': (5, 100),
+    'journal': (2, 2),
+    'write': (12, 5),
+    'dataframe': (2, 5),
+}
+
+QUESTION_TYPES = ["GeneralQuestion", "HelpWriteCode", "HelpFixCode", "CodeExplanation", "QuestionFromCode"]
+WORDS = ("pointer array loop struct malloc free segfault recursion vector template class "
+         "string compile error output input function variable memory linked list sort").split()
+
+
+def synthetic_session(rng: random.Random, index: int) -> dict:
+    question_type = rng.choice(QUESTION_TYPES)
+    question = " ".join(f"{rng.choice(WORDS)}{rng.randint(0, 999)}" for _ in range(rng.randint(8, 60)))
+    code = "\n".join(f"int v{i} = {i};" for i in range(rng.randint(0, 40)))
+    answer = " ".join(rng.choice(WORDS) for _ in range(rng.randint(80, 400)))
+    return {
+        'sessionId': str(uuid.UUID(int=rng.getrandbits(128))),
+        'messages': [
+            {'role': 'user', 'content': question, 'codeContent': code, 'questionType': question_type,
+             'codeLanguage': 'cpp', 'codeOutputPreference': rng.choice(["NoCode", "PseudoCode", "WithCode"])},
+            {'role': 'assistant', 'content': answer},
+        ],
+    }
+
+
+def run(sessions: int, seed: int, workdir: str) -> None:
+    rng = random.Random(seed)
+    documents = [synthetic_session(rng, index) for index in range(sessions)]
+
+    with memory_stage("shape"):
+        sessions_data = [entry for entry in map(extract_session_data, documents) if entry is not None]
+    del documents
+
+    with memory_stage("dedup"):
+        representatives, _ = deduplicate(sessions_data)
+    del representatives
+
+    journal_file = os.path.join(workdir, "benchmark.jsonl")
+    with memory_stage("journal"):
+        with ResultsJournal(journal_file, flush_every=1000) as journal:
+            for session in sessions_data:
+                journal.append({
+                    'sessionId': session['sessionId'],
+                    'questionType': session['questionType'],
+                    'messageIndex': session['messageIndex'],
+                    'userMessage': session['userMessage'],
+                    'systemAResponse': session['systemAResponse'],
+                    'systemBResponse_COT': session['systemAResponse'],
+                })
+
+    with memory_stage("write"):
+        export_journal_to_excel(journal_file, os.path.join(workdir, "benchmark.xlsx"))
+
+    import pandas as pd
+
+    with memory_stage("dataframe"):
+        frame = pd.DataFrame(sessions_data)
+    del frame
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Memory benchmark for System B pipeline stages")
+    parser.add_argument("--sessions", type=int, default=SESSIONS, help=f"Synthetic sessions (default: {SESSIONS})")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--verbose", action="store_true", help="Also print RSS and the top allocators per stage")
+    parser.add_argument("--report", help="Write the per-stage report to <REPORT>.memory.json")
+    args = parser.parse_args()
+
+    MEMORY.configure(enabled=True)
+    with tempfile.TemporaryDirectory() as workdir:
+        run(args.sessions, args.seed, workdir)
+
+    scale = args.sessions / 10000
+    failures = []
+    for entry in MEMORY.stages:
+        fixed, per_10k = STAGE_BUDGETS_MB.get(entry['stage'], (0, 0))
+        budget = fixed + per_10k * scale
+        growth = entry['tracemallocGrowthMb']
+        status = "ok"
+        if growth > budget:
+            status = "OVER BUDGET"
+            failures.append(entry['stage'])
+        print(f"{entry['stage']:<10} peak growth {growth:>7.1f} MB "
+              f"(budget {budget:.0f} MB)  {status}")
+    if args.verbose:
+        for line in MEMORY.lines():
+            print(f"  {line}")
+    if args.report:
+        print(f"Report: {MEMORY.write_report(args.report)}")
+
+    if failures:
+        print(f"❌ Memory regression in: {', '.join(failures)}")
+        return 1
+    print("✓ All stages within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -65,14 +65,23 @@ export const ResponseCard: React.FC<ResponseCardProps> = ({
                   </div>
                 )}
 
-                {/* Code block */}
-                {parsedResponse.rawCode && (
-                  <RichCodeBlock
-                    code={parsedResponse.rawCode}
-                    title={parsedResponse.codeTitle}
-                    language="python"
-                  />
-                )}
+                {/* Code blocks (all of them when the parse was stored) */}
+                {parsedResponse.codeBlocks?.length
+                  ? parsedResponse.codeBlocks.map((code, index) => (
+                      <RichCodeBlock
+                        key={index}
+                        code={code}
+                        title={parsedResponse.codeTitles?.[index]}
+                        language="python"
+                      />
+                    ))
+                  : parsedResponse.rawCode && (
+                      <RichCodeBlock
+                        code={parsedResponse.rawCode}
+                        title={parsedResponse.codeTitle}
+                        language="python"
+                      />
+                    )}
 
                 {/* Post-code content */}
                 {parsedResponse.postCodeContent && (
@@ -5,7 +5,10 @@ import { useSession } from "next-auth/react";
 import { useRouter } from "next/navigation";
 import { ResponseCard } from "@/components/evaluation/ResponseCard";
 import { UserMessageDisplay } from "@/components/evaluation/UserMessageDisplay";
-import { parseResponse } from "@/app/utils/responseParser";
+import {
+  parseResponse,
+  type ParsedResponse,
+} from "@/app/utils/responseParser";
 import { Button } from "@/components/ui/button";
 import { Textarea } from "@/components/ui/textarea";
 import { Progress } from "@/components/ui/progress";
@@ -21,6 +24,16 @@ import {
 } from "lucide-react";
 import { toast } from "sonner";
 
+// Parsed fields the collector stores on a System B response
+interface StoredParse {
+  parsedAnswer: string;
+  codeBlocks: string[];
+  codeTitles: string[];
+  postCodeContent?: string;
+  topics: string[];
+  probableQuestionType?: string;
+}
+
 interface EvaluationData {
   sessionId: string;
   messageIndex: number;
@@ -33,6 +46,8 @@ interface EvaluationData {
   rightSystem: "A" | "B";
   leftResponse: string;
   rightResponse: string;
+  leftParsed?: StoredParse | null;
+  rightParsed?: StoredParse | null;
   progress: {
     evaluated: number;
     total: number;
@@ -47,6 +62,25 @@ const defaultScores: Scores = {
   overall: 0,
 };
 
+// Use the stored parse; parse the text only for responses without one
+// (System A, and System B documents not backfilled yet)
+function toParsedResponse(
+  stored: StoredParse | null | undefined,
+  response: string
+): ParsedResponse {
+  if (!stored) return parseResponse(response);
+  return {
+    content: stored.parsedAnswer,
+    topics: stored.topics,
+    rawCode: stored.codeBlocks[0],
+    codeTitle: stored.codeTitles[0],
+    codeBlocks: stored.codeBlocks,
+    codeTitles: stored.codeTitles,
+    postCodeContent: stored.postCodeContent,
+    probableQuestionType: stored.probableQuestionType,
+  };
+}
+
 export default function EvaluationPage() {
   const { data: session, status } = useSession();
   const router = useRouter();
@@ -64,12 +98,8 @@ export default function EvaluationPage() {
   const [leftFlagged, setLeftFlagged] = useState(false);
   const [rightFlagged, setRightFlagged] = useState(false);
   const [startTime, setStartTime] = useState<number>(Date.now());
-  const [leftParsed, setLeftParsed] = useState<ReturnType<
-    typeof parseResponse
-  > | null>(null);
-  const [rightParsed, setRightParsed] = useState<ReturnType<
-    typeof parseResponse
-  > | null>(null);
+  const [leftParsed, setLeftParsed] = useState<ParsedResponse | null>(null);
+  const [rightParsed, setRightParsed] = useState<ParsedResponse | null>(null);
 
   // Fetch next evaluation pair
   const fetchNextPair = useCallback(async () => {
@@ -92,9 +122,13 @@ export default function EvaluationPage() {
       }
 
       setEvaluationData(result.data);
-      // Parse responses for proper formatting
-      setLeftParsed(parseResponse(result.data.leftResponse));
-      setRightParsed(parseResponse(result.data.rightResponse));
+      // Parsed responses for proper formatting
+      setLeftParsed(
+        toParsedResponse(result.data.leftParsed, result.data.leftResponse)
+      );
+      setRightParsed(
+        toParsedResponse(result.data.rightParsed, result.data.rightResponse)
+      );
       // Reset form
       setLeftScores(defaultScores);
       setRightScores(defaultScores);
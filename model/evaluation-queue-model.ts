@@ -0,0 +1,62 @@
+import mongoose, { Document, Schema, Model } from "mongoose";
+
+// Pending A/B pairs per evaluator, written by analytics/evaluation_queue.py.
+// Entries hold keys only; the texts are read from systembresponses and sessions.
+export interface IEvaluationQueueEntry extends Omit<Document, "_id"> {
+  _id: string; // "<evaluatorId>|<sessionId>:<messageIndex>"
+  evaluatorId: string;
+  sessionId: string;
+  messageIndex: number;
+  rank: number;
+  leftSystem: "A" | "B";
+}
+
+// One marker per evaluator the queue was built for: an empty queue then means
+// every pair has been evaluated
+export interface IEvaluationQueueState extends Omit<Document, "_id"> {
+  _id: string; // evaluatorId
+  refreshId: string;
+  refreshedAt: Date;
+}
+
+const evaluationQueueSchema = new Schema<IEvaluationQueueEntry>(
+  {
+    _id: { type: String },
+    evaluatorId: { type: String, required: true },
+    sessionId: { type: String, required: true },
+    messageIndex: { type: Number, required: true },
+    rank: { type: Number, required: true },
+    leftSystem: { type: String, enum: ["A", "B"], required: true },
+  },
+  {
+    collection: "evaluationqueue",
+    timestamps: true,
+  }
+);
+
+// Serving the next pair: find({ evaluatorId }).sort({ rank: 1 }).limit(1)
+evaluationQueueSchema.index({ evaluatorId: 1, rank: 1 });
+
+const EvaluationQueue: Model<IEvaluationQueueEntry> =
+  mongoose.models.EvaluationQueue ||
+  mongoose.model<IEvaluationQueueEntry>("EvaluationQueue", evaluationQueueSchema);
+
+const evaluationQueueStateSchema = new Schema<IEvaluationQueueState>(
+  {
+    _id: { type: String },
+    refreshId: { type: String, required: true },
+    refreshedAt: { type: Date, required: true },
+  },
+  {
+    collection: "evaluationqueuestate",
+  }
+);
+
+export const EvaluationQueueState: Model<IEvaluationQueueState> =
+  mongoose.models.EvaluationQueueState ||
+  mongoose.model<IEvaluationQueueState>(
+    "EvaluationQueueState",
+    evaluationQueueStateSchema
+  );
+
+export default EvaluationQueue;
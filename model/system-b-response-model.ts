@@ -9,6 +9,32 @@ export interface ISystemBResponse extends Document {
   codeContent?: string;
   codeLanguage?: string;
   codeOutputPreference?: string;
+  // Parsed at write time by System_B_Response/response_parser.py
+  parsedAnswer?: string;
+  codeBlocks?: string[];
+  codeTitles?: string[];
+  postCodeContent?: string;
+  topics?: string[];
+  probableQuestionType?: string;
+  // Set by the Python collector (see System_B_Response/fingerprint.py)
+  inputFingerprint?: string;
+  model?: string;
+  route?: string;
+  maxTokens?: number;
+  usage?: {
+    promptTokens: number;
+    completionTokens: number;
+    latency: number;
+    finishReason?: string;
+    // Attempt cut off on a reduced route, redone on the standard route
+    escalatedFrom?: {
+      route: string;
+      maxTokens: number;
+      latency: number;
+      promptTokens: number;
+      completionTokens: number;
+    };
+  };
   createdAt: Date;
 }
 
@@ -22,6 +48,29 @@ const systemBResponseSchema = new Schema<ISystemBResponse>(
     codeContent: { type: String },
     codeLanguage: { type: String },
     codeOutputPreference: { type: String },
+    parsedAnswer: { type: String },
+    codeBlocks: [{ type: String }],
+    codeTitles: [{ type: String }],
+    postCodeContent: { type: String },
+    topics: [{ type: String }],
+    probableQuestionType: { type: String },
+    inputFingerprint: { type: String },
+    model: { type: String },
+    route: { type: String },
+    maxTokens: { type: Number },
+    usage: {
+      promptTokens: { type: Number },
+      completionTokens: { type: Number },
+      latency: { type: Number },
+      finishReason: { type: String },
+      escalatedFrom: {
+        route: { type: String },
+        maxTokens: { type: Number },
+        latency: { type: Number },
+        promptTokens: { type: Number },
+        completionTokens: { type: Number },
+      },
+    },
   },
   {
     timestamps: true,
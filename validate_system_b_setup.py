@@ -1,10 +1,24 @@
 """
 Validation script for System B Response Generator (Database Push Version)
-Checks all requirements and verifies MongoDB collections
+Checks all requirements, verifies MongoDB collections, builds missing indexes
+and checks query plans (System_B_Response/indexes.py), then probes MongoDB
+and LLM performance to recommend batch sizes and --concurrency.
+
+The checks run concurrently, each with a timeout (see System_B_Response/preflight.py).
+
+Usage:
+    python validate_system_b_setup.py
+    python validate_system_b_setup.py --no-llm      # skip the LLM latency probe
+    python validate_system_b_setup.py --no-probe    # checks only
 """
+import argparse
 import os
 import sys
 
+from System_B_Response.clients import get_db
+from System_B_Response.indexes import ensure_indexes, plan_lines, status_lines, verify_query_plans
+from System_B_Response.preflight import CHECK_TIMEOUT, check_summary_lines, probe_lines, run_checks, run_probe
+
 def check_dependencies():
     """Check if all required packages are installed"""
     print("=" * 80)
@@ -118,23 +132,7 @@ def test_mongodb_connection():
                 print(f"   - Sample sessionId: {sample_b.get('sessionId', 'N/A')[:30]}...")
                 print(f"   - Sample questionType: {sample_b.get('questionType', 'N/A')}")
         
-        # Check if compound index exists on systembresponses
-        indexes = systemb_collection.index_information()
-        has_compound_index = any(
-            'sessionId' in str(idx) and 'messageIndex' in str(idx)
-            for idx in indexes.values()
-        )
-        
-        if has_compound_index:
-            print(f"   ✓ Compound index (sessionId, messageIndex) exists")
-        else:
-            print(f"   ⚠ Creating compound index for systembresponses...")
-            systemb_collection.create_index(
-                [('sessionId', 1), ('messageIndex', 1)],
-                unique=True
-            )
-            print(f"   ✓ Index created successfully")
-        
+        # Indexes are built and verified by check_indexes (System_B_Response/indexes.py)
         client.close()
         print("\n✅ MongoDB verification complete\n")
         return True
@@ -144,6 +142,28 @@ def test_mongodb_connection():
         return False
 
 
+def check_indexes():
+    """Build missing required indexes and verify every declared query uses one"""
+    print("=" * 80)
+    print("STEP 5: Indexes & Query Plans")
+    print("=" * 80)
+    
+    statuses = ensure_indexes(get_db())
+    for line in status_lines(statuses):
+        print(f"   {line}")
+    results = verify_query_plans(get_db())
+    for line in plan_lines(results):
+        print(f"   {line}")
+    
+    failed = [status for status in statuses if status['state'] == 'failed']
+    regressions = [result for result in results if result['status'] == 'regression']
+    if failed or regressions:
+        print(f"\n❌ {len(failed)} index build(s) failed, {len(regressions)} query plan regression(s)\n")
+        return False
+    print("\n✅ Every declared query uses an index\n")
+    return True
+
+
 def check_output_directory():
     """Check output directory"""
     print("=" * 80)
@@ -173,25 +193,53 @@ def check_output_directory():
     return True
 
 
+def run_performance_probe(include_llm: bool, timeout: float):
+    """Measure MongoDB and LLM performance and print recommendations"""
+    print("=" * 80)
+    print("STEP 6: Performance Probe")
+    print("=" * 80)
+    
+    report = run_probe(include_llm=include_llm, timeout=timeout)
+    for line in probe_lines(report):
+        print(f"  {line}")
+    print()
+    return report
+
+
 def main():
     """Run all validation checks"""
+    parser = argparse.ArgumentParser(description="Validate the System B setup before a run")
+    parser.add_argument("--timeout", type=float, default=CHECK_TIMEOUT,
+                        help=f"Seconds each check may take (default: {CHECK_TIMEOUT:g})")
+    parser.add_argument("--no-probe", action="store_true", help="Skip the performance probe")
+    parser.add_argument("--no-llm", action="store_true", help="Skip the LLM latency / rate-limit probe")
+    args = parser.parse_args()
+    
     print("\n" + "=" * 80)
     print("🔍 VALIDATION FOR SYSTEM B RESPONSE GENERATOR")
     print("   (Database Push Version - Stores to MongoDB + Excel)")
     print("=" * 80 + "\n")
     
-    all_checks = [
-        check_dependencies(),
-        check_env_variables(),
-        test_mongodb_connection(),
-        check_output_directory()
-    ]
+    results = run_checks([
+        ("dependencies", check_dependencies),
+        ("environment", check_env_variables),
+        ("mongodb", test_mongodb_connection),
+        ("output directory", check_output_directory),
+        ("indexes", check_indexes),
+    ], timeout=args.timeout)
+    all_passed = all(result['ok'] for result in results)
+    
+    report = None
+    if all_passed and not args.no_probe:
+        report = run_performance_probe(include_llm=not args.no_llm, timeout=args.timeout)
     
     print("=" * 80)
     print("VALIDATION SUMMARY")
     print("=" * 80)
+    for line in check_summary_lines(results):
+        print(line)
     
-    if all(all_checks):
+    if all_passed:
         print("✅ ALL CHECKS PASSED!")
         print("\n📋 What the script will do:")
         print("   1. Fetch sessions from MongoDB (collection: sessions)")
@@ -200,10 +248,13 @@ def main():
         print("      - Store in MongoDB (collection: systembresponses)")
         print("   3. Save all data to Excel file")
         print("\n🚀 Ready to run:")
-        print('   python "System_B_Response\\Sysytem_B_response_collector_from_database_push_database.py"')
+        if report:
+            print(f"   python -m System_B_Response --concurrency {report['recommendations']['concurrency']}")
+        else:
+            print("   python -m System_B_Response")
         print("\n📊 Output locations:")
         print("   - MongoDB: Eeffective_Learning_db.systembresponses")
-        print("   - Excel: d:\\Data fetching scrypt\\data\\system_B_responses_complete.xlsx")
+        print("   - Excel: data\\system_B_responses_COT.xlsx")
         return 0
     else:
         print("❌ SOME CHECKS FAILED!")
@@ -1,8 +1,15 @@
-import pandas as pd
+import os
+import sys
 
-df = pd.read_excel('data(5).xlsx')
-print('Columns:', df.columns.tolist())
-print('\nShape:', df.shape)
-print('\nQuestion types:', df['question_type'].unique())
+# Run as a script from any directory: make the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from System_B_Response.excel_cache import inspect_excel, read_excel
+
+# Headers, row count and a sample only: the workbook is not parsed in full
+info = inspect_excel('data(5).xlsx', sample_rows=2)
+print('Columns:', info['columns'])
+print('\nShape:', (info['rows'], len(info['columns'])))
+print('\nQuestion types:', read_excel('data(5).xlsx', columns=['question_type'])['question_type'].unique().tolist())
 print('\nFirst 2 rows:')
-print(df.head(2))
+print(info['sample'])
@@ -1,10 +1,22 @@
 """
 Pre-run validation script for System B Response Collector (Database Version)
-Checks all requirements before running the database script
+Checks all requirements before running the database script, then probes
+MongoDB and LLM performance to recommend batch sizes and concurrency.
+
+The checks run concurrently, each with a timeout (see System_B_Response/preflight.py).
+
+Usage:
+    python validation/validate_database_setup.py [--no-llm] [--no-probe] [--timeout SECONDS]
 """
+import argparse
 import os
 import sys
 
+# Run as a script from any directory: make the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from System_B_Response.preflight import CHECK_TIMEOUT, check_summary_lines, probe_lines, run_checks, run_probe
+
 def check_dependencies():
     """Check if all required packages are installed"""
     print("=" * 60)
@@ -172,24 +184,50 @@ def check_output_directory():
     return True
 
 
+def run_performance_probe(include_llm: bool, timeout: float):
+    """Measure MongoDB and LLM performance and print recommendations"""
+    print("=" * 60)
+    print("STEP 5: Performance Probe")
+    print("=" * 60)
+    
+    report = run_probe(include_llm=include_llm, timeout=timeout)
+    for line in probe_lines(report):
+        print(f"  {line}")
+    print()
+    return report
+
+
 def main():
     """Run all validation checks"""
+    parser = argparse.ArgumentParser(description="Validate the setup for the database collector")
+    parser.add_argument("--timeout", type=float, default=CHECK_TIMEOUT,
+                        help=f"Seconds each check may take (default: {CHECK_TIMEOUT:g})")
+    parser.add_argument("--no-probe", action="store_true", help="Skip the performance probe")
+    parser.add_argument("--no-llm", action="store_true", help="Skip the LLM latency / rate-limit probe")
+    args = parser.parse_args()
+    
     print("\n" + "=" * 60)
     print("🔍 PRE-RUN VALIDATION FOR DATABASE VERSION")
     print("=" * 60 + "\n")
     
-    all_checks = [
-        check_dependencies(),
-        check_env_file(),
-        test_mongodb_connection(),
-        check_output_directory()
-    ]
+    results = run_checks([
+        ("dependencies", check_dependencies),
+        ("environment", check_env_file),
+        ("mongodb", test_mongodb_connection),
+        ("output directory", check_output_directory),
+    ], timeout=args.timeout)
+    all_passed = all(result['ok'] for result in results)
+    
+    if all_passed and not args.no_probe:
+        run_performance_probe(include_llm=not args.no_llm, timeout=args.timeout)
     
     print("=" * 60)
     print("VALIDATION SUMMARY")
     print("=" * 60)
+    for line in check_summary_lines(results):
+        print(line)
     
-    if all(all_checks):
+    if all_passed:
         print("✅ ALL CHECKS PASSED!")
         print("\nYou can now run the database script:")
         print('   python "System_B_Response\\Sysytem_B_response_collector_database.py"')